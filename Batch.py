@@ -0,0 +1,144 @@
+# Headless batch runner: answer questions from a JSONL file without the GUI
+#
+# Input lines look like {"id": "faq-1", "question": "What is a normal blood pressure?"}
+# ("prompt" is accepted instead of "question"). Every question runs in its own
+# conversation, output lines carry the answer plus timing.
+#
+# Usage: python Batch.py questions.jsonl answers.jsonl --concurrency 4
+# Ollama only runs that many requests at once if OLLAMA_NUM_PARALLEL allows it.
+
+import argparse
+import json
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+from LLM import MODEL_NAME, ChatEngine
+from ResponseCache import CACHE_PATH, ResponseCache
+
+logging.basicConfig(level=logging.INFO)
+
+
+def read_questions(path: str) -> List[Dict]:
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for n, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                logging.error(f"Skipping line {n}: {e}")
+                continue
+            if isinstance(item, str):
+                item = {"question": item}
+            question = item.get("question") or item.get("prompt")
+            if not question:
+                logging.error(f"Skipping line {n}: no question")
+                continue
+            item.setdefault("id", n)
+            item["question"] = question
+            questions.append(item)
+    return questions
+
+
+def answer_question(
+    item: Dict,
+    model: str,
+    host: Optional[str],
+    search: bool,
+    cache: Optional[ResponseCache] = None,
+) -> Dict:
+    kwargs = {} if search else {"search": lambda query: "", "prefetch": False}
+    engine = ChatEngine(model=model, host=host, cache=cache, **kwargs)
+    start = time.perf_counter()
+    first_token: List[float] = []
+
+    def on_update(text: str) -> None:
+        if not first_token and text:
+            first_token.append(time.perf_counter() - start)
+
+    result = {"id": item["id"], "question": item["question"], "model": model}
+    try:
+        result["answer"] = engine.ask(item["question"], on_update=on_update)
+        result["error"] = None
+    except Exception as e:
+        result["answer"] = ""
+        result["error"] = str(e)
+    result["ttft_s"] = round(first_token[0], 3) if first_token else None
+    result["total_s"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def run_batch(
+    in_path: str,
+    out_path: str,
+    concurrency: int = 2,
+    model: str = MODEL_NAME,
+    host: Optional[str] = None,
+    search: bool = True,
+    cache_path: Optional[str] = None,
+) -> int:
+    """Answer every question in in_path, writing results as they finish. Returns the error count."""
+    questions = read_questions(in_path)
+    # a shared cache lets an overnight run warm up answers for the GUI
+    cache = ResponseCache(cache_path) if cache_path else None
+    errors = 0
+    started = time.perf_counter()
+    with open(out_path, "w", encoding="utf-8") as out, ThreadPoolExecutor(
+        max_workers=max(1, concurrency)
+    ) as pool:
+        futures = [
+            pool.submit(answer_question, q, model, host, search, cache) for q in questions
+        ]
+        for done, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            if result["error"]:
+                errors += 1
+            logging.info(
+                f"[{done}/{len(questions)}] {result['id']}: {result['total_s']}s"
+            )
+    logging.info(
+        f"Answered {len(questions)} questions in {time.perf_counter() - started:.1f}s "
+        f"({errors} errors)"
+    )
+    return errors
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run Hygieia over a JSONL file.")
+    parser.add_argument("input", help="JSONL file with one question per line")
+    parser.add_argument("output", help="JSONL file to write answers to")
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--host", default=None, help="Ollama host, e.g. http://127.0.0.1:11434")
+    parser.add_argument(
+        "--no-search", action="store_true", help="ignore /search requests from the model"
+    )
+    parser.add_argument(
+        "--cache",
+        nargs="?",
+        const=CACHE_PATH,
+        default=None,
+        help=f"read and fill the response cache (default file: {CACHE_PATH})",
+    )
+    args = parser.parse_args(argv)
+    errors = run_batch(
+        args.input,
+        args.output,
+        concurrency=args.concurrency,
+        model=args.model,
+        host=args.host,
+        search=not args.no_search,
+        cache_path=args.cache,
+    )
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
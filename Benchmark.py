@@ -0,0 +1,757 @@
+# Offline benchmark suite: streaming, rendering, context, search, lexicon, evidence,
+# citations, cache, triage, profiler, history search and import
+#
+# Runs without network or a real model: an OllamaStub stands in for Ollama,
+# recorded pages from benchmarks/fixtures/web are replayed to WebSearch and
+# document corpora are generated on the fly. Results are compared against
+# benchmarks/baseline.json and the run fails if a metric got worse than the
+# tolerance allows.
+#
+# Usage: python Benchmark.py                    compare against the baseline
+#        python Benchmark.py --save-baseline    record a new baseline on this machine
+#        python Benchmark.py --only search import
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+logging.basicConfig(level=logging.INFO)
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks")
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures", "web")
+LEXICON_FIXTURE = os.path.join(BENCH_DIR, "fixtures", "lexicon.json")
+TRIAGE_FIXTURE = os.path.join(BENCH_DIR, "fixtures", "triage.json")
+CACHE_FIXTURE = os.path.join(BENCH_DIR, "fixtures", "cache.json")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+TOLERANCE = 0.3  # fail when a metric is more than 30% worse than the baseline
+# plus this much absolute slack, so millisecond-sized metrics don't flap on timer noise
+ABS_SLACK = {"ms": 1.0, "us": 1.0}
+
+# metric name -> (value, unit, "lower" or "higher" is better)
+Metrics = Dict[str, Tuple[float, str, str]]
+
+
+class Skip(Exception):
+    pass
+
+
+def _require(module: str):
+    try:
+        return __import__(module)
+    except ImportError as e:
+        raise Skip(f"{module} not installed ({e})")
+
+
+def _best_time(fn: Callable[[], object], repeat: int = 5) -> float:
+    # best of n, like timeit: the minimum is the least disturbed by the rest of the machine
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+# --- web fixtures -----------------------------------------------------------
+
+
+class _Recorded:
+    def __init__(self, url: str, text: str):
+        self.url = url
+        self.text = text
+        self.status_code = 200
+
+    def raise_for_status(self) -> None:
+        pass
+
+
+class _Replay:
+    """Serves recorded pages in place of the requests module."""
+
+    def __init__(self, fixtures_dir: str = FIXTURES_DIR):
+        self.fixtures_dir = fixtures_dir
+        with open(os.path.join(fixtures_dir, "index.json"), "r", encoding="utf-8") as f:
+            self.index: Dict[str, str] = json.load(f)
+        self.pages: Dict[str, str] = {}
+        for url, name in self.index.items():
+            with open(os.path.join(fixtures_dir, name), "r", encoding="utf-8") as f:
+                self.pages[url] = f.read()
+        self.requests: List[str] = []
+
+    def get(self, url, headers=None, timeout=None, **kwargs) -> _Recorded:
+        self.requests.append(url)
+        if url not in self.pages:
+            raise ConnectionError(f"Not recorded: {url}")
+        return _Recorded(url, self.pages[url])
+
+
+@contextmanager
+def replayed_web(fixtures_dir: str = FIXTURES_DIR):
+    import WebSearch
+
+    replay = _Replay(fixtures_dir)
+    original = WebSearch.hrequests
+    WebSearch.hrequests = replay
+    try:
+        yield replay
+    finally:
+        WebSearch.hrequests = original
+
+
+# --- document corpora -------------------------------------------------------
+
+CORPUS_PARAGRAPH = (
+    "Potilaalla on ollut kuumetta 38,4 astetta kolmen päivän ajan. Verenpaine 132/84 mmHg, "
+    "syke 92/min ja happisaturaatio 96 %. Suositellaan lepoa, riittävää nesteytystä ja "
+    "uutta arviota, jos oireet pahenevat."
+)
+
+
+def _write_pdf(path: str, pages: List[List[str]]) -> None:
+    # minimal single-font PDF, enough for PyPDF2's text extraction
+    def esc(text: str) -> str:
+        return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", b""]
+    font_id = 3
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    kids = []
+    for lines in pages:
+        stream = "BT /F1 10 Tf 40 800 Td 12 TL " + " ".join(
+            f"({esc(line)}) '" for line in lines
+        ) + " ET"
+        data = stream.encode("cp1252", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (font_id, content_id)
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        " ".join(f"{k} 0 R" for k in kids).encode("ascii"),
+        len(kids),
+    )
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def generate_corpus(directory: str, size: int = 40) -> Dict[str, str]:
+    """Write one PDF, DOCX and PPTX of `size` pages/slides (x10 paragraphs for DOCX)."""
+    docx = _require("docx")
+    pptx = _require("pptx")
+    paths = {}
+    words = CORPUS_PARAGRAPH.split()
+    lines = [" ".join(words[i : i + 12]) for i in range(0, len(words), 12)]
+
+    paths["pdf"] = os.path.join(directory, "corpus.pdf")
+    _write_pdf(paths["pdf"], [lines * 12 for _ in range(size)])
+
+    paths["docx"] = os.path.join(directory, "corpus.docx")
+    doc = docx.Document()
+    for i in range(size * 10):
+        if i % 10 == 0:
+            doc.add_heading(f"Käynti {i // 10 + 1}", level=2)
+        doc.add_paragraph(CORPUS_PARAGRAPH)
+    doc.save(paths["docx"])
+
+    paths["pptx"] = os.path.join(directory, "corpus.pptx")
+    prs = pptx.Presentation()
+    layout = prs.slide_layouts[1]
+    for i in range(size):
+        slide = prs.slides.add_slide(layout)
+        slide.shapes.title.text = f"Dia {i + 1}"
+        body = slide.placeholders[1].text_frame
+        body.text = lines[0]
+        for line in lines[1:] * 3:
+            body.add_paragraph().text = line
+    prs.save(paths["pptx"])
+    return paths
+
+
+# --- benchmarks ---------------------------------------------------------------
+
+
+def bench_streaming() -> Metrics:
+    _require("ollama")
+    from LLM import ChatEngine
+    from OllamaStub import OllamaStub, StubConfig
+
+    latency, rate, tokens = 0.05, 400.0, 200
+    with OllamaStub(StubConfig(tokens_per_s=rate, latency=latency, tokens=tokens)) as stub:
+        engine = ChatEngine(host=stub.url, search=lambda query: "")
+        prompt = [{"role": "user", "content": "Onko 38,4 astetta kuumetta?"}]
+        ttfts, overheads = [], []
+        for _ in range(3):
+            start = time.perf_counter()
+            first = None
+            for text in engine.stream(prompt):
+                if first is None and text:
+                    first = time.perf_counter() - start
+            total = time.perf_counter() - start
+            ttfts.append((first or total) - latency)
+            # time not explained by the stub's own pacing, spread over the chunks
+            overheads.append((total - latency - tokens / rate) / tokens)
+    return {
+        "stream.ttft_overhead_ms": (statistics.median(ttfts) * 1000, "ms", "lower"),
+        "stream.chunk_overhead_ms": (max(0.0, statistics.median(overheads)) * 1000, "ms", "lower"),
+    }
+
+
+def bench_render() -> Metrics:
+    _require("PyQt6")
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication
+    from GUI import ChatbotUI
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    ui = ChatbotUI()
+    ui.show()
+
+    def add_exchanges(n: int) -> None:
+        for i in range(n):
+            ui.add_user_message(f"Kysymys {i}: onko kuume vaarallinen?")
+            ui.add_bot_message(f"**Vastaus {i}**\n\n- {CORPUS_PARAGRAPH}\n- lisätietoa: https://www.terveyskirjasto.fi/dlk00045")
+
+    pieces = ((CORPUS_PARAGRAPH + " ") * 8).split(" ")[:200]
+
+    def stream(runs: int) -> Tuple[float, float]:
+        means, p95s = [], []
+        for _ in range(runs):
+            ui.add_bot_message("Hygieia is typing...")
+            costs = []
+            text = ""
+            for piece in pieces:
+                text += piece + " "
+                start = time.perf_counter()
+                ui.update_last_bot_message(text)
+                app.processEvents()
+                costs.append(time.perf_counter() - start)
+            costs.sort()
+            means.append(statistics.mean(costs))
+            p95s.append(costs[int(len(costs) * 0.95)])
+        return min(means), min(p95s)
+
+    add_exchanges(25)
+    chunk_mean, chunk_p95 = stream(3)
+    # the same in a 1000 message conversation, where a chunk or a new message
+    # must not cost more than in a short one
+    add_exchanges(475)
+    view = ui.chat_display
+    view.layout_now()
+    long_mean, _ = stream(1)
+    appends = []
+    for i in range(50):
+        start = time.perf_counter()
+        ui.add_user_message(f"Kysymys {i}: entä jos kuume nousee?")
+        app.processEvents()
+        appends.append(time.perf_counter() - start)
+    # scrolled top to bottom a page at a time
+    view.layout_now()
+    vsb = view.verticalScrollBar()
+    scrolls = []
+    for _ in range(2):
+        vsb.setValue(0)
+        view.viewport().repaint()
+        costs = []
+        while vsb.value() < vsb.maximum():
+            start = time.perf_counter()
+            vsb.setValue(vsb.value() + vsb.pageStep())
+            view.viewport().repaint()
+            costs.append(time.perf_counter() - start)
+        scrolls.append(statistics.mean(costs))
+    ui.close()
+    return {
+        "render.chunk_ms_mean": (chunk_mean * 1000, "ms", "lower"),
+        "render.chunk_ms_p95": (chunk_p95 * 1000, "ms", "lower"),
+        "render.chunk_ms_1000": (long_mean * 1000, "ms", "lower"),
+        "render.append_ms_1000": (statistics.median(appends) * 1000, "ms", "lower"),
+        "render.scroll_page_ms": (min(scrolls) * 1000, "ms", "lower"),
+    }
+
+
+def bench_context() -> Metrics:
+    _require("ollama")
+    from LLM import MAX_CONTEXT_TOKENS, ContextManager
+
+    summary = {"role": "assistant", "content": "Yhteenveto: " + CORPUS_PARAGRAPH}
+    message = {"role": "user", "content": CORPUS_PARAGRAPH * 2}
+    n = 5000
+
+    def fill():
+        ctx = ContextManager(MAX_CONTEXT_TOKENS, summarize=lambda c: summary)
+        for _ in range(n):
+            ctx.add_interaction(dict(message))
+
+    def truncate():
+        ctx = ContextManager(MAX_CONTEXT_TOKENS, summarize=lambda c: summary)
+        ctx.context = [dict(message) for _ in range(200)]
+        ctx.truncate_context()
+
+    return {
+        "context.add_us": (_best_time(fill, 3) / n * 1e6, "us", "lower"),
+        "context.truncate_us": (_best_time(truncate, 5) * 1e6, "us", "lower"),
+    }
+
+
+def bench_search() -> Metrics:
+    _require("bs4")
+    from WebSearch import scrape_medical_info
+
+    queries = ["diabetes", "kuume", "päänsärky"]
+    with replayed_web() as replay:
+        for q in queries:
+            if not scrape_medical_info(q):
+                raise RuntimeError(f"Recorded search for {q!r} returned nothing")
+        requests_per_query = len(replay.requests) / len(queries)
+        per_query = _best_time(lambda: [scrape_medical_info(q) for q in queries], 5) / len(queries)
+    return {
+        "search.e2e_ms": (per_query * 1000, "ms", "lower"),
+        "search.requests": (requests_per_query, "req", "lower"),
+    }
+
+
+def bench_evidence() -> Metrics:
+    _require("bs4")
+    from Evidence import compress
+    from WebSearch import scrape_medical_info
+
+    # a session that searches the same topics again, as models tend to
+    queries = ["diabetes", "kuume", "diabetes", "päänsärky", "kuume", "diabetes"]
+    with replayed_web():
+        results = {q: scrape_medical_info(q) for q in set(queries)}
+    raw = added = 0
+    context: List[Dict] = []
+    for q in queries:
+        evidence, stats = compress(results[q], q, context)
+        context.append({"role": "system", "content": evidence})
+        raw += stats["words_in"]
+        added += stats["words_out"]
+    history = context * 20  # a long conversation to check against
+    per_search = _best_time(lambda: compress(results["kuume"], "kuume", history), 5)
+    return {
+        "evidence.kept_share": (added / raw, "ratio", "lower"),
+        "evidence.compress_ms": (per_search * 1000, "ms", "lower"),
+    }
+
+
+def bench_citations() -> Metrics:
+    _require("bs4")
+    import random
+
+    from Citations import SourceIndex
+    from Evidence import split_sentences
+    from WebSearch import scrape_medical_info
+
+    with replayed_web():
+        results = [scrape_medical_info(q) for q in ("diabetes", "kuume", "päänsärky")]
+    index = SourceIndex()
+    for info in results[:2]:
+        index.add(info)
+    rng = random.Random(3)
+    sentences = [
+        [s for p in split_sentences(info) for s in p if len(s.split()) >= 8] for info in results
+    ]
+    # quoted as found, with one word swapped, and from a page that was never searched
+    cases = []
+    for sentence in sentences[0][:20] + sentences[1][:20]:
+        words = sentence.split()
+        cases.append((f'"{sentence}"', "verified"))
+        words[rng.randrange(1, len(words) - 1)] = "kuitenkin"
+        cases.append((f'"{" ".join(words)}"', "fuzzy"))
+    cases += [(f'"{sentence}"', "unsupported") for sentence in sentences[2][:20]]
+    right = 0
+    for quote, expected in cases:
+        verdicts = index.check(quote)
+        if verdicts and verdicts[0][1] == expected:
+            right += 1
+        else:
+            logging.info(f"citation miss: {quote[:60]!r} -> {verdicts}, expected {expected}")
+    answer = "\n\n".join(quote for quote, _ in cases)
+    words = len(answer.split())
+
+    def check():
+        index._verdicts.clear()  # as if every quote were new
+        index.check(answer)
+
+    per_word = _best_time(check, 5) / words
+    return {
+        "citations.accuracy": (right / len(cases), "ratio", "higher"),
+        "citations.check_us_per_word": (per_word * 1e6, "us", "lower"),
+    }
+
+
+def bench_cache() -> Metrics:
+    _require("ollama")
+    from LLM import MODEL_NAME, ChatEngine
+    from OllamaStub import OllamaStub, StubConfig
+    from ResponseCache import ResponseCache
+    from Watchdog import Deadlines
+
+    question = "Kuinka kauan kuume saa kestää?"
+    deadlines = Deadlines(load=0.3, first_token=0.3, token_gap=0.3)
+
+    def ask(url: str, cache: ResponseCache) -> Tuple[ChatEngine, List[str]]:
+        engine = ChatEngine(host=url, search=lambda query: "", cache=cache, prefetch=False, deadlines=deadlines)
+        statuses: List[str] = []
+        engine.ask(question, on_status=statuses.append)
+        return engine, statuses
+
+    with open(CACHE_FIXTURE, "r", encoding="utf-8") as f:
+        cases = json.load(f)
+    right = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        # near-duplicates: a different dose, age group or a negation must miss
+        cache = ResponseCache(os.path.join(tmp, "pairs.sqlite3"))
+        for case in cases:
+            cache.clear()
+            cache.put("bucket", case["stored"], "answer")
+            hit = cache.get("bucket", case["asked"]) is not None
+            if hit == case["hit"]:
+                right += 1
+            else:
+                logging.info(f"cache {'hit' if hit else 'miss'}: {case['asked']!r} for {case['stored']!r}")
+        cache = ResponseCache(os.path.join(tmp, "cache.sqlite3"))
+        # the main model stalls, so the fallback model writes the answer
+        stalled = StubConfig(tokens_per_s=400.0, latency=0.01, stall=1.0, stall_model=MODEL_NAME)
+        with OllamaStub(stalled) as stub:
+            engine, _ = ask(stub.url, cache)
+        if "fallback_model" not in engine.last_stats:
+            raise RuntimeError("the fallback path wasn't reached")
+        with OllamaStub(StubConfig(tokens_per_s=400.0, latency=0.01)) as stub:
+            # the next run must not be served the fallback model's answer as the main model's
+            _, statuses = ask(stub.url, cache)
+            fallback_hits = sum(s.startswith("Cached answer") for s in statuses)
+            # while the main model's own answer is served again
+            _, statuses = ask(stub.url, cache)
+            if not any(s.startswith("Cached answer") for s in statuses):
+                raise RuntimeError("the main model's answer wasn't cached")
+    return {
+        "cache.accuracy": (right / len(cases), "ratio", "higher"),
+        "cache.fallback_hits": (fallback_hits, "answers", "lower"),
+    }
+
+
+def bench_triage() -> Metrics:
+    from Triage import triage
+
+    with open(TRIAGE_FIXTURE, "r", encoding="utf-8") as f:
+        cases = json.load(f)
+    right = 0
+    for case in cases:
+        flags, _ = triage(case["message"])
+        keys = sorted({flag.key for flag in flags})
+        if keys == sorted(case["expected"]):
+            right += 1
+        else:
+            logging.info(f"triage miss: {case['message']!r} -> {keys}, expected {case['expected']}")
+    messages = [case["message"] for case in cases]
+    per_message = _best_time(lambda: [triage(m) for m in messages], 5) / len(messages)
+    return {
+        "triage.accuracy": (right / len(cases), "ratio", "higher"),
+        "triage.check_us": (per_message * 1e6, "us", "lower"),
+    }
+
+
+def bench_profiler() -> Metrics:
+    import threading
+
+    from Profiler import TurnProfiler
+
+    # idle threads like the app's workers, each a few frames deep
+    stop = threading.Event()
+
+    def idle(depth: int) -> None:
+        if depth:
+            idle(depth - 1)
+        else:
+            stop.wait()
+
+    threads = [threading.Thread(target=idle, args=(20,), daemon=True) for _ in range(8)]
+    for t in threads:
+        t.start()
+    profiler = TurnProfiler(enabled=False)
+    n = 200
+    try:
+        per_sample = _best_time(lambda: [profiler.sample() for _ in range(n)], 5) / n
+    finally:
+        stop.set()
+    return {"profiler.sample_us": (per_sample * 1e6, "us", "lower")}
+
+
+def bench_history() -> Metrics:
+    import random
+
+    from Sessions import SessionStore
+
+    # a long-running session: tens of thousands of messages over many days
+    words = CORPUS_PARAGRAPH.split()
+    rng = random.Random(7)
+    n = 30000
+    queries = ["kuumetta", "verenpaine syke", "happisat", "nesteytystä oireet pahenevat", "38,4"]
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SessionStore.create(tmp)
+        try:
+            store._db.executemany(
+                "INSERT INTO messages (ts, kind, content, meta) VALUES (?, ?, ?, NULL)",
+                (
+                    (time.time(), rng.choice(("user", "bot")), " ".join(rng.sample(words, rng.randint(4, 20))))
+                    for _ in range(n)
+                ),
+            )
+            store._db.commit()
+            for q in queries:
+                if not store.search(q):
+                    raise RuntimeError(f"History search for {q!r} found nothing")
+            per_query = _best_time(lambda: [store.search(q) for q in queries], 5) / len(queries)
+            per_append = _best_time(lambda: store.append_message("user", CORPUS_PARAGRAPH), 20)
+        finally:
+            store.close()
+    return {
+        "history.search_ms": (per_query * 1000, "ms", "lower"),
+        "history.append_ms": (per_append * 1000, "ms", "lower"),
+    }
+
+
+def bench_lexicon() -> Metrics:
+    from Lexicon import find_terms
+
+    with open(LEXICON_FIXTURE, "r", encoding="utf-8") as f:
+        cases = json.load(f)
+    hits = 0
+    for case in cases:
+        terms = find_terms(case["query"], limit=1)
+        if (terms[0] if terms else None) == case["expected"]:
+            hits += 1
+        else:
+            logging.info(f"lexicon miss: {case['query']!r} -> {terms}, expected {case['expected']!r}")
+    queries = [case["query"] for case in cases]
+    per_lookup = _best_time(lambda: [find_terms(q) for q in queries], 5) / len(queries)
+    return {
+        "lexicon.hit_rate": (hits / len(cases), "ratio", "higher"),
+        "lexicon.lookup_us": (per_lookup * 1e6, "us", "lower"),
+    }
+
+
+def bench_import() -> Metrics:
+    _require("PyPDF2")
+    from anyFileRead import anyReader
+
+    metrics: Metrics = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = generate_corpus(tmp)
+        for kind, path in paths.items():
+            text = anyReader(path) or ""
+            if not text or text.startswith(("PDF read error", "PPTX read error", "DOCX read error")):
+                raise RuntimeError(f"Import of generated {kind} failed: {text[:80]}")
+            seconds = _best_time(lambda: anyReader(path), 3)
+            metrics[f"import.{kind}_kchars_s"] = (len(text) / seconds / 1000, "kchar/s", "higher")
+    return metrics
+
+
+# must not be imported before the window is up (see Hygieia-AI.preload_modules)
+DEFERRED_MODULES = ("ollama", "markdown", "requests", "bs4", "docx", "pptx", "PyPDF2")
+
+_STARTUP_PROBE = f"""
+import json, os, runpy, sys, time
+sys.stderr.write("--startup--\\n")
+start = time.perf_counter()
+app_module = runpy.run_path("Hygieia-AI.py", run_name="hygieia_startup")
+from PyQt6.QtWidgets import QApplication
+app = QApplication(sys.argv)
+ui = app_module["ChatbotUI"]()
+ui.show()
+app.processEvents()
+shown = time.perf_counter() - start
+loaded = [m for m in {DEFERRED_MODULES!r} if m in sys.modules]
+print(json.dumps({{"window_s": shown, "loaded": loaded}}))
+"""
+
+
+def import_report(stderr: str) -> List[Tuple[str, float]]:
+    """Top-level (name, cumulative ms) pairs from -X importtime output after the probe marker."""
+    _, _, after = stderr.partition("--startup--")
+    rows = []
+    for line in after.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:") :].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2]
+        # nested imports are indented two more spaces per level
+        if len(name) - len(name.lstrip()) == 1:
+            rows.append((name.strip(), int(parts[1]) / 1000))
+    return rows
+
+
+def bench_startup() -> Metrics:
+    _require("PyQt6")
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    here = os.path.dirname(os.path.abspath(__file__))
+    walls, imports, leaks = [], [], []
+    report: List[Tuple[str, float]] = []
+    for _ in range(3):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _STARTUP_PROBE],
+            cwd=here,
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=120,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        report = import_report(proc.stderr)
+        walls.append(result["window_s"])
+        imports.append(sum(ms for _, ms in report))
+        leaks.append(len(result["loaded"]))
+        if result["loaded"]:
+            logging.warning(f"Loaded before the window: {', '.join(result['loaded'])}")
+    for name, ms in sorted(report, key=lambda r: -r[1])[:8]:
+        logging.info(f"startup import {name:<28} {ms:8.1f} ms")
+    return {
+        "startup.window_ms": (min(walls) * 1000, "ms", "lower"),
+        "startup.import_ms": (min(imports), "ms", "lower"),
+        "startup.deferred_loaded": (max(leaks), "modules", "lower"),
+    }
+
+
+BENCHMARKS: Dict[str, Callable[[], Metrics]] = {
+    "startup": bench_startup,
+    "streaming": bench_streaming,
+    "render": bench_render,
+    "context": bench_context,
+    "search": bench_search,
+    "lexicon": bench_lexicon,
+    "evidence": bench_evidence,
+    "citations": bench_citations,
+    "cache": bench_cache,
+    "triage": bench_triage,
+    "profiler": bench_profiler,
+    "history": bench_history,
+    "import": bench_import,
+}
+
+
+# --- baseline -----------------------------------------------------------------
+
+
+def machine() -> Dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results: Metrics, baseline: Dict, tolerance: float) -> List[str]:
+    regressions = []
+    base_metrics = baseline.get("metrics", {})
+    for name, (value, unit, better) in sorted(results.items()):
+        base = base_metrics.get(name)
+        if base is None:
+            print(f"  {name:<28} {value:>10.3f} {unit:<8} (no baseline)")
+            continue
+        ref = base["value"]
+        if better == "lower":
+            worse = value > ref * (1 + tolerance) + ABS_SLACK.get(unit, 0.0)
+        else:
+            worse = value < ref * (1 - tolerance)
+        change = (value - ref) / ref * 100 if ref else 0.0
+        flag = "REGRESSION" if worse else ""
+        print(f"  {name:<28} {value:>10.3f} {unit:<8} baseline {ref:>10.3f} ({change:+.0f}%) {flag}")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def run(only: List[str]) -> Tuple[Metrics, List[str]]:
+    results: Metrics = {}
+    failures = []
+    for name, bench in BENCHMARKS.items():
+        if only and name not in only:
+            continue
+        try:
+            results.update(bench())
+            logging.info(f"{name}: done")
+        except Skip as e:
+            logging.warning(f"{name}: skipped, {e}")
+        except Exception as e:
+            logging.error(f"{name}: failed, {e}")
+            failures.append(name)
+    return results, failures
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run Hygieia's offline benchmarks.")
+    parser.add_argument("--only", nargs="*", default=[], choices=sorted(BENCHMARKS))
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results, failures = run(args.only)
+    payload = {
+        "machine": machine(),
+        "metrics": {
+            name: {"value": round(value, 4), "unit": unit, "better": better}
+            for name, (value, unit, better) in sorted(results.items())
+        },
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2)
+    if args.save_baseline:
+        if failures:
+            logging.error("Not saving a baseline from a run with failures")
+            return 1
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        # keep metrics of benchmarks that were skipped this time
+        baseline.setdefault("metrics", {}).update(payload["metrics"])
+        baseline["machine"] = payload["machine"]
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"Saved {len(results)} metrics to {args.baseline}")
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("machine", {}).get("cpus") != os.cpu_count():
+            logging.warning("Baseline was recorded on a different machine, expect noise")
+    else:
+        logging.warning(f"No baseline at {args.baseline}, run with --save-baseline first")
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+    return 1 if regressions or failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
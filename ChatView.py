@@ -0,0 +1,416 @@
+# Virtualized chat transcript: a list model of messages drawn by a bubble delegate
+#
+# Only visible rows are painted. Each bubble's laid out QTextDocument is kept
+# in a small LRU keyed by message and width, and only bubble heights are kept
+# for the rest, so memory follows the viewport rather than the conversation.
+# Images are decoded at thumbnail size.
+#
+# QListView lays out every row again whenever a row changes, so the cost of a
+# streamed chunk would grow with the conversation. A chunk that leaves its
+# bubble the same height only repaints that row; other changes and new rows
+# are laid out in batches between events, and a view scrolled to the bottom
+# stays there as the batches finish.
+
+import itertools
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+from PyQt6.QtWidgets import (
+    QAbstractItemView,
+    QApplication,
+    QListView,
+    QMenu,
+    QStyle,
+    QStyledItemDelegate,
+)
+from PyQt6.QtCore import (
+    QAbstractListModel,
+    QModelIndex,
+    QPointF,
+    QRect,
+    QRectF,
+    QSize,
+    Qt,
+    QUrl,
+    pyqtSignal,
+)
+from PyQt6.QtGui import (
+    QAbstractTextDocumentLayout,
+    QColor,
+    QImageReader,
+    QKeySequence,
+    QPainter,
+    QPalette,
+    QPixmap,
+    QPixmapCache,
+    QTextDocument,
+)
+
+BUBBLE_COLORS = {"user": "#92D050", "bot": "#E8F5E9", "system": "#E0E0E0", "image": "#92D050"}
+TEXT_COLORS = {"system": "#666666"}
+BUBBLE_WIDTH = {"system": 0.6}  # share of the viewport, default 0.7
+PAD_X, PAD_Y = 18, 12
+MARGIN_Y = 8
+RADIUS = 18
+IMAGE_MAX_HEIGHT = 320
+DOC_CACHE_SIZE = 200  # laid out documents kept around, a few screens' worth
+LAYOUT_BATCH = 100  # rows laid out per event
+# Qt.ItemDataRole.UserRole + 1 and DisplayRole, as ints: the first use of a
+# Qt.* enum builds all of PyQt's Qt enums (~15 ms), which shouldn't happen at import
+ROLE_MESSAGE = 257
+ROLE_DISPLAY = 0
+
+_ids = itertools.count()
+
+
+def make_message(
+    kind: str,
+    text: str,
+    html: str = "",
+    note: str = "",
+    ts: Optional[float] = None,
+    seq: Optional[int] = None,
+) -> Dict:
+    """kind is user, bot, system or image (text is then the image path).
+
+    seq is the message's row in the session, once it's saved.
+    """
+    return {
+        "id": next(_ids),
+        "rev": 0,
+        "kind": kind,
+        "text": text,
+        "html": html,
+        "note": note,
+        "ts": ts or time.time(),
+        "seq": seq,
+    }
+
+
+class ChatModel(QAbstractListModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows: List[Dict] = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index, role=ROLE_DISPLAY):
+        if not index.isValid() or not 0 <= index.row() < len(self._rows):
+            return None
+        row = self._rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return row["text"]
+        if role == ROLE_MESSAGE:
+            return row
+        return None
+
+    def message(self, row: int) -> Dict:
+        return self._rows[row]
+
+    def row_of(self, seq: int) -> Optional[int]:
+        # newest first: jumps usually go to something recent
+        for row in range(len(self._rows) - 1, -1, -1):
+            if self._rows[row]["seq"] == seq:
+                return row
+        return None
+
+    def append(self, message: Dict) -> int:
+        row = len(self._rows)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._rows.append(message)
+        self.endInsertRows()
+        return row
+
+    def prepend(self, messages: Iterable[Dict]) -> int:
+        messages = list(messages)
+        if messages:
+            self.beginInsertRows(QModelIndex(), 0, len(messages) - 1)
+            self._rows[:0] = messages
+            self.endInsertRows()
+        return len(messages)
+
+    def update(self, row: int, text: str, html: str, note: str = "") -> None:
+        message = self._rows[row]
+        message.update(text=text, html=html, note=note)
+        # bumping rev makes the delegate drop the cached layout
+        message["rev"] += 1
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def clear(self) -> None:
+        self.beginResetModel()
+        self._rows.clear()
+        self.endResetModel()
+
+
+class BubbleDelegate(QStyledItemDelegate):
+    def __init__(self, view: "ChatView"):
+        super().__init__(view)
+        self.view = view
+        # (id, width) -> (rev, document), least recently used first
+        self._docs: "OrderedDict[Tuple[int, int], Tuple[int, QTextDocument]]" = OrderedDict()
+        # id -> (rev, viewport width, size); a few ints per message, recomputed on resize
+        self._sizes: Dict[int, Tuple[int, int, QSize]] = {}
+
+    def forget(self) -> None:
+        self._docs.clear()
+        self._sizes.clear()
+
+    def _max_width(self, kind: str) -> int:
+        return max(120, int(self.view.viewport().width() * BUBBLE_WIDTH.get(kind, 0.7)))
+
+    def document(self, message: Dict) -> QTextDocument:
+        width = self._max_width(message["kind"])
+        key = (message["id"], width)
+        cached = self._docs.get(key)
+        if cached is not None and cached[0] == message["rev"]:
+            self._docs.move_to_end(key)
+            return cached[1]
+        doc = QTextDocument()
+        doc.setDefaultFont(self.view.font())
+        doc.setDocumentMargin(0)
+        doc.setHtml(message["html"])
+        doc.setTextWidth(width - 2 * PAD_X)
+        # shrink short messages to their text
+        doc.setTextWidth(min(width - 2 * PAD_X, doc.idealWidth()))
+        self._docs[key] = (message["rev"], doc)
+        self._docs.move_to_end(key)
+        while len(self._docs) > DOC_CACHE_SIZE:
+            self._docs.popitem(last=False)
+        return doc
+
+    def _image_size(self, path: str, max_width: int) -> QSize:
+        size = QImageReader(path).size()
+        if not size.isValid() or size.isEmpty():
+            return QSize(160, 40)
+        return size.scaled(
+            min(max_width, size.width()),
+            min(IMAGE_MAX_HEIGHT, size.height()),
+            Qt.AspectRatioMode.KeepAspectRatio,
+        )
+
+    def bubble_size(self, message: Dict) -> QSize:
+        width = self.view.viewport().width()
+        cached = self._sizes.get(message["id"])
+        if cached is not None and cached[0] == message["rev"] and cached[1] == width:
+            return cached[2]
+        if message["kind"] == "image":
+            image = self._image_size(message["text"], self._max_width("image") - 2 * PAD_X)
+            caption = self.view.fontMetrics().height()
+            size = QSize(image.width() + 2 * PAD_X, image.height() + caption + 2 * PAD_Y)
+        else:
+            doc = self.document(message)
+            doc_size = doc.size()
+            size = QSize(
+                int(doc_size.width()) + 2 * PAD_X, int(doc_size.height()) + 2 * PAD_Y
+            )
+        self._sizes[message["id"]] = (message["rev"], width, size)
+        return size
+
+    def remeasure(self, message: Dict) -> bool:
+        """Measure a changed message again; True if its row's height changed."""
+        cached = self._sizes.get(message["id"])
+        size = self.bubble_size(message)
+        return (
+            cached is None
+            or cached[1] != self.view.viewport().width()
+            or cached[2].height() != size.height()
+        )
+
+    def bubble_rect(self, message: Dict, rect: QRect) -> QRect:
+        size = self.bubble_size(message)
+        top = rect.top() + MARGIN_Y // 2
+        if message["kind"] in ("user", "image"):
+            left = rect.right() - size.width() - PAD_X
+        elif message["kind"] == "system":
+            left = rect.left() + (rect.width() - size.width()) // 2
+        else:
+            left = rect.left() + PAD_X
+        return QRect(left, top, size.width(), size.height())
+
+    def sizeHint(self, option, index):
+        message = index.data(ROLE_MESSAGE)
+        if message is None:
+            return QSize(0, 0)
+        return QSize(self.view.viewport().width(), self.bubble_size(message).height() + MARGIN_Y)
+
+    def paint(self, painter, option, index):
+        message = index.data(ROLE_MESSAGE)
+        if painter is None or message is None:
+            return
+        rect = self.bubble_rect(message, option.rect)
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(QColor(BUBBLE_COLORS.get(message["kind"], "#FFFFFF")))
+        painter.drawRoundedRect(QRectF(rect), RADIUS, RADIUS)
+        if option.state & QStyle.StateFlag.State_Selected:
+            painter.setPen(QColor("#3b82f6"))
+            painter.setBrush(Qt.BrushStyle.NoBrush)
+            painter.drawRoundedRect(QRectF(rect).adjusted(1, 1, -1, -1), RADIUS, RADIUS)
+        if message["kind"] == "image":
+            self._paint_image(painter, message, rect)
+        else:
+            painter.translate(rect.left() + PAD_X, rect.top() + PAD_Y)
+            ctx = QAbstractTextDocumentLayout.PaintContext()
+            ctx.palette.setColor(
+                QPalette.ColorRole.Text, QColor(TEXT_COLORS.get(message["kind"], "#000000"))
+            )
+            self.document(message).documentLayout().draw(painter, ctx)
+        painter.restore()
+
+    def _paint_image(self, painter: QPainter, message: Dict, rect: QRect) -> None:
+        caption = self.view.fontMetrics().height()
+        target = QRect(
+            rect.left() + PAD_X,
+            rect.top() + PAD_Y,
+            rect.width() - 2 * PAD_X,
+            rect.height() - 2 * PAD_Y - caption,
+        )
+        key = f"{message['text']}@{target.width()}x{target.height()}"
+        pixmap = QPixmapCache.find(key)
+        if pixmap is None:
+            # decode straight to thumbnail size instead of holding the full image
+            reader = QImageReader(message["text"])
+            reader.setScaledSize(target.size())
+            image = reader.read()
+            pixmap = QPixmap.fromImage(image) if not image.isNull() else QPixmap()
+            QPixmapCache.insert(key, pixmap)
+        if pixmap.isNull():
+            painter.setPen(QColor("#666666"))
+            painter.drawText(target, Qt.AlignmentFlag.AlignCenter, "[image unavailable]")
+        else:
+            painter.drawPixmap(target, pixmap)
+        painter.setPen(QColor("#999999"))
+        painter.drawText(
+            QRect(target.left(), target.bottom(), target.width(), caption + PAD_Y // 2),
+            Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter,
+            time.strftime("%H:%M", time.localtime(message["ts"])),
+        )
+
+    def anchor_at(self, message: Dict, rect: QRect, pos) -> str:
+        if message["kind"] == "image":
+            return ""
+        bubble = self.bubble_rect(message, rect)
+        local = QPointF(pos.x() - bubble.left() - PAD_X, pos.y() - bubble.top() - PAD_Y)
+        return self.document(message).documentLayout().anchorAt(local)
+
+
+class ChatView(QListView):
+    """Transcript view; add messages through model()."""
+
+    linkActivated = pyqtSignal(QUrl)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setModel(ChatModel(self))
+        self._delegate = BubbleDelegate(self)
+        self.setItemDelegate(self._delegate)
+        self.model().modelReset.connect(self._delegate.forget)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setLayoutMode(QListView.LayoutMode.Batched)
+        self.setBatchSize(LAYOUT_BATCH)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.setMouseTracking(True)
+        self.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.customContextMenuRequested.connect(self.show_context_menu)
+        self._follow = True  # at the bottom, and staying there while rows are laid out
+        vsb = self.verticalScrollBar()
+        if vsb is not None:
+            vsb.setSingleStep(24)
+            vsb.valueChanged.connect(self._on_value)
+            vsb.rangeChanged.connect(self._on_range)
+
+    def chat_model(self) -> ChatModel:
+        return self.model()
+
+    def _on_value(self, value: int) -> None:
+        self._follow = value >= self.verticalScrollBar().maximum() - 4
+
+    def _on_range(self, minimum: int, maximum: int) -> None:
+        if self._follow:
+            self.verticalScrollBar().setValue(maximum)
+
+    def layout_now(self) -> None:
+        """Finish laying out all rows, for when positions must be exact (paging, jumps)."""
+        self.setLayoutMode(QListView.LayoutMode.SinglePass)
+        self.doItemsLayout()
+        self.setLayoutMode(QListView.LayoutMode.Batched)
+
+    def dataChanged(self, topLeft, bottomRight, roles=()):
+        if topLeft == bottomRight and topLeft.isValid():
+            message = topLeft.data(ROLE_MESSAGE)
+            if message is not None and not self._delegate.remeasure(message):
+                # same height: nothing moves, so repaint the row instead of laying out all of them
+                viewport = self.viewport()
+                if viewport is not None:
+                    viewport.update(self.visualRect(topLeft))
+                return
+        super().dataChanged(topLeft, bottomRight, list(roles))
+
+    def at_bottom(self) -> bool:
+        # the scroll bar's maximum is short of the end while batches are pending
+        return self._follow
+
+    def _message_at(self, pos) -> Tuple[Optional[Dict], str]:
+        index = self.indexAt(pos)
+        if not index.isValid():
+            return None, ""
+        message = index.data(ROLE_MESSAGE)
+        return message, self._delegate.anchor_at(message, self.visualRect(index), pos)
+
+    def mouseMoveEvent(self, e):
+        _, anchor = self._message_at(e.position().toPoint())
+        viewport = self.viewport()
+        if viewport is not None:
+            viewport.setCursor(
+                Qt.CursorShape.PointingHandCursor if anchor else Qt.CursorShape.ArrowCursor
+            )
+        super().mouseMoveEvent(e)
+
+    def mouseReleaseEvent(self, e):
+        if e.button() == Qt.MouseButton.LeftButton:
+            _, anchor = self._message_at(e.position().toPoint())
+            if anchor:
+                self.linkActivated.emit(QUrl(anchor))
+        super().mouseReleaseEvent(e)
+
+    def keyPressEvent(self, e):
+        if e.matches(QKeySequence.StandardKey.Copy):
+            index = self.currentIndex()
+            if index.isValid():
+                self._copy(index.data(ROLE_MESSAGE))
+            return
+        super().keyPressEvent(e)
+
+    def _copy(self, message: Optional[Dict]) -> None:
+        cb = QApplication.clipboard()
+        if message is not None and cb is not None:
+            cb.setText(message["text"])
+
+    def show_context_menu(self, pos):
+        message, anchor = self._message_at(pos)
+        if message is None:
+            return
+        if not anchor:
+            # fall back to the first link in the message
+            match = re.search(r'href="([^"]+)"', message["html"])
+            anchor = match.group(1) if match else ""
+        menu = QMenu(self)
+        copy_action = menu.addAction("Copy Message")
+        open_link_action = menu.addAction("Open Link")
+        if open_link_action is not None:
+            open_link_action.setEnabled(bool(anchor) or message["kind"] == "image")
+        action = menu.exec(self.mapToGlobal(pos))
+        if action == copy_action:
+            self._copy(message)
+        elif action == open_link_action:
+            if message["kind"] == "image":
+                self.linkActivated.emit(QUrl.fromLocalFile(message["text"]))
+            else:
+                self.linkActivated.emit(QUrl(anchor))
@@ -0,0 +1,169 @@
+# Quote verification: do the passages an answer quotes appear in the search results?
+#
+# The system prompt asks the model to cite the exact text it found. Every
+# search result of the session is added to a word-level suffix automaton
+# (results separated so a match can't span two of them). A quote is walked
+# through the automaton once, which gives for each of its words the longest
+# run ending there that occurs in the sources, so a check is linear in the
+# quote's length. A quote found whole is "verified"; one mostly made of runs of
+# RUN_WORDS or more is "fuzzy" (a word changed or left out); the rest are
+# "unsupported". Words are compared after Lexicon.normalize, so case and
+# punctuation don't matter.
+
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from Lexicon import normalize
+
+MIN_QUOTE_WORDS = 4  # shorter quoted bits are terms, not citations
+RUN_WORDS = 3  # shortest run of source words that counts towards a fuzzy match
+FUZZY_SHARE = 0.6  # share of the quote's words that must be in such runs
+
+# "…", “…”, „…“, ”…” (Finnish), «…», »…» and runs of markdown "> " lines
+_QUOTE = re.compile(
+    r'"([^"\n]+)"|[“„]([^“”\n]+)[”“]|”([^”\n]+)”|«([^»\n]+)»|»([^»\n]+)»'
+    r"|((?:^>[^\n]*(?:\n|$))+)",
+    re.MULTILINE,
+)
+_BLOCKQUOTE_MARK = re.compile(r"^>[ \t]?", re.MULTILINE)
+
+
+def find_quotes(text: str, final: bool = True) -> List[Tuple[int, str]]:
+    """(end offset, quoted text) for each quote in text.
+
+    While text is still streaming (final=False) a blockquote reaching the end
+    may still grow, so it's left out.
+    """
+    quotes = []
+    for m in _QUOTE.finditer(text):
+        block = m.group(6)
+        if block is None:
+            quotes.append((m.end(), next(g for g in m.groups() if g is not None)))
+            continue
+        if not final and not block.endswith("\n"):
+            continue
+        # the end of the last line, so a badge stays inside the blockquote
+        quotes.append((m.start(6) + len(block.rstrip("\n")), _BLOCKQUOTE_MARK.sub("", block)))
+    return quotes
+
+
+class SourceIndex:
+    """Suffix automaton over the words of all sources added. Thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            # state 0 is the root; states are (transitions, suffix link, longest length)
+            self._next: List[Dict[int, int]] = [{}]
+            self._link: List[int] = [-1]
+            self._len: List[int] = [0]
+            self._last = 0
+            self._words: Dict[str, int] = {}
+            self._sources = 0
+            # quote -> verdict, so re-checking a streaming answer only walks new quotes
+            self._verdicts: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return self._sources
+
+    def add(self, text: str) -> None:
+        words = normalize(text).split()
+        if not words:
+            return
+        with self._lock:
+            if self._sources:
+                # a separator no quote contains, so no match spans two sources
+                self._extend(-self._sources)
+            for word in words:
+                self._extend(self._words.setdefault(word, len(self._words)))
+            self._sources += 1
+            self._verdicts.clear()
+
+    def _extend(self, c: int) -> None:
+        # the standard online construction, one word at a time
+        nxt, link, length = self._next, self._link, self._len
+        cur = len(length)
+        nxt.append({})
+        link.append(0)
+        length.append(length[self._last] + 1)
+        p = self._last
+        while p != -1 and c not in nxt[p]:
+            nxt[p][c] = cur
+            p = link[p]
+        if p != -1:
+            q = nxt[p][c]
+            if length[p] + 1 == length[q]:
+                link[cur] = q
+            else:
+                clone = len(length)
+                nxt.append(dict(nxt[q]))
+                link.append(link[q])
+                length.append(length[p] + 1)
+                while p != -1 and nxt[p].get(c) == q:
+                    nxt[p][c] = clone
+                    p = link[p]
+                link[q] = link[cur] = clone
+        self._last = cur
+
+    def runs(self, words: List[str]) -> List[int]:
+        """For each word, the length of the longest run ending there that occurs in the sources."""
+        # words never seen in a source are None, which no transition has
+        ids = [self._words.get(w) for w in words]
+        nxt, link, length = self._next, self._link, self._len
+        state = matched = 0
+        runs = []
+        for c in ids:
+            while state and c not in nxt[state]:
+                state = link[state]
+                matched = length[state]
+            if c in nxt[state]:
+                state = nxt[state][c]
+                matched += 1
+            else:
+                state = matched = 0
+            runs.append(matched)
+        return runs
+
+    def verdict(self, quote: str) -> Optional[str]:
+        """verified, fuzzy or unsupported; None for quotes too short to be citations."""
+        words = normalize(quote).split()
+        if len(words) < MIN_QUOTE_WORDS:
+            return None
+        with self._lock:
+            cached = self._verdicts.get(quote)
+            if cached is not None:
+                return cached
+            runs = self.runs(words)
+            if runs[-1] == len(words):
+                result = "verified"
+            else:
+                # walk back from the end; a run covers its words
+                covered, reach = 0, len(words)
+                for i in range(len(words) - 1, -1, -1):
+                    if runs[i] >= RUN_WORDS:
+                        reach = min(reach, i - runs[i] + 1)
+                    if i >= reach:
+                        covered += 1
+                result = "fuzzy" if covered >= FUZZY_SHARE * len(words) else "unsupported"
+            self._verdicts[quote] = result
+            return result
+
+    def check(self, text: str, final: bool = True) -> List[Tuple[int, str]]:
+        """(end offset, verdict) for each quote in text; empty while there are no sources."""
+        if not self._sources:
+            return []
+        checked = []
+        for end, quote in find_quotes(text, final):
+            verdict = self.verdict(quote)
+            if verdict is not None:
+                checked.append((end, verdict))
+        return checked
+
+    def reset(self, sources: Iterable[str]) -> None:
+        self.clear()
+        for text in sources:
+            self.add(text)
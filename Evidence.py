@@ -0,0 +1,121 @@
+# Evidence stage: compress search results before they go into the conversation context
+#
+# Scraped pages are split into sentences. Sentences whose word 3-shingles are
+# mostly already in the context (an earlier search of the same article, a
+# quote in an answer) or earlier in the same results are dropped. The rest
+# are scored against the query, expanded with the lexicon's synonyms, and the
+# best ones are kept up to EVIDENCE_TOKENS, in their original order and under
+# their "Source:" line. Tokens are counted as words, like ContextManager.
+
+import os
+import re
+from typing import Dict, Iterable, List, Set, Tuple
+
+from Lexicon import expand, find_terms, normalize
+
+EVIDENCE_TOKENS = int(os.environ.get("HYGIEIA_EVIDENCE_TOKENS", 200))  # per search
+SHINGLE = 3  # words per shingle
+DUPLICATE_SHARE = 0.6  # a sentence whose shingles are this much known already is dropped
+LEAD_BONUS = 0.5  # an article's first sentences usually define the topic
+MIN_STEM = 4
+ALREADY_KNOWN = "Nothing new: these results are already in the conversation above."
+
+# a full stop after these doesn't end a sentence
+ABBREVIATIONS = {"esim", "mm", "ns", "n", "ks", "tms", "yms", "jne", "ym", "vrt", "eg", "ie", "etc", "vs", "dr", "prof"}
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'(A-ZÅÄÖ0-9])")
+_SOURCE = re.compile(r"^Source:\s*(\S+)\s*$", re.MULTILINE)
+
+
+def split_sentences(text: str) -> List[List[str]]:
+    """Paragraphs of text as lists of sentences."""
+    paragraphs = []
+    for block in re.split(r"\n\s*\n", text):
+        block = " ".join(block.split())
+        if not block:
+            continue
+        sentences: List[str] = []
+        for piece in _SENTENCE_END.split(block):
+            last = sentences[-1].rsplit(None, 1)[-1].rstrip(".").lower() if sentences else ""
+            if last in ABBREVIATIONS:
+                sentences[-1] += " " + piece
+            else:
+                sentences.append(piece)
+        paragraphs.append(sentences)
+    return paragraphs
+
+
+def shingles(text: str) -> Set[int]:
+    words = normalize(text).split()
+    if len(words) < SHINGLE:
+        return {hash(tuple(words))} if words else set()
+    return {hash(tuple(words[i : i + SHINGLE])) for i in range(len(words) - SHINGLE + 1)}
+
+
+def known_shingles(messages: Iterable[Dict]) -> Set[int]:
+    seen: Set[int] = set()
+    for m in messages:
+        content = m.get("content")
+        if isinstance(content, str):
+            seen |= shingles(content)
+    return seen
+
+
+def query_stems(query: str) -> Set[str]:
+    # the query's words plus the lexicon's base forms and synonyms, cut to stems for inflection
+    words = normalize(query).split()
+    for term in find_terms(query):
+        for variant in expand(term):
+            words.extend(normalize(variant).split())
+    return {w[: max(MIN_STEM, len(w) - 2)] for w in words if len(w) >= MIN_STEM or w.isdigit()}
+
+
+def score(sentence: str, stems: Set[str]) -> float:
+    words = normalize(sentence).split()
+    return float(sum(1 for stem in stems if any(w.startswith(stem) for w in words)))
+
+
+def compress(
+    info: str,
+    query: str,
+    context: Iterable[Dict] = (),
+    budget: int = EVIDENCE_TOKENS,
+) -> Tuple[str, Dict]:
+    """Evidence text for query from raw search results, and counts of what was dropped."""
+    sources = _SOURCE.findall(info)
+    body = _SOURCE.sub("", info)
+    seen = known_shingles(context)
+    stems = query_stems(query)
+    candidates: List[Tuple[float, int, int, str]] = []  # (score, order, paragraph, sentence)
+    stats = {"sentences": 0, "duplicates": 0, "words_in": len(body.split()), "words_out": 0}
+    order = 0
+    for p, paragraph in enumerate(split_sentences(body)):
+        for sentence in paragraph:
+            stats["sentences"] += 1
+            grams = shingles(sentence)
+            if grams and len(grams & seen) >= DUPLICATE_SHARE * len(grams):
+                stats["duplicates"] += 1
+                continue
+            seen |= grams
+            lead = LEAD_BONUS / (1 + order)
+            candidates.append((score(sentence, stems) + lead, order, p, sentence))
+            order += 1
+    kept: List[Tuple[int, int, str]] = []
+    words = 0
+    for _, i, p, sentence in sorted(candidates, key=lambda c: (-c[0], c[1])):
+        n = len(sentence.split())
+        # the best sentence always goes in, even if it alone is over budget
+        if kept and words + n > budget:
+            continue
+        kept.append((i, p, sentence))
+        words += n
+    stats["words_out"] = words
+    paragraphs: Dict[int, List[str]] = {}
+    for _, p, sentence in sorted(kept):
+        paragraphs.setdefault(p, []).append(sentence)
+    text = "\n\n".join(" ".join(sentences) for sentences in paragraphs.values())
+    if not text:
+        text = ALREADY_KNOWN
+    header = "".join(f"Source: {url}\n" for url in sources)
+    return f"{header}\n{text}" if header else text, stats
+
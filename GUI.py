@@ -1,12 +1,12 @@
 import sys
 import logging
-import markdown
 import datetime
+import html
+import os
 from pathlib import Path
+from typing import Optional
 from PyQt6.QtWidgets import (
-    QApplication,
     QMainWindow,
-    QTextEdit,
     QLineEdit,
     QPushButton,
     QVBoxLayout,
@@ -15,56 +15,124 @@ from PyQt6.QtWidgets import (
     QProgressBar,
     QHBoxLayout,
     QMessageBox,
-    QMenu,
+    QCheckBox,
+    QInputDialog,
+    QLabel,
+    QListWidget,
+    QListWidgetItem,
+    QAbstractItemView,
+    QFrame,
 )
-from PyQt6.QtCore import Qt, pyqtSignal, QThread, QObject, pyqtSlot, QEvent
-from PyQt6.QtGui import QKeyEvent, QDragEnterEvent, QDropEvent
+from PyQt6.QtCore import Qt, pyqtSignal, QThread, QObject, pyqtSlot, QEvent, QTimer
+from PyQt6.QtGui import QKeyEvent, QDragEnterEvent, QDropEvent, QKeySequence
+from ChatView import ChatView, make_message
 
 logging.basicConfig(level=logging.INFO)
 
 QSS_PATH = "style.qss"
-HTML_PATH = "main.html"
+SEARCH_DELAY_MS = 150  # search once typing pauses
+SEARCH_RESULTS_HEIGHT = 180
+SPEAKERS = {"user": "You", "bot": "Hygieia"}
+# Citations.py verdicts -> (badge, color) shown after a quoted passage
+QUOTE_BADGES = {
+    "verified": ("✓ in sources", "#2e7d32"),
+    "fuzzy": ("≈ close to sources", "#b26a00"),
+    "unsupported": ("✗ not in sources", "#c62828"),
+}
 
 
 class ChatbotUI(QMainWindow):
     sendMessage = pyqtSignal(str)
-    sendImage = pyqtSignal(str)
+    # image paths dropped or picked together
+    sendImages = pyqtSignal(list)
+    stopGeneration = pyqtSignal()
+    newSession = pyqtSignal()
+    openSession = pyqtSignal(str)
+    profilingToggled = pyqtSignal(bool)
 
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Hygieia - Medical AI Chatbot")
         self.setGeometry(100, 100, 600, 500)
         self.setMinimumSize(400, 400)
-        self.messages = []
+        self._bot_index = -1
         self._is_sending = False
         self._message_history = []
         self._history_index = -1
+        # set by ChatbotLogic; imports report their timing here
+        self.telemetry = None
+        # Sessions.SessionStore set by ChatbotLogic; shown messages are saved to it
+        self.session = None
+        # seq of the oldest message on screen, None once the whole history is loaded
+        self._oldest_seq = None
         self.main_layout = QVBoxLayout()
         central = QWidget()
         central.setLayout(self.main_layout)
         self.setCentralWidget(central)
 
-        self.chat_display = QTextEdit()
-        self.chat_display.setReadOnly(True)
-        self.chat_display.setAcceptRichText(True)
-        self.chat_display.setTextInteractionFlags(
-            Qt.TextInteractionFlag.TextBrowserInteraction
-        )
-        self.chat_display.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
-        self.chat_display.customContextMenuRequested.connect(self.show_context_menu)
-        self.chat_display.setAcceptDrops(True)
+        # red flags found by Triage.py stay pinned above the conversation until dismissed
+        self.alert_banner = QFrame()
+        self.alert_banner.setObjectName("alertBanner")
+        self.alert_banner.setStyleSheet("QFrame#alertBanner { background-color: #c62828; }")
+        alert_layout = QHBoxLayout(self.alert_banner)
+        self.alert_label = QLabel()
+        self.alert_label.setTextFormat(Qt.TextFormat.RichText)
+        self.alert_label.setWordWrap(True)
+        self.alert_label.setStyleSheet("color: #fff;")
+        alert_layout.addWidget(self.alert_label, 1)
+        alert_close = QPushButton("✕")
+        alert_close.setObjectName("alertClose")
+        alert_close.clicked.connect(self.dismiss_alert)
+        alert_layout.addWidget(alert_close, 0, Qt.AlignmentFlag.AlignTop)
+        self.alert_banner.setVisible(False)
+        self.main_layout.addWidget(self.alert_banner)
+
+        # full-text search over the whole session (Ctrl+F); a result jumps to its bubble
+        self.search_field = QLineEdit()
+        self.search_field.setPlaceholderText("Search this conversation...")
+        self.search_field.setClearButtonEnabled(True)
+        self.search_field.setVisible(False)
+        self.main_layout.addWidget(self.search_field)
+        self.search_results = QListWidget()
+        self.search_results.setMaximumHeight(SEARCH_RESULTS_HEIGHT)
+        self.search_results.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.search_results.itemActivated.connect(self._on_search_result)
+        self.search_results.itemClicked.connect(self._on_search_result)
+        self.search_results.setVisible(False)
+        self.main_layout.addWidget(self.search_results)
+        self._search_timer = QTimer(self)
+        self._search_timer.setSingleShot(True)
+        self._search_timer.setInterval(SEARCH_DELAY_MS)
+        self._search_timer.timeout.connect(self.run_search)
+        self.search_field.textChanged.connect(self._search_timer.start)
+
+        # only the visible bubbles are laid out and painted
+        self.chat_display = ChatView()
+        self.chat_model = self.chat_display.chat_model()
+        self.chat_display.linkActivated.connect(self.open_link)
+        # drops go to the window, see dropEvent
+        self.setAcceptDrops(True)
+        vsb = self.chat_display.verticalScrollBar()
+        if vsb is not None:
+            vsb.valueChanged.connect(self._on_scroll)
         self.main_layout.addWidget(self.chat_display)
 
         input_layout = QHBoxLayout()
         self.input_field = QLineEdit()
         self.input_field.setPlaceholderText("Type your message here...")
         self.input_field.installEventFilter(self)
+        self.search_field.installEventFilter(self)
         input_layout.addWidget(self.input_field)
 
         self.send_button = QPushButton("Send")
         self.send_button.clicked.connect(self.send_text)
         input_layout.addWidget(self.send_button)
 
+        self.stop_button = QPushButton("Stop")
+        self.stop_button.clicked.connect(self.stopGeneration.emit)
+        self.stop_button.setVisible(False)
+        input_layout.addWidget(self.stop_button)
+
         self.attach_button = QPushButton("Attach Image")
         self.attach_button.clicked.connect(self.attach_image)
         input_layout.addWidget(self.attach_button)
@@ -75,18 +143,41 @@ class ChatbotUI(QMainWindow):
 
         self.main_layout.addLayout(input_layout)
 
+        options_layout = QHBoxLayout()
         self.clear_button = QPushButton("Clear Conversation")
         self.clear_button.clicked.connect(self.clear_conversation)
-        self.main_layout.addWidget(self.clear_button)
+        options_layout.addWidget(self.clear_button)
+
+        # messages sent while Hygieia is answering either wait their turn or cut the answer short
+        self.interrupt_checkbox = QCheckBox("Interrupt answer on send")
+        options_layout.addWidget(self.interrupt_checkbox)
+        self.main_layout.addLayout(options_layout)
 
         self.progress_bar = QProgressBar()
         self.progress_bar.setMaximum(100)
         self.progress_bar.setVisible(False)
         self.main_layout.addWidget(self.progress_bar)
 
+        self.profile_action = None
+        menu_bar = self.menuBar()
+        if menu_bar is not None:
+            session_menu = menu_bar.addMenu("Session")
+            if session_menu is not None:
+                session_menu.addAction("New Session", self.newSession.emit)
+                session_menu.addAction("Open Session...", self.open_session_dialog)
+                search_action = session_menu.addAction("Search...", self.open_search)
+                if search_action is not None:
+                    search_action.setShortcut(QKeySequence(QKeySequence.StandardKey.Find))
+            debug_menu = menu_bar.addMenu("Debug")
+            if debug_menu is not None:
+                # one stack profile per turn into profiles/, see Profiler.py
+                self.profile_action = debug_menu.addAction("Profile Turns")
+                if self.profile_action is not None:
+                    self.profile_action.setCheckable(True)
+                    self.profile_action.toggled.connect(self.profilingToggled.emit)
+
         self.input_field.setFocus()
         self._load_stylesheet()
-        self._load_html_template()
 
     def _load_stylesheet(self):
         try:
@@ -95,17 +186,28 @@ class ChatbotUI(QMainWindow):
         except Exception:
             pass
 
-    def _load_html_template(self):
-        try:
-            with open(HTML_PATH, "r", encoding="utf-8") as f:
-                self.bubble_template = f.read()
-        except Exception:
-            self.bubble_template = None
-
     def eventFilter(self, a0, a1):
         # handle key events on the input field
         watched = a0
         event = a1
+        if (
+            watched == self.search_field
+            and isinstance(event, QKeyEvent)
+            and event.type() == QEvent.Type.KeyPress
+        ):
+            if event.key() == Qt.Key.Key_Escape:
+                self.close_search()
+                return True
+            elif event.key() in (Qt.Key.Key_Return, Qt.Key.Key_Enter):
+                self._search_timer.stop()
+                self.run_search()
+                if self.search_results.count():
+                    self._on_search_result(self.search_results.item(0))
+                return True
+            elif event.key() == Qt.Key.Key_Down and self.search_results.count():
+                self.search_results.setFocus()
+                self.search_results.setCurrentRow(0)
+                return True
         if (
             watched == self.input_field
             and isinstance(event, QKeyEvent)
@@ -116,6 +218,9 @@ class ChatbotUI(QMainWindow):
                     return False
                 self.send_text()
                 return True
+            elif event.key() == Qt.Key.Key_Escape:
+                self.stopGeneration.emit()
+                return True
             elif (
                 event.key() == Qt.Key.Key_L
                 and event.modifiers() & Qt.KeyboardModifier.ControlModifier
@@ -166,15 +271,18 @@ class ChatbotUI(QMainWindow):
         md = event.mimeData()
         if md is None or not hasattr(md, "urls"):
             return
+        images = []
         for url in md.urls():
             file_path = url.toLocalFile()
             if file_path.lower().endswith((".png", ".jpg", ".jpeg", ".bmp")):
                 self.add_user_image_message(file_path)
-                self.sendImage.emit(file_path)
+                images.append(file_path)
             elif file_path.lower().endswith((".pdf", ".docx", ".pptx")):
                 self.import_file_dialog(file_path)
             else:
                 self.display_error("Unsupported file type dropped.")
+        if images:
+            self.sendImages.emit(images)
         event.acceptProposedAction()
 
     def import_file_dialog(self, file_path=None):
@@ -186,7 +294,18 @@ class ChatbotUI(QMainWindow):
             try:
                 from anyFileRead import anyReader
 
+                # the turn is open while reading so a profile covers the extraction
+                record = self.telemetry.begin("import") if self.telemetry is not None else None
                 content = anyReader(file_path)
+                if record is not None:
+                    from Telemetry import readout
+
+                    summary = self.telemetry.finish(
+                        record,
+                        file_type=os.path.splitext(file_path)[1].lower(),
+                        chars=len(content or ""),
+                    )
+                    self.set_status(readout(summary))
                 if content:
                     self.add_system_message("Imported File Content:")
                     self.add_bot_message(str(content))
@@ -200,87 +319,215 @@ class ChatbotUI(QMainWindow):
 
         webbrowser.open(url.toString())
 
-    def _render_messages(self):
-        html = "\n".join(self.messages)
-        self.chat_display.setHtml(html)
-        vsb = self.chat_display.verticalScrollBar()
-        if vsb is not None:
-            vsb.setValue(vsb.maximum())
+    def _scroll_to_bottom(self):
+        self.chat_display.scrollToBottom()
 
-    def _format_message(self, message: str, align: str) -> str:
+    def _format_message(
+        self, message: str, note: str = "", ts: Optional[float] = None, quotes=()
+    ) -> str:
         import re
-
+        import markdown  # deferred so the window shows before it loads
+
+        # badges go in from the end so the earlier offsets stay valid
+        for end, verdict in sorted(quotes, reverse=True):
+            label, color = QUOTE_BADGES.get(verdict, ("", ""))
+            if label:
+                badge = f' <span style="font-size:11px; color:{color};">{label}</span>'
+                message = message[:end] + badge + message[end:]
         converted = markdown.markdown(
             message, extensions=["extra", "sane_lists", "smarty"]
         )
-        url_pattern = r"((https?://[\w\-._~:/?#\[\]@!$&'()*+,;=%]+))"
+        url_pattern = r"(?<![\"'>])(https?://[\w\-._~:/?#\[\]@!$&'()*+,;=%]+)"
         converted = re.sub(url_pattern, r'<a href="\1">\1</a>', converted)
-        cls = {
-            "right": "user-message",
-            "left": "bot-message",
-            "center": "system-message",
-        }.get(align, "user-message")
-        t = datetime.datetime.now().strftime("%H:%M")
-        justify = {"right": "flex-end", "left": "flex-start", "center": "center"}[align]
-        if self.bubble_template:
-            return self.bubble_template.format(
-                align=align,
-                cls=cls,
-                style=self._bubble_style(cls),
-                converted=converted,
-                t=t,
-                justify=justify,
-            )
-        # fallback
-        return f"""
-        <div class=\"message-container\" style=\"width:100%; display:flex; justify-content:{justify};\">
-            <div class=\"message-bubble {cls}\" style=\"{self._bubble_style(cls)}\">
-                {converted}<br>
-                <span style=\"font-size:10px; color:#999;\">{t}</span>
-            </div>
-        </div>
-        """
-
-    def _bubble_style(self, cls):
-        styles = {
-            "user-message": "border-radius: 22px 22px 22px 8px; background: #92D050; padding: 12px 18px; margin: 8px 0 8px 25%; max-width: 70%; box-shadow: 0 2px 8px rgba(0,0,0,0.08); text-align: right; display: inline-block; min-width: 40px; min-height: 28px; word-break: break-word;",
-            "bot-message": "border-radius: 22px 22px 8px 22px; background: #E8F5E9; padding: 12px 18px; margin: 8px 25% 8px 0; max-width: 70%; box-shadow: 0 2px 8px rgba(0,0,0,0.08); text-align: left; display: inline-block; min-width: 40px; min-height: 28px; word-break: break-word;",
-            "system-message": "border-radius: 20px; background: #E0E0E0; padding: 10px 16px; margin: 6px auto; max-width: 60%; text-align: center; color: #666; font-size: 13px; display: inline-block; min-width: 40px; min-height: 28px; word-break: break-word;",
-        }
-        return styles[cls]
+        t = self._timestamp(ts)
+        if note:
+            t = f"{note} · {t}"
+        return f'{converted}<p style="font-size:10px; color:#999;">{t}</p>'
+
+    @staticmethod
+    def _timestamp(ts: Optional[float] = None) -> str:
+        when = datetime.datetime.fromtimestamp(ts) if ts else datetime.datetime.now()
+        if when.date() != datetime.date.today():
+            return when.strftime("%d.%m.%Y %H:%M")
+        return when.strftime("%H:%M")
+
+    def _persist(self, kind: str, content: str, meta=None, row: int = -1) -> None:
+        if self.session is not None:
+            try:
+                seq = self.session.append_message(kind, content, meta)
+            except Exception as e:
+                logging.error(f"Failed to save message: {e}")
+                return
+            # the bubble remembers its saved row so search results can find it
+            self.mark_saved(row, seq)
+
+    def mark_saved(self, row: int, seq: int) -> None:
+        if 0 <= row < self.chat_model.rowCount():
+            self.chat_model.message(row)["seq"] = seq
+
+    def mark_answer_saved(self, seq: int) -> None:
+        # answers are streamed into their bubble and saved by ChatbotLogic once final
+        self.mark_saved(self._bot_index, seq)
+
+    def _append(self, kind: str, message: str, note: str = "") -> int:
+        html = "" if kind == "image" else self._format_message(message, note)
+        row = self.chat_model.append(make_message(kind, message, html, note))
+        self._scroll_to_bottom()
+        return row
+
+    def _is_last_user_message(self, message: str) -> bool:
+        count = self.chat_model.rowCount()
+        if not count:
+            return False
+        last = self.chat_model.message(count - 1)
+        return last["kind"] == "user" and last["text"] == message
 
     def add_user_message(self, message: str) -> None:
-        f = self._format_message(message, align="right")
-        if not self.messages or self.messages[-1] != f:
-            self.messages.append(f)
-            self._render_messages()
+        if not self._is_last_user_message(message):
+            row = self._append("user", message)
+            self._persist("user", message, row=row)
         self._message_history.append(message)
         self._history_index = -1
 
-    def add_bot_message(self, message: str) -> None:
-        f = self._format_message(message, align="left")
-        self.messages.append(f)
-        self._render_messages()
+    def add_bot_message(self, message: str, note: str = "", persist: bool = True) -> None:
+        self._bot_index = self._append("bot", message, note)
+        if persist:
+            self._persist("bot", message, {"note": note} if note else None, self._bot_index)
 
-    def add_system_message(self, message: str) -> None:
-        f = self._format_message(message, align="center")
-        self.messages.append(f)
-        self._render_messages()
+    def add_system_message(self, message: str, persist: bool = True) -> None:
+        row = self._append("system", message)
+        if persist:
+            self._persist("system", message, row=row)
 
     def add_user_image_message(self, image_path: str) -> None:
-        p = Path(image_path).absolute()
-        img_src = f"file:///{p.as_posix()}"
-        img_tag = f'<img src="{img_src}" style="max-width:80%; border-radius:10px;">'
-        t = datetime.datetime.now().strftime("%H:%M")
-        html = f"""
-        <div class=\"message-container\">\n            <div class=\"message-bubble user-message\">\n                {img_tag}<br>\n                <span style=\"font-size:10px; border-radius: 45px; color:#999;\">{t}</span>\n            </div>\n        </div>\n        """
-        self.messages.append(html)
-        self._render_messages()
-
-    def update_last_bot_message(self, message: str) -> None:
-        if self.messages:
-            self.messages[-1] = self._format_message(message, align="left")
-            self._render_messages()
+        row = self._append("image", str(Path(image_path).absolute()))
+        self._persist("image", image_path, row=row)
+
+    def _history_message(self, record):
+        kind, content, ts, seq = record["kind"], record["content"], record["ts"], record["seq"]
+        note = record["meta"].get("note", "")
+        quotes = record["meta"].get("quotes", ())
+        if kind == "image":
+            return make_message(kind, str(Path(content).absolute()), ts=ts, seq=seq)
+        kind = kind if kind in ("user", "bot") else "system"
+        html = self._format_message(content, note, ts, quotes)
+        return make_message(kind, content, html, note, ts, seq)
+
+    def show_history(self, records) -> None:
+        # replaces the view with saved messages; older ones page in when scrolled to the top
+        self.chat_model.clear()
+        self.chat_model.prepend(self._history_message(r) for r in records)
+        self._message_history = [r["content"] for r in records if r["kind"] == "user"]
+        self._history_index = -1
+        self._bot_index = -1
+        self._oldest_seq = records[0]["seq"] if records else None
+        if self.search_field.isVisible():
+            self.run_search()  # results were for the previous session
+        self._scroll_to_bottom()
+        vsb = self.chat_display.verticalScrollBar()
+        if vsb is not None and vsb.maximum() == 0:
+            # the page didn't fill the view, so there's no scrolling to trigger paging
+            self._load_older()
+
+    def _on_scroll(self, value: int) -> None:
+        vsb = self.chat_display.verticalScrollBar()
+        if vsb is not None and value == vsb.minimum() and vsb.maximum() > 0:
+            self._load_older()
+
+    def _load_older(self) -> None:
+        if self.session is None or self._oldest_seq is None:
+            return
+        from Sessions import PAGE_SIZE
+
+        self._prepend_history(self.session.messages_before(self._oldest_seq, PAGE_SIZE))
+
+    def _prepend_history(self, older) -> None:
+        if not older:
+            self._oldest_seq = None
+            return
+        self._oldest_seq = older[0]["seq"]
+        vsb = self.chat_display.verticalScrollBar()
+        # keep the same messages under the cursor while rows are added above them
+        from_bottom = vsb.maximum() - vsb.value() if vsb is not None else 0
+        added = self.chat_model.prepend(self._history_message(r) for r in older)
+        if self._bot_index >= 0:
+            self._bot_index += added
+        if vsb is not None:
+            self.chat_display.layout_now()
+            vsb.blockSignals(True)
+            vsb.setValue(vsb.maximum() - from_bottom)
+            vsb.blockSignals(False)
+
+    def open_search(self) -> None:
+        self.search_field.setVisible(True)
+        self.search_field.setFocus()
+        self.search_field.selectAll()
+        if self.search_field.text().strip():
+            self.run_search()
+
+    def close_search(self) -> None:
+        self._search_timer.stop()
+        self.search_field.setVisible(False)
+        self.search_results.setVisible(False)
+        self.input_field.setFocus()
+
+    def run_search(self) -> None:
+        query = self.search_field.text()
+        self.search_results.clear()
+        if not query.strip() or self.session is None:
+            self.search_results.setVisible(False)
+            return
+        results = self.session.search(query)
+        for result in results:
+            item = QListWidgetItem()
+            item.setData(Qt.ItemDataRole.UserRole, result["seq"])
+            label = QLabel(self._search_label(result))
+            label.setTextFormat(Qt.TextFormat.RichText)
+            item.setSizeHint(label.sizeHint())
+            self.search_results.addItem(item)
+            self.search_results.setItemWidget(item, label)
+        if not results:
+            item = QListWidgetItem("No matches.")
+            item.setFlags(Qt.ItemFlag.NoItemFlags)
+            self.search_results.addItem(item)
+        self.search_results.setVisible(True)
+
+    def _search_label(self, result) -> str:
+        from Sessions import HIT_END, HIT_START
+
+        snippet = html.escape(" ".join(result["snippet"].split()))
+        snippet = snippet.replace(HIT_START, "<b>").replace(HIT_END, "</b>")
+        who = SPEAKERS.get(result["kind"], "System")
+        return f'<span style="color:#999;">{who} · {self._timestamp(result["ts"])}</span>&nbsp; {snippet}'
+
+    def _on_search_result(self, item) -> None:
+        seq = item.data(Qt.ItemDataRole.UserRole) if item is not None else None
+        if seq is not None and not self.jump_to_message(seq):
+            self.set_status("That message isn't in the current view.")
+
+    def jump_to_message(self, seq: int) -> bool:
+        """Scroll to the saved message seq and select its bubble, paging in older history if needed."""
+        row = self.chat_model.row_of(seq)
+        if row is None and self.session is not None and self._oldest_seq is not None and seq < self._oldest_seq:
+            # everything between the match and the screen comes in, so scrolling stays continuous
+            self._prepend_history(self.session.messages_before(self._oldest_seq, self._oldest_seq - seq))
+            row = self.chat_model.row_of(seq)
+        if row is None:
+            return False
+        index = self.chat_model.index(row)
+        self.chat_display.layout_now()
+        self.chat_display.setCurrentIndex(index)
+        self.chat_display.scrollTo(index, QAbstractItemView.ScrollHint.PositionAtCenter)
+        return True
+
+    def update_last_bot_message(self, message: str, note: str = "", quotes=()) -> None:
+        # messages typed during generation land below the bubble being streamed
+        if 0 <= self._bot_index < self.chat_model.rowCount():
+            follow = self.chat_display.at_bottom()
+            html = self._format_message(message, note, quotes=quotes)
+            self.chat_model.update(self._bot_index, message, html)
+            if follow:
+                self._scroll_to_bottom()
 
     def send_text(self):
         if self._is_sending:
@@ -288,9 +535,7 @@ class ChatbotUI(QMainWindow):
         self._is_sending = True
         user_input = self.input_field.text().strip()
         if user_input:
-            if not self.messages or self.messages[-1] != self._format_message(
-                user_input, align="right"
-            ):
+            if not self._is_last_user_message(user_input):
                 self.add_user_message(user_input)
             self.input_field.clear()
             self.sendMessage.emit(user_input)
@@ -298,56 +543,68 @@ class ChatbotUI(QMainWindow):
         self._is_sending = False
 
     def attach_image(self):
-        file_path, _ = QFileDialog.getOpenFileName(
-            self, "Attach Image", "", "Images (*.png *.jpg *.jpeg *.bmp)"
+        file_paths, _ = QFileDialog.getOpenFileNames(
+            self, "Attach Images", "", "Images (*.png *.jpg *.jpeg *.bmp)"
         )
-        if file_path:
+        for file_path in file_paths:
             self.add_user_image_message(file_path)
-            self.sendImage.emit(file_path)
+        if file_paths:
+            self.sendImages.emit(file_paths)
 
     def import_file(self):
         self.import_file_dialog()
 
     def clear_conversation(self):
-        self.messages.clear()
-        self.chat_display.clear()
+        # only clears the view; the session keeps its history
+        self.chat_model.clear()
+        self.dismiss_alert()
+        self._bot_index = -1
+        self._oldest_seq = None
         self.input_field.setFocus()
 
     def set_input_enabled(self, enabled: bool):
-        self.input_field.setEnabled(enabled)
-        self.send_button.setEnabled(enabled)
+        # typing stays possible while generating; those messages are queued
         self.attach_button.setEnabled(enabled)
         self.import_button.setEnabled(enabled)
+        self.stop_button.setVisible(not enabled)
         if enabled:
             self.progress_bar.setVisible(False)
         else:
             self.progress_bar.setVisible(True)
             self.progress_bar.setMaximum(0)
 
+    def open_session_dialog(self):
+        from Sessions import describe_session, list_sessions
+
+        sessions = [describe_session(s) for s in list_sessions()]
+        if not sessions:
+            self.add_system_message("No saved sessions.", persist=False)
+            return
+        labels = [label for _, label in sessions]
+        label, ok = QInputDialog.getItem(self, "Open Session", "Session:", labels, 0, False)
+        if ok and label:
+            self.openSession.emit(sessions[labels.index(label)][0])
+
+    def show_alert(self, flags) -> None:
+        """Pin the emergency banner for Triage.Flag items; replaces what it showed before."""
+        lines = [
+            f"🚨 <b>{html.escape(f.title)}</b> ({html.escape(f.found)}): {html.escape(f.advice)}"
+            for f in flags
+        ]
+        self.alert_label.setText("<br>".join(lines))
+        self.alert_banner.setVisible(True)
+
+    def dismiss_alert(self) -> None:
+        self.alert_banner.setVisible(False)
+
+    def set_status(self, text: str) -> None:
+        bar = self.statusBar()
+        if bar is not None:
+            bar.showMessage(text)
+
+    def interrupt_on_send(self) -> bool:
+        return self.interrupt_checkbox.isChecked()
+
     def display_error(self, error_message):
         self.progress_bar.setVisible(False)
         QMessageBox.critical(self, "Error", error_message)
-
-    def show_context_menu(self, pos):
-        cursor = self.chat_display.cursorForPosition(pos)
-        cursor.select(cursor.SelectionType.LineUnderCursor)
-        selected_text = cursor.selectedText()
-        menu = QMenu(self)
-        copy_action = menu.addAction("Copy Message")
-        open_link_action = menu.addAction("Open Link")
-        action = menu.exec(self.chat_display.mapToGlobal(pos))
-        if action == copy_action:
-            if selected_text:
-                cb = QApplication.clipboard()
-                if cb is not None and hasattr(cb, "setText"):
-                    cb.setText(selected_text)
-        elif action == open_link_action:
-            # try to open selected text as URL
-            txt = selected_text.strip()
-            if txt.startswith("http://") or txt.startswith("https://"):
-                import webbrowser
-
-                webbrowser.open(txt)
-            else:
-                # nothing to open
-                pass
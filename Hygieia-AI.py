@@ -1,141 +1,26 @@
 import sys
-import base64
+import importlib
 import logging
+import os
+import threading
 import time
-from typing import List, Dict, Optional
+from collections import deque
+from functools import partial
+from typing import Deque, Dict, List, Optional, Tuple
 from PyQt6.QtWidgets import QApplication
-from PyQt6.QtCore import QThread, pyqtSignal, QObject, Qt
+from PyQt6.QtCore import QThread, QTimer, pyqtSignal, QObject, Qt
 from GUI import ChatbotUI
-from WebSearch import scrape_medical_info
-import ollama
+from LLM import ChatEngine, encode_image, encode_images, search_directive
+from ResponseCache import ResponseCache
+from Sessions import PAGE_SIZE, SessionStore
+from Telemetry import Telemetry, readout
+from Triage import ambiguous, second_opinion, triage
 
 logging.basicConfig(level=logging.INFO)
 
-MAX_CONTEXT_TOKENS = 12288
-MODEL_NAME = "gemma3:4b"
-SYSTEM_PROMPT = (
-    "Forget previous instructions. Answer very concisely and shortly. Only give summarized answers. "
-    "You are an empatic and scientific medical professional. Provide concise, accurate diagnoses and treatment recommendations, including exercises, medications, antibiotics, and dietary advice. "
-    "Respond to  user's latest message, incorporating context when beneficial. Use markdown formatting with emojis, and structure responses into clear sections. "
-    "Acknowledge user input, state conclusions upfront, and break down complex information into digestible parts. Maintain an informal, conversational tone, avoiding jargon unless requested. "
-    "If uncertain, admit it politely and never provide false or misleading information. Keep responses concise and efficient.\n\n"
-    "When beneficial, incorporate your autonomous search functionality by beginning your response with '/search' followed by  query text. Only search with Finnish one word queries such as syöpä, diabetes, päänsärky"
-    "This tells  system to automatically research and return additional, reliable information. Use this feature only when it improves your response and always mention what you found and from where. Site your exact found text."
-    """Take  following checklist into consideration when evaluating patients health: 
-    BLOOD PRESSURE  
-    - Normal adults: <120/80 mmHg  
-    - Elevated: 120–129/<80 mmHg  
-    - Hypertension: ≥140/90 mmHg (all adults, regardless of age/sex)  
-    - Children (1–13 yrs): ≥95th percentile for age/height = Hypertension  
-
-    HEART RATE (Resting)  
-    - Adults: 60–100 bpm  
-    - Newborn: 100–160 bpm  
-    - Infant (1–12 mo): 100–150 bpm  
-    - Child (1–10 yrs): 70–120 bpm  
-    - Tachycardia >100 bpm (adult), Bradycardia <60 bpm (adult)  
-
-    TEMPERATURE  
-    - Normal: 36.1–37.2 °C  
-    - Fever: ≥38.0 °C  
-    - Hypormia: <35.0 °C  
-
-    RESPIRATION RATE  
-    - Adults: 12–20 /min  
-    - Newborn: 30–60 /min  
-    - Infant: 30–53 /min  
-    - Child (1–12 yrs): 18–30 /min  
-
-    OXYGEN SATURATION  
-    - Normal ≥95% (all ages)  
-    - Hypoxemia <94%  
-
-    BLOOD GLUCOSE  
-    - Adults/Children:  
-    • Fasting: ≥126 mg/dL (7.0 mmol/L) = Diabetes  
-    • Random: ≥200 mg/dL (11.1 mmol/L) + symptoms = Diabetes  
-
-    HBA1c  
-    - ≥6.5% = Diabetes (all ages)  
-
-    BMI  
-    - Adults:  
-    • Overweight: 25–29.9  
-    • Obesity: ≥30  
-    - Children: BMI ≥95th percentile for age/sex = Obesity  
-
-    HEMOGLOBIN (Hb)  
-    - Men: <13 g/dL = Anemia  
-    - Women: <12 g/dL = Anemia  
-    - Children (6–59 mo): <11 g/dL = Anemia  
-    - Children (5–11 yrs): <11.5 g/dL  
-    - Children (12–14 yrs): <12 g/dL  
-
-    KIDNEY FUNCTION  
-    - CKD: eGFR <60 mL/min/1.73 m² for >3 months (all adults)  
-
-    SODIUM (Na+)  
-    - Normal: 135–145 mmol/L (all ages)  
-    - Hyponatremia: <135 mmol/L  
-    - Hypernatremia: >145 mmol/L  
-
-    POTASSIUM (K+)  
-    - Normal: 3.5–5.0 mmol/L (all ages)  
-    - Hypokalemia: <3.5 mmol/L  
-    - Hyperkalemia: >5.0 mmol/L  
-
-    TROPONIN  
-    - Any rise above assay upper reference = Myocardial injury (all ages/sexes)  
-
-    STROKE (FAST)  
-    - Any positive finding = Stroke suspicion (all ages) """
-)
-
-
-def summarize_context(context: List[Dict]) -> Dict:
-    prompt = [
-        {
-            "role": "system",
-            "content": "You are a helpful assistant. Summarize the following conversation context into the most important key points:",
-        },
-        *context,
-    ]
-    response = ollama.chat(model=MODEL_NAME, messages=prompt)
-    summary = response.get("message", {}).get("content", "")
-    return {"role": "assistant", "content": summary}
-
-
-class ContextManager:
-    def __init__(self, max_context_tokens: int):
-        self.context: List[Dict] = []
-        self.current_token_count = 0
-        self.max_context_tokens = max_context_tokens
-
-    def add_interaction(self, interaction: Dict) -> None:
-        tokens = len(interaction.get("content", "").split()) + 5
-        if self.current_token_count + tokens > self.max_context_tokens:
-            self.truncate_context()
-        self.context.append(interaction)
-        self.current_token_count += tokens
-
-    def truncate_context(self) -> None:
-        if len(self.context) > 1:
-            summary = summarize_context(self.context)
-            self.context = [summary]
-            self.current_token_count = len(summary.get("content", "").split()) + 5
-        else:
-            oldest = self.context.pop(0)
-            self.current_token_count -= len(oldest.get("content", "").split()) + 5
-
-
-def encode_image(image_path: Optional[str]) -> Optional[str]:
-    if image_path:
-        try:
-            with open(image_path, "rb") as f:
-                return base64.b64encode(f.read()).decode("utf-8")
-        except Exception as e:
-            logging.error(f"Failed to encode image {image_path}: {e}")
-    return None
+# turn summary fields saved with each answer
+ANSWER_META = ("ttft_s", "tokens_per_s", "eval_tokens", "duration_s", "cached", "stopped")
+IMAGE_BATCH_MS = 400  # images arriving this close together are sent as one turn
 
 
 class ResponseWorker(QObject):
@@ -143,52 +28,25 @@ class ResponseWorker(QObject):
     updateResponse = pyqtSignal(str)
     finishedResponse = pyqtSignal()
     errorOccurred = pyqtSignal(str)
+    # the watchdog retried or switched to the fallback model
+    noticeOccurred = pyqtSignal(str)
 
-    def __init__(self, prompt):
+    def __init__(self, engine: ChatEngine, prompt):
         super().__init__()
+        self.engine = engine
         self.prompt = prompt
         self.running = False
+        self._stop = threading.Event()
+
+    def stop(self):
+        # thread-safe; the engine closes the Ollama stream at its next chunk
+        self._stop.set()
 
     def run(self):
         self.running = True
-        response = ""
         try:
-            contains_images = any(
-                isinstance(m, dict) and "images" in m for m in self.prompt
-            )
-
-            if contains_images:
-                safe_messages = []
-                for m in self.prompt:
-                    if isinstance(m, dict) and "images" in m and m.get("images"):
-                        img = m["images"][0]
-                        preview = img[:200] + ("..." if len(img) > 200 else "")
-                        safe_messages.append(
-                            {
-                                "role": m.get("role"),
-                                "content": f"{m.get('content','')}\n[image_base64_preview]{preview}",
-                            }
-                        )
-                    else:
-                        safe_messages.append(m)
-                resp = ollama.chat(model=MODEL_NAME, messages=safe_messages)
-                response = resp.get("message", {}).get("content", "") or ""
+            for response in self.engine.stream(self.prompt, self._stop, self.noticeOccurred.emit):
                 self.updateResponse.emit(response)
-            else:
-                stream = ollama.chat(
-                    model=MODEL_NAME, messages=self.prompt, stream=True
-                )
-                last_activity = time.time()
-                timeout = 60
-                for chunk in stream:
-                    current_time = time.time()
-
-                    if current_time - last_activity > timeout:
-                        raise TimeoutError(f"No activity for {timeout} seconds")
-                    last_activity = current_time
-                    content = chunk.get("message", {}).get("content", "")
-                    response += content
-                    self.updateResponse.emit(response)
         except Exception as e:
             self.errorOccurred.emit(f"Error generating response: {str(e)}")
         finally:
@@ -196,18 +54,122 @@ class ResponseWorker(QObject):
             self.finishedResponse.emit()
 
 
+class TriageOpinion(QObject):
+    # (triage turn, flags) from the small model, for messages the rules were unsure of
+    flagged = pyqtSignal(int, list)
+
+    def __init__(self, engine: ChatEngine):
+        super().__init__()
+        self.engine = engine
+
+    def ask(self, text: str, turn: int):
+        # runs on a plain thread; the signal is queued to the UI thread
+        start = time.perf_counter()
+        try:
+            flags = second_opinion(text, self.engine.classify)
+        except Exception as e:
+            logging.error(f"Triage second opinion failed: {e}")
+            return
+        logging.info(f"Triage second opinion in {(time.perf_counter() - start) * 1000:.0f} ms: {len(flags)} flags")
+        if flags:
+            self.flagged.emit(turn, flags)
+
+
 class ChatbotLogic:
     def __init__(self, ui: ChatbotUI):
         self.ui = ui
-        self.context = ContextManager(MAX_CONTEXT_TOKENS)
+        self.telemetry = Telemetry()
+        self.engine = ChatEngine(cache=ResponseCache(), telemetry=self.telemetry)
+        self.context = self.engine.context
+        self.ui.telemetry = self.telemetry
+        self._record: Optional[Dict] = None
+        # messages triaged so far; a late second opinion for an older one isn't shown
+        self._triage_turn = 0
+        self._opinion = TriageOpinion(self.engine)
+        self._opinion.flagged.connect(self._show_second_opinion)
         self.ui.sendMessage.connect(self.handle_user_input)
-        self.ui.sendImage.connect(self.handle_image_upload)
+        self.ui.sendImages.connect(self.handle_image_upload)
+        self.ui.stopGeneration.connect(self.stop_response)
+        self.ui.newSession.connect(self.new_session)
+        self.ui.openSession.connect(self.open_session)
+        self.ui.profilingToggled.connect(self.set_profiling)
+        if self.ui.profile_action is not None:
+            self.ui.profile_action.setChecked(self.telemetry.profiler.enabled)
         self.current_thread: Optional[QThread] = None
         self.current_worker: Optional[ResponseWorker] = None
         self.last_bot_response = ""
+        # shown under the answer being streamed, e.g. that the fallback model wrote it
+        self._answer_note = ""
+        # (end offset, verdict) of the quotes in the answer being streamed
+        self._quotes: List[Tuple[int, str]] = []
+        # (kind, payload) sent while a response was streaming
+        self.pending: Deque[Tuple[str, str]] = deque()
+        # image paths waiting for the batch window to close
+        self._image_batch: List[str] = []
+        self._image_timer = QTimer()
+        self._image_timer.setSingleShot(True)
+        self._image_timer.setInterval(IMAGE_BATCH_MS)
+        self._image_timer.timeout.connect(self._flush_images)
+        # stopped workers wind down on their own; keep their threads alive until then
+        self._retired_threads: List[QThread] = []
+        self._stopped = False
 
         self._suppress_auto_search = False
-        self.display_greeting()
+        self.session: Optional[SessionStore] = None
+        try:
+            session = SessionStore.open_latest() or SessionStore.create()
+        except Exception as e:
+            logging.error(f"Failed to open session store: {e}")
+            session = None
+        self._attach_session(session)
+
+    def _attach_session(self, session: Optional[SessionStore]):
+        self.session = session
+        self.ui.session = session
+        self.context.on_change = session.journal_context if session else None
+        records = session.recent_messages(PAGE_SIZE) if session else []
+        if not records:
+            self.context.restore([])
+            self.engine.index_sources()
+            self.display_greeting()
+            return
+        start = time.perf_counter()
+        self.context.restore(session.restore_context(encode_image))
+        self.engine.index_sources()
+        self.ui.show_history(records)
+        logging.info(
+            f"Resumed session {session.id} in {(time.perf_counter() - start) * 1000:.0f} ms"
+        )
+        self.ui.add_system_message("Conversation resumed.", persist=False)
+
+    def _switch_session(self, session: Optional[SessionStore]):
+        # drop queued messages first so stopping doesn't send them into the old session
+        self.pending.clear()
+        self._image_timer.stop()
+        self._image_batch.clear()
+        self.stop_response()
+        if self.session is not None:
+            self.session.close()
+        self.ui.clear_conversation()
+        self._attach_session(session)
+
+    def new_session(self):
+        self._switch_session(SessionStore.create())
+
+    def open_session(self, session_id: str):
+        if self.session is not None and self.session.id == session_id:
+            return
+        try:
+            session = SessionStore.open(session_id)
+        except Exception as e:
+            self.ui.display_error(f"Error opening session: {e}")
+            return
+        self._switch_session(session)
+
+    def set_profiling(self, enabled: bool):
+        profiler = self.telemetry.profiler
+        profiler.set_enabled(enabled)
+        self.ui.set_status(f"Profiling turns into {profiler.directory}/" if enabled else "Profiling off")
 
     def display_greeting(self):
         greeting = (
@@ -215,69 +177,232 @@ class ChatbotLogic:
             "I'm here to help with diagnosing and treating any health issues. "
             "How are you feeling today?"
         )
-        self.ui.add_bot_message(greeting)
+        self.ui.add_bot_message(greeting, persist=False)
 
     def handle_user_input(self, user_input: str):
-        if user_input.startswith("/search"):
-            query = user_input[len("/search") :].strip()
+        # red flags get the banner right away, also when the message has to wait its turn
+        self._triage(user_input)
+        # images sent just before go first
+        self._flush_images()
+        if self._queue_if_busy("text", user_input):
+            return
+        self._process_input(user_input)
+
+    def _process_input(self, user_input: str, display: bool = True):
+        query = search_directive(user_input)
+        self._record = self.telemetry.begin("search" if query is not None else "chat")
+        if query is not None:
             self.ui.add_system_message(f"Searching for: {query}")
-            info = scrape_medical_info(query)
-            if not info:
+            # search results go into the conversation context so the model can use them
+            found = self.engine.run_search(query)
+            self.telemetry.add_search(self._record, self.engine.last_search_timings)
+            if not found:
                 self.ui.add_bot_message("No information found.")
+                self._end_turn(found=False)
+                self._send_next_pending()
                 return
-            # Add search results to the conversation context so the model can use them
-            self.context.add_interaction(
-                {"role": "system", "content": f"Search results for '{query}':\n{info}"}
-            )
             # avoid re-triggering the search flow when the model responds
             self._suppress_auto_search = True
             # Now ask the model to respond using the newly added search results
             self.get_response()
             return
 
-        self.context.add_interaction({"role": "user", "content": user_input})
-        self.ui.add_user_message(user_input)
-        if self.current_worker and self.current_worker.running:
-            self.ui.add_bot_message("Please wait for the current response to complete.")
+        self.engine.add_user_message(user_input)
+        if display:
+            self.ui.add_user_message(user_input)
+        hit = self.engine.cached_response()
+        if hit is not None:
+            note = "⚡ cached" if hit.kind == "exact" else f"⚡ cached, similar question ({hit.score:.0%})"
+            self.ui.add_bot_message(hit.answer, note=note)
+            self.engine.record_response(hit.answer, cacheable=False)
+            self._end_turn(cached=hit.kind)
+            self._send_next_pending()
             return
-
+        # searches the model is likely to ask for start alongside the generation
+        self.engine.prefetch(user_input)
         self.get_response()
 
-    def handle_image_upload(self, image_path: str):
-        encoded_image = encode_image(image_path)
-        if not encoded_image:
+    def _triage(self, text: str):
+        flags, seconds = triage(text)
+        self._triage_turn += 1
+        if not flags:
+            if ambiguous(text):
+                threading.Thread(
+                    target=self._opinion.ask, args=(text, self._triage_turn), daemon=True
+                ).start()
+            return
+        self.ui.show_alert(flags)
+        logging.warning(f"Red flags in message: {', '.join(f.key for f in flags)} ({seconds * 1000:.1f} ms)")
+        self.telemetry.event("triage", seconds, flags=[f.key for f in flags])
+
+    def _show_second_opinion(self, turn: int, flags: list):
+        if turn != self._triage_turn:
+            return
+        self.ui.show_alert(flags)
+        logging.warning(f"Red flags in message (second opinion): {', '.join(f.key for f in flags)}")
+
+    def handle_image_upload(self, image_paths: List[str]):
+        # a drop of four photos is one question, not four generations in a row
+        self._image_batch.extend(image_paths)
+        self._image_timer.start()
+
+    def _flush_images(self):
+        self._image_timer.stop()
+        image_paths, self._image_batch = self._image_batch, []
+        if not image_paths or self._queue_if_busy("image", *image_paths):
+            return
+        self._process_images(image_paths)
+
+    def _process_images(self, image_paths: List[str]):
+        self._record = self.telemetry.begin("image")
+        self._record["tags"]["images"] = len(image_paths)
+        readable = []
+        for image_path, encoded_image in zip(image_paths, encode_images(image_paths)):
+            if encoded_image:
+                readable.append((image_path, encoded_image))
+            elif len(image_paths) > 1:
+                self.ui.add_system_message(
+                    f"Skipped {os.path.basename(image_path)}: unsupported or corrupt file."
+                )
+        if not readable:
             self.ui.add_bot_message(
                 "Error processing image. Unsupported or corrupt file."
             )
+            self._end_turn(error="unreadable image")
+            self._send_next_pending()
             return
 
-        self.context.add_interaction(
-            {"role": "user", "content": "[Image uploaded]", "images": [encoded_image]}
-        )
-        self.ui.add_bot_message("User uploaded an image.")
+        if self.session is not None:
+            for image_path, encoded_image in readable:
+                self.session.remember_image(encoded_image, image_path)
+        self.engine.add_images([encoded_image for _, encoded_image in readable])
+        n = len(readable)
+        self.ui.add_bot_message("User uploaded an image." if n == 1 else f"User uploaded {n} images.")
         self.get_response()
 
+    def _queue_if_busy(self, kind: str, *payloads: str) -> bool:
+        if self.current_worker is None:
+            return False
+        self.pending.extend((kind, payload) for payload in payloads)
+        if self.ui.interrupt_on_send():
+            self.stop_response()
+        else:
+            self.ui.add_system_message(
+                "Queued, will be sent when the current answer is done.", persist=False
+            )
+        return True
+
+    def _send_next_pending(self):
+        if not self.pending or self.current_worker is not None:
+            return
+        kind, payload = self.pending.popleft()
+        if kind == "image":
+            # images queued back to back are still one turn
+            image_paths = [payload]
+            while self.pending and self.pending[0][0] == "image":
+                image_paths.append(self.pending.popleft()[1])
+            self._process_images(image_paths)
+        else:
+            # the bubble was already shown when the message was typed
+            self._process_input(payload, display=False)
+
     def get_response(self):
-        prompt = [{"role": "system", "content": SYSTEM_PROMPT}] + self.context.context
+        prompt = self.engine.build_prompt()
+        self.last_bot_response = ""
+        self._answer_note = ""
+        self._quotes = []
+        self._stopped = False
         self.ui.progress_bar.setVisible(True)
         self.ui.progress_bar.setMaximum(0)
         self.ui.set_input_enabled(False)
-        self.ui.add_bot_message("Hygieia is typing...")
+        self.ui.add_bot_message("Hygieia is typing...", persist=False)
         self.current_thread = QThread()
-        self.current_worker = ResponseWorker(prompt)
-        self.current_worker.moveToThread(self.current_thread)
-        self.current_thread.started.connect(self.current_worker.run)
-        self.current_worker.updateResponse.connect(self.update_bot_response)
-        self.current_worker.finishedResponse.connect(self.finish_response)
-        self.current_worker.errorOccurred.connect(self.handle_error)
-        self.current_worker.finishedResponse.connect(self.current_thread.quit)
-        self.current_worker.finishedResponse.connect(self.current_worker.deleteLater)
+        worker = ResponseWorker(self.engine, prompt)
+        self.current_worker = worker
+        worker.moveToThread(self.current_thread)
+        self.current_thread.started.connect(worker.run)
+        # late signals from a stopped worker must not touch the next answer
+        worker.updateResponse.connect(partial(self._from_worker, worker, self.update_bot_response))
+        worker.finishedResponse.connect(partial(self._from_worker, worker, self.finish_response))
+        worker.errorOccurred.connect(partial(self._from_worker, worker, self.handle_error))
+        worker.noticeOccurred.connect(partial(self._from_worker, worker, self.show_notice))
+        worker.finishedResponse.connect(self.current_thread.quit)
+        worker.finishedResponse.connect(worker.deleteLater)
         self.current_thread.finished.connect(self.current_thread.deleteLater)
         self.current_thread.start()
 
+    def _from_worker(self, worker: ResponseWorker, slot, *args):
+        if worker is self.current_worker:
+            slot(*args)
+
+    def stop_response(self):
+        worker, thread = self.current_worker, self.current_thread
+        if worker is None:
+            return
+        worker.stop()
+        # don't block the UI on the blocking stream read; the partial answer is final now
+        if thread is not None:
+            self._retired_threads.append(thread)
+            thread.finished.connect(partial(self._retired_threads.remove, thread))
+        self.current_thread = None
+        self._stopped = True
+        self.finish_response()
+
+    def show_notice(self, notice: str):
+        # a retry shows in the status bar only; a fallback answer is marked in its bubble
+        self.ui.set_status(notice)
+        stats = self.engine.last_stats
+        if self._record is not None:
+            self._record["tags"]["stalls"] = list(stats.get("stalls", []))
+        fallback = stats.get("fallback_model")
+        if not fallback:
+            return
+        self._answer_note = f"⚠️ answered by {fallback}"
+        if self._record is not None:
+            self._record["tags"]["fallback_model"] = fallback
+        self.ui.update_last_bot_message(
+            self.last_bot_response or "Hygieia is typing...", self._answer_note, self._quotes
+        )
+
     def update_bot_response(self, response: str):
         self.last_bot_response = response
-        self.ui.update_last_bot_message(response)
+        start = time.perf_counter()
+        # quoted passages get a badge as soon as they're closed; see Citations.py
+        self._quotes = self.engine.sources.check(response, final=False)
+        self.ui.update_last_bot_message(response, self._answer_note, self._quotes)
+        if self._record is not None:
+            self.telemetry.add_render(self._record, time.perf_counter() - start)
+
+    def _end_turn(self, **tags) -> Optional[Dict]:
+        self.engine.settle_prefetch()
+        if self._record is None:
+            return None
+        self._record["tags"].update(tags)
+        summary = self.telemetry.finish(self._record, self.context.current_token_count)
+        self._record = None
+        self.ui.set_status(readout(summary))
+        return summary
+
+    def _save_answer(self, answer: str, summary: Optional[Dict]):
+        # streamed answers are saved once they're final, with the turn's timings
+        if self.session is None or not answer or search_directive(answer) is not None:
+            return
+        meta = {k: summary[k] for k in ANSWER_META if summary and summary.get(k) is not None}
+        if self._answer_note:
+            meta["note"] = self._answer_note
+        quotes = self.engine.sources.check(answer)
+        if quotes != self._quotes:
+            # a blockquote at the very end is only checked once the answer is complete
+            self._quotes = quotes
+            self.ui.update_last_bot_message(answer, self._answer_note, quotes)
+        if quotes:
+            meta["quotes"] = quotes
+        try:
+            seq = self.session.append_message("bot", answer, meta)
+        except Exception as e:
+            logging.error(f"Failed to save answer: {e}")
+            return
+        self.ui.mark_answer_saved(seq)
 
     def finish_response(self):
         self.ui.progress_bar.setVisible(False)
@@ -288,43 +413,70 @@ class ChatbotLogic:
             self.current_thread.wait()
             self.current_thread = None
         self.current_worker = None
+        if self._record is not None:
+            self.telemetry.add_generation(self._record, self.engine.last_stats)
+        if self._stopped:
+            self._suppress_auto_search = False
+            if not self.last_bot_response:
+                self.ui.update_last_bot_message("*Stopped.*")
+            else:
+                # partial answers go into context but never into the cache
+                self.engine.record_response(self.last_bot_response, cacheable=False)
+            self._save_answer(self.last_bot_response, self._end_turn(stopped=True))
+            self._send_next_pending()
+            return
         # If the model requested an autonomous search (it responded with `/search`),
         # perform the search, insert the results into the context, and re-run the model.
-        if (
-            self.last_bot_response.strip().startswith("/search")
-            and not self._suppress_auto_search
-        ):
-            query = self.last_bot_response.strip()[len("/search") :].strip()
+        query = search_directive(self.last_bot_response)
+        if query is not None and not self._suppress_auto_search:
             self.ui.add_system_message(f"AI initiated search for: {query}")
-            info = scrape_medical_info(query)
-            if not info:
+            found = self.engine.run_search(query)
+            if self._record is not None:
+                self.telemetry.add_search(self._record, self.engine.last_search_timings)
+            if not found:
                 self.ui.add_bot_message("No information found.")
             else:
-                # add findings to context and re-run the model so the final answer includes the evidence
-                self.context.add_interaction(
-                    {
-                        "role": "system",
-                        "content": f"Search results for '{query}':\n{info}",
-                    }
-                )
+                # re-run the model so the final answer includes the evidence
                 self._suppress_auto_search = True
                 self.get_response()
                 return
+        self.engine.record_response(self.last_bot_response)
         # reset suppression after it's been used
         if self._suppress_auto_search:
             self._suppress_auto_search = False
+        self._save_answer(self.last_bot_response, self._end_turn())
+        self._send_next_pending()
 
     def handle_error(self, error_msg: str):
+        # a broken answer shouldn't end up in context or cache
+        self.last_bot_response = ""
+        if self._record is not None:
+            self._record["tags"]["error"] = error_msg
         self.ui.update_last_bot_message(error_msg)
         self.ui.progress_bar.setVisible(False)
         self.ui.set_input_enabled(True)
 
 
+# loaded in the background once the window is up; document extractors wait for first use
+PRELOAD_MODULES = ("markdown", "ollama", "WebSearch")
+
+
+def preload_modules():
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            logging.error(f"Preloading {name} failed: {e}")
+
+
 def main():
     app = QApplication(sys.argv)
     ui = ChatbotUI()
-    logic = ChatbotLogic(ui)
     ui.show()
+    # paint the window before anything heavy loads
+    app.processEvents()
+    threading.Thread(target=preload_modules, daemon=True).start()
+    logic = ChatbotLogic(ui)
     app.exec()
 
 
@@ -1,7 +1,20 @@
 import base64
 import logging
-from typing import List, Dict, Optional
-import ollama
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+from ResponseCache import CacheHit, ResponseCache
+from Router import ModelRouter, ThinkStripper, _text_only, strip_think
+from Citations import SourceIndex
+from Evidence import compress
+from Lexicon import find_terms
+from Prefetch import SearchPrefetcher
+from Tuner import load_profile
+from Telemetry import Telemetry, generation_stats
+from Watchdog import FALLBACK_MODEL, Deadlines, GuardedStream, Stalled, model_loaded
+
+# ollama (pydantic), requests and bs4 take ~0.5 s to import, so they load on first use
 
 logging.basicConfig(level=logging.INFO)
 
@@ -86,24 +99,65 @@ SYSTEM_PROMPT = (
 )
 
 
-def summarize_context(context: List[Dict]) -> Dict:
-    prompt = [
+# ContextManager counts words; Finnish in particular splits into more tokens than that
+TOKENS_PER_WORD = 1.5
+REPLY_TOKENS = 1024
+IMAGE_WORKERS = 4  # images of one turn are read and encoded in parallel
+
+
+def context_window(max_context_tokens: int = MAX_CONTEXT_TOKENS) -> int:
+    """num_ctx that fits the system prompt, a full context and a reply."""
+    words = max_context_tokens + len(SYSTEM_PROMPT.split())
+    tokens = int(words * TOKENS_PER_WORD) + REPLY_TOKENS
+    return -(-tokens // 1024) * 1024
+
+
+def _ollama():
+    import ollama
+
+    return ollama
+
+
+def web_search(query: str) -> str:
+    from WebSearch import scrape_medical_info
+
+    return scrape_medical_info(query)
+
+
+def _summary_prompt(context: List[Dict]) -> List[Dict]:
+    return [
         {
             "role": "system",
-            "content": "You are a helpful assistant. Summarize  following conversation context into  most important key points:",
+            "content": "You are a helpful assistant. Summarize the following conversation context into the most important key points:",
         },
         *context,
     ]
-    response = ollama.chat(model=MODEL_NAME, messages=prompt)
-    summary = response.get("message", {}).get("content", "")
+
+
+def summarize_context(context: List[Dict], client=None) -> Dict:
+    response = (client or _ollama()).chat(model=MODEL_NAME, messages=_summary_prompt(context))
+    summary = strip_think(response.get("message", {}).get("content", ""))
     return {"role": "assistant", "content": summary}
 
 
+SEARCH_QUERY_PROMPT = (
+    "Turn the request into a search keyword for a Finnish medical encyclopedia. "
+    "Reply with one or two Finnish words only, such as syöpä, diabetes or päänsärky."
+)
+
+
 class ContextManager:
-    def __init__(self, max_context_tokens: int):
+    def __init__(
+        self,
+        max_context_tokens: int,
+        summarize: Callable[[List[Dict]], Dict] = summarize_context,
+    ):
         self.context: List[Dict] = []
         self.current_token_count = 0
         self.max_context_tokens = max_context_tokens
+        self.summarize = summarize
+        # called with ("add", [entry]) or ("reset", whole context), e.g. SessionStore.journal_context
+        self.on_change: Optional[Callable[[str, List[Dict]], None]] = None
 
     def add_interaction(self, interaction: Dict) -> None:
         tokens = len(interaction.get("content", "").split()) + 5
@@ -111,15 +165,31 @@ class ContextManager:
             self.truncate_context()
         self.context.append(interaction)
         self.current_token_count += tokens
+        self._changed("add", [interaction])
 
     def truncate_context(self) -> None:
         if len(self.context) > 1:
-            summary = summarize_context(self.context)
+            summary = self.summarize(self.context)
             self.context = [summary]
             self.current_token_count = len(summary.get("content", "").split()) + 5
         else:
             oldest = self.context.pop(0)
             self.current_token_count -= len(oldest.get("content", "").split()) + 5
+        self._changed("reset", list(self.context))
+
+    def restore(self, context: List[Dict]) -> None:
+        # replace the context without notifying, e.g. when resuming a saved session
+        self.context = list(context)
+        self.current_token_count = sum(
+            len(m.get("content", "").split()) + 5 for m in self.context
+        )
+
+    def _changed(self, op: str, entries: List[Dict]) -> None:
+        if self.on_change is not None:
+            try:
+                self.on_change(op, entries)
+            except Exception as e:
+                logging.error(f"Context change hook failed: {e}")
 
 
 def encode_image(image_path: Optional[str]) -> Optional[str]:
@@ -130,3 +200,473 @@ def encode_image(image_path: Optional[str]) -> Optional[str]:
         except Exception as e:
             logging.error(f"Failed to encode image {image_path}: {e}")
     return None
+
+
+def encode_images(image_paths: List[str]) -> List[Optional[str]]:
+    """encode_image for each path, in parallel; None for files that can't be read."""
+    if len(image_paths) < 2:
+        return [encode_image(p) for p in image_paths]
+    with ThreadPoolExecutor(min(IMAGE_WORKERS, len(image_paths)), thread_name_prefix="encode") as pool:
+        return list(pool.map(encode_image, image_paths))
+
+
+def search_directive(response: str) -> Optional[str]:
+    # the model asks for a search by starting its answer with /search
+    text = response.strip()
+    if text.startswith("/search"):
+        return text[len("/search") :].strip()
+    return None
+
+
+def _label(answer: str, labels: List[str]) -> Optional[str]:
+    # small models wrap the label: "Emergency.", "**emergency**", a second line of reasons
+    lines = answer.strip().splitlines()
+    label = lines[0].strip().strip("\"'*.:!").lower() if lines else ""
+    return label if label in labels else None
+
+
+def _image_safe_messages(messages: List[Dict]) -> List[Dict]:
+    # only the newest images go to the model; earlier ones were answered already and
+    # re-sending every photo each turn would re-encode them all
+    newest = max((i for i, m in enumerate(messages) if m.get("images")), default=-1)
+    safe_messages = []
+    for i, m in enumerate(messages):
+        if m.get("images") and i != newest:
+            n = len(m["images"])
+            note = "an earlier image" if n == 1 else f"{n} earlier images"
+            safe_messages.append(
+                {"role": m.get("role"), "content": f"{m.get('content', '')} ({note}, not shown again)"}
+            )
+        else:
+            safe_messages.append(m)
+    return safe_messages
+
+
+class ChatEngine:
+    """UI-agnostic conversation engine: context, search orchestration and generation.
+
+    The GUI drives the individual steps from its worker threads; scripts and
+    servers can use ask() with callbacks or iterate astream() instead.
+    """
+
+    def __init__(
+        self,
+        model: str = MODEL_NAME,
+        max_context_tokens: int = MAX_CONTEXT_TOKENS,
+        host: Optional[str] = None,
+        search: Callable[[str], str] = web_search,
+        timeout: Optional[float] = None,
+        cache: Optional[ResponseCache] = None,
+        telemetry: Optional[Telemetry] = None,
+        prefetch: bool = True,
+        fallback_model: Optional[str] = FALLBACK_MODEL,
+        deadlines: Optional[Deadlines] = None,
+    ):
+        self.model = model
+        self.host = host
+        self._client = None
+        # without this Ollama uses its default window and silently drops the start of long contexts
+        self.num_ctx = context_window(max_context_tokens)
+        # model -> (options, keep_alive) from the Tuner.py profile for this host
+        self._settings: Dict[str, Tuple[Dict, Optional[str]]] = {}
+        # auxiliary calls (summaries, search queries, labels) go to a small model
+        self.router = ModelRouter(
+            lambda: self.client, model, telemetry=telemetry, settings=self.ollama_settings
+        )
+        self.context = ContextManager(max_context_tokens, summarize=self._summarize)
+        self.search = search
+        # likely searches run while the first generation streams
+        self.prefetcher = SearchPrefetcher(search) if prefetch else None
+        # stalled generations are retried once, then answered by the fallback model;
+        # timeout is the longest silence between tokens (see Watchdog.py for the rest)
+        if deadlines is None:
+            deadlines = Deadlines(token_gap=timeout) if timeout else Deadlines()
+        self.deadlines = deadlines
+        self.timeout = deadlines.token_gap
+        self.fallback_model = fallback_model
+        self.cache = cache
+        self.telemetry = telemetry
+        # Ollama's counters plus ttft_s of the last generation, and stage timings of the last search
+        self.last_stats: Dict = {}
+        self.last_search_timings: Dict[str, float] = {}
+        # what the evidence stage kept of the last search (see Evidence.compress)
+        self.last_evidence: Dict = {}
+        # every search result this session, for checking what answers quote (see Citations.py)
+        self.sources = SourceIndex()
+        # telemetry record of the ask() in progress
+        self._record: Optional[Dict] = None
+        # (cache bucket, question) of the turn in progress, None if not cacheable
+        self._turn: Optional[Tuple[str, str]] = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            # an own client, not the module's shared one, so a stalled stream can be cut off
+            self._client = _ollama().Client(host=self.host, timeout=self.deadlines.longest())
+        return self._client
+
+    def _drop_client(self) -> None:
+        # the retry gets a fresh connection; the stalled one is left to its read timeout
+        client, self._client = self._client, None
+        try:
+            client._client.close()
+        except Exception as e:
+            logging.debug(f"Closing Ollama client failed: {e}")
+
+    def ollama_settings(self, model: str) -> Tuple[Dict, Optional[str]]:
+        if model not in self._settings:
+            # thread and batch counts are properties of the machine, so reuse the answer model's
+            profile = load_profile(model, self.host) or load_profile(self.model, self.host)
+            self._settings[model] = (dict(profile.get("options", {})), profile.get("keep_alive"))
+        return self._settings[model]
+
+    def _ollama_kwargs(self, model: Optional[str] = None) -> Dict:
+        options, keep_alive = self.ollama_settings(model or self.model)
+        kwargs: Dict = {"options": {**options, "num_ctx": self.num_ctx}}
+        if keep_alive is not None:
+            kwargs["keep_alive"] = keep_alive
+        return kwargs
+
+    def _summarize(self, context: List[Dict]) -> Dict:
+        words = sum(len(str(m.get("content", "")).split()) for m in context)
+        summary = self.router.complete(
+            "summarize",
+            _summary_prompt(context),
+            check=lambda text: 0 < len(text.split()) < words,
+            # the small model has to see the whole context it summarizes
+            options={"num_ctx": self.num_ctx},
+        )
+        return {"role": "assistant", "content": summary}
+
+    def search_query(self, query: str) -> str:
+        # single keywords are what the encyclopedia search wants already
+        if len(query.split()) <= 1:
+            return query
+        # a known medical term needs no model call
+        terms = find_terms(query, limit=1)
+        if terms:
+            return terms[0]
+        try:
+            keyword = self.router.complete(
+                "search_query",
+                [
+                    {"role": "system", "content": SEARCH_QUERY_PROMPT},
+                    {"role": "user", "content": query},
+                ],
+            )
+        except Exception as e:
+            logging.error(f"Search query generation failed: {e}")
+            return query
+        keyword = keyword.strip().strip("\"'.").splitlines()[0] if keyword.strip() else ""
+        return keyword if 0 < len(keyword.split()) <= 3 else query
+
+    def classify(self, text: str, labels: List[str]) -> Optional[str]:
+        """Pick one of labels for text with the small model, None if it answers something else."""
+        prompt = [
+            {
+                "role": "system",
+                "content": f"Classify the message as exactly one of: {', '.join(labels)}. Reply with the label only.",
+            },
+            {"role": "user", "content": text},
+        ]
+        answer = self.router.complete(
+            "classify", prompt, check=lambda out: _label(out, labels) is not None
+        )
+        return _label(answer, labels)
+
+    def add_user_message(self, text: str) -> None:
+        if self.cache is not None:
+            bucket = ResponseCache.bucket(self.context.context, self.model, SYSTEM_PROMPT)
+            self._turn = (bucket, text)
+        self.context.add_interaction({"role": "user", "content": text})
+
+    def add_images(self, encoded_images: List[str]) -> None:
+        # one turn, so the model answers about all of them at once
+        self._turn = None
+        n = len(encoded_images)
+        content = "[Image uploaded]" if n == 1 else f"[{n} images uploaded]"
+        self.context.add_interaction({"role": "user", "content": content, "images": list(encoded_images)})
+
+    def cached_response(self) -> Optional[CacheHit]:
+        # call right after add_user_message
+        if self.cache is None or self._turn is None:
+            return None
+        return self.cache.get(*self._turn)
+
+    def record_response(self, response: str, cacheable: bool = True) -> None:
+        # search directives are plumbing, not answers worth keeping in context
+        if response and search_directive(response) is None:
+            self.context.add_interaction({"role": "assistant", "content": response})
+            # the cache bucket is the main model's; a fallback answer would come back as its
+            fallback = "fallback_model" in self.last_stats
+            if cacheable and not fallback and self.cache is not None and self._turn is not None:
+                self.cache.put(*self._turn, response)
+        self._turn = None
+
+    def prefetch(self, text: str) -> None:
+        # call when the generation for text starts
+        if self.prefetcher is not None:
+            self.prefetcher.start(text)
+
+    def settle_prefetch(self) -> None:
+        # call when a turn ends
+        if self.prefetcher is not None:
+            self.prefetcher.settle()
+
+    def _prefetched(self, query: str, timings: Dict[str, float]) -> Optional[str]:
+        if self.prefetcher is None:
+            return None
+        start = time.perf_counter()
+        info = self.prefetcher.take(query)
+        if info is not None:
+            timings["prefetch_wait_s"] = time.perf_counter() - start
+        return info
+
+    def run_search(self, query: str) -> str:
+        # search and add the findings to the context so the model can use them
+        start = time.perf_counter()
+        from WebSearch import record_timings
+
+        timings: Dict[str, float] = {}
+        keyword = query
+        info = self._prefetched(query, timings)
+        if info is None:
+            keyword = self.search_query(query)
+            query_s = time.perf_counter() - start
+            if keyword != query:
+                timings["query_s"] = query_s
+                info = self._prefetched(keyword, timings)
+        if info is None:
+            with record_timings() as stages:
+                info = self.search(keyword)
+            timings.update(stages)
+        if keyword != query:
+            self.router.grade("search_query", bool(info))
+            label = f"{query} → {keyword}"
+        else:
+            label = query
+        if info:
+            self.sources.add(info)
+            # only what's new and relevant goes into the context, within a per-search budget
+            evidence_start = time.perf_counter()
+            evidence, self.last_evidence = compress(info, keyword, self.context.context)
+            timings["evidence_s"] = time.perf_counter() - evidence_start
+            logging.info(
+                f"Evidence for {label!r}: {self.last_evidence['words_out']}/{self.last_evidence['words_in']} words, "
+                f"{self.last_evidence['duplicates']} duplicate sentences dropped"
+            )
+        timings["total_s"] = time.perf_counter() - start
+        self.last_search_timings = timings
+        if self._record is not None:
+            self.telemetry.add_search(self._record, timings)
+        if info:
+            self.context.add_interaction(
+                {"role": "system", "content": f"Search results for '{label}':\n{evidence}"}
+            )
+        return info
+
+    def index_sources(self) -> None:
+        # after a session is resumed only the evidence still in the context can be checked against
+        self.sources.reset(
+            m.get("content", "")
+            for m in self.context.context
+            if m.get("role") == "system" and m.get("content", "").startswith("Search results for ")
+        )
+
+    def build_prompt(self) -> List[Dict]:
+        return [{"role": "system", "content": SYSTEM_PROMPT}] + self.context.context
+
+    def stream(
+        self,
+        prompt: List[Dict],
+        cancel: Optional[threading.Event] = None,
+        notice: Optional[Callable[[str], None]] = None,
+    ) -> Iterator[str]:
+        """Yield the accumulated response after every chunk; stops early once cancel is set.
+
+        A stream that misses a watchdog deadline is retried once and then
+        regenerated by the fallback model; notice gets a line to show the user.
+        The response may then start over, shorter than what was yielded before.
+        """
+        started = time.perf_counter()
+        # a stopped stream still winding down keeps writing to its own dict, not the next one's
+        stats: Dict = {"ttft_s": None}
+        self.last_stats = stats
+        models = [self.model, self.model]
+        if self.fallback_model and self.fallback_model != self.model:
+            models.append(self.fallback_model)
+        for attempt, model in enumerate(models):
+            try:
+                yield from self._stream_model(model, prompt, cancel, stats, started)
+                return
+            except Stalled as e:
+                self._drop_client()
+                self._breach(e, model, attempt)
+                if attempt + 1 == len(models):
+                    raise
+                if models[attempt + 1] == model:
+                    message = f"{model} stalled ({e}), retrying..."
+                else:
+                    message = f"{model} isn't responding, answering with {models[attempt + 1]} instead."
+                    stats["fallback_model"] = models[attempt + 1]
+                if notice is not None:
+                    notice(message)
+
+    def _stream_model(
+        self,
+        model: str,
+        prompt: List[Dict],
+        cancel: Optional[threading.Event],
+        stats: Dict,
+        started: float,
+    ) -> Iterator[str]:
+        client = self.client
+        kwargs = self._ollama_kwargs(model)
+        loaded = lambda: model_loaded(client, model)
+        images = any(isinstance(m, dict) and "images" in m for m in prompt)
+        if model != self.model:
+            # the fallback model may not see images
+            prompt = _text_only(prompt)
+        elif images:
+            prompt = _image_safe_messages(prompt)
+        response = ""
+        # reasoning models think out loud first; only the answer is shown
+        thinking = ThinkStripper()
+        guarded = GuardedStream(
+            lambda: client.chat(model=model, messages=prompt, stream=True, **kwargs),
+            self.deadlines,
+            cancel,
+            loaded,
+            # images are encoded before the first token, which can take as long as an answer
+            whole_answer=images and model == self.model,
+        )
+        for chunk in guarded:
+            if cancel is not None and cancel.is_set():
+                return
+            content = thinking.feed(chunk.get("message", {}).get("content", "") or "")
+            if chunk.get("done"):
+                stats.update(generation_stats(chunk))
+                content += thinking.flush()
+            if not content:
+                continue
+            if stats["ttft_s"] is None:
+                stats["ttft_s"] = time.perf_counter() - started
+            response += content
+            yield response
+
+    def _breach(self, stall: Stalled, model: str, attempt: int) -> None:
+        logging.warning(f"Watchdog: {model} {stall} (attempt {attempt + 1})")
+        self.last_stats.setdefault("stalls", []).append(stall.phase)
+        if self.telemetry is not None:
+            self.telemetry.event(
+                "watchdog", stall.waited, phase=stall.phase, model=model, attempt=attempt + 1
+            )
+
+    def generate(
+        self,
+        on_update: Optional[Callable[[str], None]] = None,
+        cancel: Optional[threading.Event] = None,
+        notice: Optional[Callable[[str], None]] = None,
+    ) -> str:
+        response = ""
+        for response in self.stream(self.build_prompt(), cancel, notice):
+            if on_update:
+                on_update(response)
+        if self._record is not None:
+            self.telemetry.add_generation(self._record, self.last_stats)
+        return response
+
+    def ask(
+        self,
+        user_input: str,
+        on_update: Optional[Callable[[str], None]] = None,
+        on_status: Optional[Callable[[str], None]] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> str:
+        """Run one full turn, including a model initiated search, and return the answer.
+
+        Setting cancel stops the generation and keeps the partial answer.
+        """
+        if self.telemetry is None:
+            try:
+                return self._ask(user_input, on_update, on_status, cancel)
+            finally:
+                self.settle_prefetch()
+        kind = "search" if search_directive(user_input) is not None else "chat"
+        self._record = self.telemetry.begin(kind)
+        try:
+            return self._ask(user_input, on_update, on_status, cancel)
+        finally:
+            self.settle_prefetch()
+            record, self._record = self._record, None
+            self.telemetry.finish(record, self.context.current_token_count)
+
+    def _ask(
+        self,
+        user_input: str,
+        on_update: Optional[Callable[[str], None]],
+        on_status: Optional[Callable[[str], None]],
+        cancel: Optional[threading.Event],
+    ) -> str:
+        status = on_status or (lambda msg: None)
+        self._turn = None
+        query = search_directive(user_input)
+        if query is not None:
+            status(f"Searching for: {query}")
+            if not self.run_search(query):
+                return "No information found."
+            response = self.generate(on_update, cancel, status)
+            self.record_response(response)
+            return response
+
+        self.add_user_message(user_input)
+        hit = self.cached_response()
+        if hit is not None:
+            status(f"Cached answer ({hit.kind})")
+            if self._record is not None:
+                self._record["tags"]["cached"] = hit.kind
+            if on_update:
+                on_update(hit.answer)
+            self.record_response(hit.answer, cacheable=False)
+            return hit.answer
+        self.prefetch(user_input)
+        response = self.generate(on_update, cancel, status)
+        query = search_directive(response)
+        if query is not None and not (cancel and cancel.is_set()):
+            status(f"AI initiated search for: {query}")
+            if not self.run_search(query):
+                return "No information found."
+            response = self.generate(on_update, cancel, status)
+        self.record_response(response, cacheable=not (cancel and cancel.is_set()))
+        return response
+
+    async def astream(
+        self, user_input: str, cancel: Optional[threading.Event] = None
+    ) -> AsyncIterator[Dict]:
+        """Async variant of ask() yielding {"type": "update"|"status"|"done"|"error", ...} events."""
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def put(event: Dict) -> None:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+        def run() -> None:
+            try:
+                answer = self.ask(
+                    user_input,
+                    on_update=lambda text: put({"type": "update", "text": text}),
+                    on_status=lambda msg: put({"type": "status", "text": msg}),
+                    cancel=cancel,
+                )
+                put({"type": "done", "text": answer})
+            except Exception as e:
+                put({"type": "error", "text": f"Error generating response: {e}"})
+
+        threading.Thread(target=run, daemon=True).start()
+        while True:
+            event = await queue.get()
+            yield event
+            if event["type"] in ("done", "error"):
+                return
@@ -0,0 +1,313 @@
+# English/Finnish medical term lexicon for turning queries into Terveyskirjasto search words
+#
+# Every concept has a canonical Finnish base form (what the site's articles
+# are titled with), Finnish synonyms to fall back on, Finnish stems and
+# English words/phrases. Keys live in one character trie: a Finnish stem
+# matches an inflected word ("päänsär" -> "päänsäryn", "päänsärkyä") but not a
+# compound it starts ("raskausdiabetes" isn't "raskaus"), so at most
+# MAX_SUFFIX letters may follow it and the word must end the way Finnish words
+# do. English keys take English endings only ("coughing", not "license" for
+# "lice"); keys marked with "=" or shorter than MIN_STEM only match whole
+# words. Words of FUZZY_MIN characters or more that miss get a second walk
+# that allows one typo. Lookups take a few microseconds, a miss with the typo
+# walk ~50 µs.
+
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+MIN_STEM = 4
+MAX_SUFFIX = 4  # letters after a Finnish stem: an inflection, not a compound
+FUZZY_MIN = 6
+FINNISH_FINALS = set("aeiouyäönstlr")  # letters a Finnish word can end in
+ENGLISH_ENDINGS = ("", "s", "es", "d", "ed", "ing")
+_STEM, _ENGLISH, _WORD = "*", "+", "="  # trie markers; never part of normalized text
+_MARKERS = (_STEM, _ENGLISH, _WORD)
+
+# (canonical, Finnish synonyms, Finnish stems, English)
+CONCEPTS: Tuple[Tuple[str, Tuple[str, ...], Tuple[str, ...], Tuple[str, ...]], ...] = (
+    ("kuume", ("korkea lämpö",), ("kuume", "kuumee"), ("fever", "pyrexia", "high temperature")),
+    ("päänsärky", ("jännityspäänsärky",), ("päänsär", "pääkip", "pääkiv"), ("headache", "head ache", "head pain")),
+    ("migreeni", (), ("migree",), ("migraine",)),
+    ("diabetes", ("sokeritauti",), ("diabet", "sokeritau"), ("diabetes", "diabetic", "high blood sugar", "blood sugar")),
+    ("verenpaine", (), ("verenpain",), ("blood pressure", "hypotension", "low blood pressure")),
+    ("verenpainetauti", ("kohonnut verenpaine",), ("verenpainetau", "kohonnut verenpain", "kohonneen verenpain"), ("hypertension", "high blood pressure")),
+    ("flunssa", ("nuhakuume",), ("flunss", "nuhakuum"), ("cold=", "common cold", "colds=")),
+    ("influenssa", (), ("influens",), ("influenza", "flu=")),
+    ("yskä", (), ("yskä", "yski", "yskö"), ("cough", "phlegm")),
+    ("syöpä", ("kasvain",), ("syöpä", "syöv", "kasvai"), ("cancer", "tumour", "tumor")),
+    ("astma", (), ("astma",), ("asthma",)),
+    ("ihottuma", (), ("ihottum",), ("rash",)),
+    ("atooppinen ihottuma", ("ekseema",), ("atoop", "ekseem"), ("eczema", "atopic")),
+    ("nokkosihottuma", (), ("nokkosihottum",), ("hives", "urticaria")),
+    ("psoriaasi", (), ("psoriaa",), ("psoriasis",)),
+    ("akne", ("finnit",), ("akne", "finni"), ("acne", "pimple")),
+    ("allergia", (), ("allergi", "allerg"), ("allergy", "allergic", "allergies")),
+    ("siitepölyallergia", ("heinänuha",), ("siitepöly", "heinänuh"), ("hay fever", "pollen")),
+    ("masennus", (), ("masennu", "masentu"), ("depression", "depressed")),
+    ("ahdistus", ("ahdistuneisuushäiriö",), ("ahdistu",), ("anxiety", "anxious")),
+    ("paniikkihäiriö", (), ("paniikk",), ("panic attack", "panic disorder")),
+    ("selkäkipu", (), ("selkäkip", "selkäkiv", "selkäsär", "alaselkä"), ("back pain", "backache", "lower back pain")),
+    ("vatsakipu", (), ("vatsakip", "vatsakiv", "mahakip", "mahakiv", "vatsasär"), ("stomach ache", "stomachache", "abdominal pain", "stomach pain", "belly pain", "tummy ache")),
+    ("ripuli", (), ("ripul",), ("diarrhea", "diarrhoea")),
+    ("oksentelu", (), ("oksen",), ("vomiting", "vomit", "throwing up")),
+    ("pahoinvointi", (), ("pahoinvo",), ("nausea", "nauseous", "feel sick")),
+    ("kurkkukipu", (), ("kurkkukip", "kurkkukiv", "kurkkusär"), ("sore throat", "throat pain")),
+    ("angiina", ("nielurisatulehdus",), ("angiin", "nielurisatuleh"), ("strep throat", "tonsillitis")),
+    ("korvatulehdus", (), ("korvatuleh", "korvakip", "korvakiv"), ("ear infection", "earache", "otitis")),
+    ("virtsatieinfektio", ("virtsatietulehdus",), ("virtsatieinf", "virtsatietuleh", "rakkotuleh"), ("urinary tract infection", "bladder infection", "cystitis", "uti=")),
+    ("anemia", ("raudanpuute",), ("anemi", "anaemi", "raudanpuut", "verenvähyy"), ("anemia", "anaemia", "iron deficiency")),
+    ("huimaus", (), ("huimau", "huimaa"), ("dizziness", "dizzy", "vertigo")),
+    ("unettomuus", ("unihäiriö",), ("unettom", "unihäiri"), ("insomnia", "sleeplessness", "can t sleep")),
+    ("rintakipu", (), ("rintakip", "rintakiv"), ("chest pain",)),
+    ("sydäninfarkti", ("sydänkohtaus",), ("sydäninfarkt", "sydänkohtau"), ("heart attack", "myocardial infarction")),
+    ("aivoinfarkti", ("aivoverenkiertohäiriö", "aivohalvaus"), ("aivoinfarkt", "aivoverenkiert", "aivohalvau"), ("stroke",)),
+    ("keuhkokuume", (), ("keuhkokuum",), ("pneumonia",)),
+    ("koronavirus", ("covid-19",), ("korona", "covid"), ("covid", "coronavirus")),
+    ("nivelkipu", (), ("nivelkip", "nivelkiv", "nivelsär"), ("joint pain",)),
+    ("nivelrikko", ("artroosi",), ("nivelrik", "artroo"), ("osteoarthritis", "arthritis")),
+    ("nivelreuma", (), ("nivelreum", "reuma"), ("rheumatoid arthritis", "rheumatism")),
+    ("kihti", (), ("kihti", "kihdi"), ("gout",)),
+    ("osteoporoosi", ("luukato",), ("osteoporoo", "luukado", "luukato"), ("osteoporosis",)),
+    ("ummetus", (), ("ummetu",), ("constipation", "constipated")),
+    ("närästys", ("refluksitauti",), ("närästy", "närästä", "refluks"), ("heartburn", "acid reflux", "reflux")),
+    ("ärtyvän suolen oireyhtymä", (), ("ärtyvän suol", "ärtyneen suol"), ("irritable bowel", "ibs=")),
+    ("keliakia", (), ("keliaki",), ("celiac", "coeliac")),
+    ("laktoosi-intoleranssi", (), ("laktoosi",), ("lactose intolerance", "lactose")),
+    ("kilpirauhasen vajaatoiminta", ("hypotyreoosi",), ("kilpirauhasen vajaatoim", "hypotyreoo"), ("hypothyroidism", "underactive thyroid")),
+    ("kilpirauhasen liikatoiminta", ("hypertyreoosi",), ("kilpirauhasen liikatoim", "hypertyreoo"), ("hyperthyroidism", "overactive thyroid")),
+    ("kilpirauhanen", (), ("kilpirauh",), ("thyroid",)),
+    ("sinuiitti", ("poskiontelotulehdus",), ("sinuiit", "poskiontelotuleh"), ("sinusitis", "sinus infection")),
+    ("silmätulehdus", ("sidekalvotulehdus",), ("silmätuleh", "sidekalvotuleh"), ("pink eye", "conjunctivitis")),
+    ("vyöruusu", (), ("vyöruus",), ("shingles",)),
+    ("vesirokko", (), ("vesirok",), ("chickenpox", "chicken pox")),
+    ("tuhkarokko", (), ("tuhkarok",), ("measles",)),
+    ("borrelioosi", ("punkki",), ("borrelio", "borrelia", "punkin", "punkki"), ("lyme", "tick bite")),
+    ("palovamma", (), ("palovamm",), ("burn=", "burns=", "scald")),
+    ("haava", (), ("haava",), ("wound",)),
+    ("murtuma", (), ("murtum", "luunmurtum"), ("fracture", "broken bone")),
+    ("nyrjähdys", (), ("nyrjähd", "nyrjäht", "nyrjäyt"), ("sprain", "sprained")),
+    ("aivotärähdys", (), ("aivotäräh",), ("concussion",)),
+    ("kolesteroli", (), ("kolesterol",), ("cholesterol",)),
+    ("lihavuus", ("ylipaino",), ("lihavu", "ylipain"), ("obesity", "overweight", "obese")),
+    ("raskaus", (), ("raskau", "raskaana"), ("pregnancy", "pregnant")),
+    ("ehkäisy", (), ("ehkäisy", "ehkäisypil"), ("contraception", "birth control")),
+    ("kuukautiset", (), ("kuukautis", "menstruaat"), ("menstruation", "menstrual", "period pain")),
+    ("vaihdevuodet", (), ("vaihdevuo",), ("menopause",)),
+    ("eturauhanen", (), ("eturauha",), ("prostate",)),
+    ("erektiohäiriö", (), ("erektiohäir", "impotens"), ("erectile dysfunction", "impotence")),
+    ("klamydia", (), ("klamydi",), ("chlamydia",)),
+    ("sukupuolitauti", (), ("sukupuolitau",), ("sexually transmitted", "std=", "sti=")),
+    ("muistisairaus", ("dementia",), ("muistisairau", "dementi"), ("dementia",)),
+    ("alzheimerin tauti", (), ("alzheimer",), ("alzheimer",)),
+    ("epilepsia", (), ("epileps", "epilept"), ("epilepsy", "seizure")),
+    ("parkinsonin tauti", (), ("parkinson",), ("parkinson",)),
+    ("ms-tauti", ("multippeliskleroosi",), ("ms-tau", "multippeliskleroo"), ("multiple sclerosis",)),
+    ("adhd", (), ("adhd=",), ("adhd=", "attention deficit")),
+    ("uniapnea", (), ("uniapne",), ("sleep apnea", "sleep apnoea")),
+    ("kuorsaus", (), ("kuorsa",), ("snoring", "snore")),
+    ("hengenahdistus", (), ("hengenahdistu",), ("shortness of breath", "breathlessness", "dyspnea")),
+    ("nuha", (), ("nuha", "nenän tukko"), ("runny nose", "stuffy nose", "blocked nose")),
+    ("tinnitus", (), ("tinnit", "korvien soi"), ("tinnitus", "ringing in ears")),
+    ("huonokuuloisuus", (), ("huonokuulo", "kuulon heikk"), ("hearing loss",)),
+    ("kaihi", (), ("kaihi",), ("cataract",)),
+    ("glaukooma", ("silmänpainetauti",), ("glaukoom", "silmänpainetau"), ("glaucoma",)),
+    ("hammassärky", (), ("hammassär", "hammaskip", "hammaskiv"), ("toothache", "tooth pain")),
+    ("peräpukamat", (), ("peräpukam",), ("hemorrhoids", "haemorrhoids", "piles")),
+    ("sappikivet", (), ("sappikiv",), ("gallstone",)),
+    ("munuaiskivet", (), ("munuaiskiv",), ("kidney stone",)),
+    ("munuaisten vajaatoiminta", (), ("munuaisten vajaatoim", "munuaissairau"), ("kidney failure", "kidney disease", "ckd=")),
+    ("maksakirroosi", (), ("kirroo", "maksakirroo"), ("cirrhosis",)),
+    ("hepatiitti", ("maksatulehdus",), ("hepatiit", "maksatuleh"), ("hepatitis",)),
+    ("sydämen vajaatoiminta", (), ("sydämen vajaatoim",), ("heart failure",)),
+    ("eteisvärinä", (), ("eteisvärin",), ("atrial fibrillation", "afib=")),
+    ("rytmihäiriö", ("sydämentykytys",), ("rytmihäir", "sydämentykyty"), ("arrhythmia", "palpitation")),
+    ("tromboosi", ("veritulppa",), ("tromboo", "veritulp"), ("blood clot", "thrombosis", "dvt=")),
+    ("anafylaksia", (), ("anafyla",), ("anaphylaxis", "anaphylactic")),
+    ("kuivuminen", (), ("kuivumi",), ("dehydration", "dehydrated")),
+    ("ruokamyrkytys", (), ("ruokamyrk",), ("food poisoning",)),
+    ("vatsatauti", ("noroviru",), ("vatsatau", "noroviru"), ("stomach flu", "stomach bug", "norovirus", "gastroenteritis")),
+    ("hiivatulehdus", ("sieni-infektio",), ("hiivatuleh", "sieni-inf", "hiiva"), ("yeast infection", "fungal infection", "thrush")),
+    ("jalkasieni", (), ("jalkasien",), ("athlete s foot",)),
+    ("syyhy", (), ("syyhy",), ("scabies",)),
+    ("täit", ("päätäi",), ("päätäi", "täit="), ("lice", "head lice")),
+    ("verenvuoto", (), ("verenvuo",), ("bleeding",)),
+    ("nenäverenvuoto", (), ("nenäverenvuo",), ("nosebleed", "nose bleed")),
+    ("väsymys", ("uupumus",), ("väsymy", "väsyny", "uupum"), ("fatigue", "tiredness", "tired=", "exhaustion")),
+    ("kipulääke", ("särkylääke",), ("kipulääk", "särkylääk"), ("painkiller", "pain killer", "analgesic")),
+    ("parasetamoli", (), ("parasetamol", "panadol", "pamol"), ("paracetamol", "acetaminophen", "tylenol")),
+    ("ibuprofeeni", (), ("ibuprofee", "burana"), ("ibuprofen", "advil")),
+    ("antibiootti", (), ("antibioot",), ("antibiotic",)),
+    ("rokote", ("rokotus",), ("rokot",), ("vaccine", "vaccination")),
+    ("verikoe", ("laboratoriokoe",), ("verikoe", "verikok"), ("blood test",)),
+)
+
+
+def normalize(text: str) -> str:
+    # lowercase words separated by single spaces; hyphens stay ("covid-19", "ms-tauti")
+    text = unicodedata.normalize("NFKC", text).lower()
+    return " ".join(re.sub(r"[^\w-]+", " ", text).split())
+
+
+def _build() -> Tuple[Dict, Dict[str, Tuple[str, ...]]]:
+    root: Dict = {}
+    synonyms: Dict[str, Tuple[str, ...]] = {}
+    for canonical, syns, stems, english in CONCEPTS:
+        synonyms[canonical] = syns
+        for marker, keys in ((_STEM, stems), (_ENGLISH, english)):
+            for key in keys:
+                whole_word = key.endswith("=")
+                key = normalize(key.rstrip("="))
+                node = root
+                for ch in key:
+                    node = node.setdefault(ch, {})
+                node[_WORD if whole_word or len(key) < MIN_STEM else marker] = canonical
+    return root, synonyms
+
+
+_lexicon: Optional[Tuple[Dict, Dict[str, Tuple[str, ...]]]] = None
+
+
+def _data() -> Tuple[Dict, Dict[str, Tuple[str, ...]]]:
+    global _lexicon
+    if _lexicon is None:
+        _lexicon = _build()
+    return _lexicon
+
+
+def _find(text: str, ch: str, start: int) -> int:
+    i = text.find(ch, start)
+    return len(text) if i < 0 else i
+
+
+def _ending_fits(marker: str, rest: str) -> bool:
+    # rest is what follows a key up to the end of the word
+    if marker == _WORD:
+        return not rest
+    if marker == _ENGLISH:
+        return rest in ENGLISH_ENDINGS
+    return not rest or (len(rest) <= MAX_SUFFIX and rest[-1] in FINNISH_FINALS)
+
+
+def _longest(root: Dict, text: str, start: int) -> Optional[Tuple[str, int]]:
+    # longest key starting at text[start]; returns (canonical, end)
+    best = None
+    node = root
+    i = start
+    end = -1
+    while i < len(text):
+        node = node.get(text[i])
+        if node is None:
+            break
+        i += 1
+        if _STEM not in node and _ENGLISH not in node and _WORD not in node:
+            continue
+        if end < i:
+            # a hyphen ends the word too ("covid-19")
+            end = min(_find(text, " ", i), _find(text, "-", i))
+        for marker in _MARKERS:
+            if marker in node and _ending_fits(marker, text[i:end]):
+                best = (node[marker], i)
+    return best
+
+
+def _compound(root: Dict, word: str) -> bool:
+    # starts with a Finnish stem whose ending didn't fit: a compound, not a typo
+    node = root
+    for ch in word[:-1]:
+        node = node.get(ch)
+        if node is None:
+            return False
+        if _STEM in node:
+            return True
+    return False
+
+
+def _fuzzy(root: Dict, word: str) -> Optional[str]:
+    # one substitution, insertion, deletion or swap over the whole word; a typo
+    # plus an inflected ending is too loose ("spring" isn't "sprain"), and so is
+    # one at the end of the word, which is another word's ending more often
+    # than a typo ("raskaan", heavy, isn't "raskaana"; "cancel" isn't "cancer")
+    found: List[str] = []
+    last = len(word) - 1
+
+    def walk(node: Dict, i: int, edited: bool) -> None:
+        if edited and i == len(word):
+            found.extend(node[m] for m in _MARKERS if m in node)
+        if i < len(word) and word[i] in node:
+            walk(node[word[i]], i + 1, edited)
+        if edited:
+            return
+        for ch, child in node.items():
+            if ch in _MARKERS:
+                continue
+            if i < last:
+                walk(child, i + 1, True)  # substitution
+            if i <= last:
+                walk(child, i, True)  # missing letter
+        if i < last:
+            walk(node, i + 1, True)  # extra letter
+        if i + 1 < last:
+            swapped = node.get(word[i + 1], {}).get(word[i])
+            if swapped is not None:
+                walk(swapped, i + 2, True)
+
+    walk(root, 0, False)
+    return found[0] if found else None
+
+
+def find_terms(text: str, limit: Optional[int] = None) -> List[str]:
+    """Canonical Finnish terms mentioned in text, in order of appearance."""
+    root, _ = _data()
+    norm = normalize(text)
+    terms: List[str] = []
+    covered = 0
+    start = 0
+    while start < len(norm):
+        end_of_word = norm.find(" ", start)
+        end_of_word = len(norm) if end_of_word < 0 else end_of_word
+        if start >= covered:
+            match = _longest(root, norm, start)
+            term = match[0] if match else None
+            if match:
+                covered = match[1]
+            elif end_of_word - start >= FUZZY_MIN and not _compound(root, norm[start:end_of_word]):
+                term = _fuzzy(root, norm[start:end_of_word])
+            if term is not None and term not in terms:
+                terms.append(term)
+                if limit is not None and len(terms) >= limit:
+                    break
+        start = end_of_word + 1
+    return terms
+
+
+def lookup(word: str) -> Optional[str]:
+    terms = find_terms(word, limit=1)
+    return terms[0] if terms else None
+
+
+def expand(term: str) -> List[str]:
+    """The canonical term followed by its Finnish synonyms."""
+    return [term, *_data()[1].get(term, ())]
+
+
+def query_variants(query: str) -> List[str]:
+    """Search words to try for query, best first: the first term found, then the query as typed.
+
+    The query itself is always second at the latest, so a term the lexicon
+    gets wrong can't keep what the user asked for from being searched.
+    """
+    terms = find_terms(query)
+    if not terms:
+        return [query]
+    variants = [terms[0]]
+    if normalize(query) != terms[0]:
+        variants.append(query)
+    for term in terms[1:]:
+        if term not in variants:
+            variants.append(term)
+    for term in terms:
+        for synonym in expand(term)[1:]:
+            if synonym not in variants:
+                variants.append(synonym)
+    return variants
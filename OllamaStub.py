@@ -0,0 +1,211 @@
+# Stand-in for the Ollama HTTP API, for benchmarks and trying out Server.py without a model
+#
+# Answers /api/chat (streaming and not) with a canned reply at a configurable
+# token rate after a configurable delay, and reports the same timing fields
+# as Ollama on the final chunk. A stall (silence after some tokens, optionally
+# for one model only) exercises the watchdog in Watchdog.py.
+#
+# Usage: python OllamaStub.py --port 11435 --tokens-per-s 12 --latency 0.8
+#        python OllamaStub.py --stall 600 --stall-after 5 --stall-model gemma3:4b
+# then point clients at it, e.g. python Server.py --ollama-host http://127.0.0.1:11435
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+DEFAULT_REPLY = (
+    "Hei! 👋 **Kuume** tarkoittaa yli 38,0 °C lämpöä. Lepää, juo riittävästi ja "
+    "käytä tarvittaessa parasetamolia. Hakeudu hoitoon, jos kuume kestää yli "
+    "kolme päivää tai olo heikkenee nopeasti. 🩺"
+)
+
+
+class StubConfig:
+    def __init__(
+        self,
+        tokens_per_s: float = 20.0,
+        latency: float = 0.2,
+        reply: str = DEFAULT_REPLY,
+        tokens: Optional[int] = None,
+        stall: float = 0.0,
+        stall_after: int = 0,
+        stall_model: Optional[str] = None,
+    ):
+        self.tokens_per_s = tokens_per_s
+        self.latency = latency
+        self.reply = reply
+        # repeat or cut the reply to this many tokens
+        self.tokens = tokens
+        # go silent for stall seconds after stall_after tokens (0: before the first one)
+        self.stall = stall
+        self.stall_after = stall_after
+        self.stall_model = stall_model
+
+    def reply_tokens(self):
+        words = self.reply.split(" ")
+        pieces = [w + " " for w in words[:-1]] + [words[-1]]
+        if self.tokens is None:
+            return pieces
+        out = []
+        while len(out) < self.tokens:
+            out.extend(pieces)
+        return out[: self.tokens]
+
+
+def _handler(config: StubConfig):
+    loaded = set()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Go's net/http (and so Ollama) sets TCP_NODELAY; without it Nagle adds ~40 ms per chunk
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _json(self, status: int, payload) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.startswith("/api/tags"):
+                self._json(200, {"models": [{"name": "stub:latest"}]})
+            elif self.path.startswith("/api/ps"):
+                # a model counts as loaded once it has been asked something
+                self._json(200, {"models": [{"name": m, "model": m} for m in sorted(loaded)]})
+            elif self.path in ("/", "/api/version"):
+                self._json(200, {"version": "stub"})
+            else:
+                self._json(404, {"error": "not found"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                request = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError:
+                self._json(400, {"error": "bad json"})
+                return
+            if not self.path.startswith("/api/chat"):
+                self._json(404, {"error": "not found"})
+                return
+            model = request.get("model", "stub")
+            loaded.add(model)
+            stalls = config.stall > 0 and config.stall_model in (None, model)
+            messages = request.get("messages") or []
+            prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in messages)
+            pieces = config.reply_tokens()
+            started = time.perf_counter()
+            time.sleep(config.latency)
+            prompt_done = time.perf_counter()
+            gap = 1.0 / config.tokens_per_s if config.tokens_per_s > 0 else 0.0
+
+            def final(content: str):
+                now = time.perf_counter()
+                return {
+                    "model": model,
+                    "message": {"role": "assistant", "content": content},
+                    "done": True,
+                    "done_reason": "stop",
+                    "total_duration": int((now - started) * 1e9),
+                    "load_duration": 0,
+                    "prompt_eval_count": prompt_tokens,
+                    "prompt_eval_duration": int((prompt_done - started) * 1e9),
+                    "eval_count": len(pieces),
+                    "eval_duration": int((now - prompt_done) * 1e9),
+                }
+
+            if request.get("stream", True) is False:
+                time.sleep(gap * len(pieces) + (config.stall if stalls else 0.0))
+                self._json(200, final("".join(pieces)))
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for i, piece in enumerate(pieces):
+                    if stalls and i == config.stall_after:
+                        time.sleep(config.stall)
+                    self._chunk(
+                        {
+                            "model": model,
+                            "message": {"role": "assistant", "content": piece},
+                            "done": False,
+                        }
+                    )
+                    time.sleep(gap)
+                self._chunk(final(""))
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                # client hung up, same as Ollama we just stop
+                pass
+
+        def _chunk(self, payload) -> None:
+            data = (json.dumps(payload) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+class OllamaStub:
+    """Runs the stub in a background thread; use as a context manager."""
+
+    def __init__(self, config: Optional[StubConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or StubConfig()
+        self.server = ThreadingHTTPServer((host, port), _handler(self.config))
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "OllamaStub":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Fake Ollama server for offline runs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--tokens-per-s", type=float, default=20.0)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--tokens", type=int, default=None, help="reply length in tokens")
+    parser.add_argument("--stall", type=float, default=0.0, help="seconds of silence mid-reply")
+    parser.add_argument("--stall-after", type=int, default=0, help="tokens sent before the stall")
+    parser.add_argument("--stall-model", default=None, help="stall only for this model")
+    args = parser.parse_args(argv)
+    config = StubConfig(
+        args.tokens_per_s,
+        args.latency,
+        tokens=args.tokens,
+        stall=args.stall,
+        stall_after=args.stall_after,
+        stall_model=args.stall_model,
+    )
+    stub = OllamaStub(config, args.host, args.port)
+    print(f"Ollama stub listening on {stub.url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+# Speculative search prefetch: start likely searches while the model is still thinking
+#
+# When a message goes to the model, Finnish search terms are picked out of it
+# with the local medical lexicon (Lexicon.py) and searched in the background. If the
+# model then answers with /search for one of them the results are (nearly)
+# ready. Every prefetch runs under a hard time budget; unfinished ones are
+# cancelled when the turn ends, finished ones with results stay warm for WARM_TTL_S.
+
+import logging
+import threading
+import time
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Callable, Dict, List, Optional
+
+from Lexicon import find_terms
+
+PREFETCH_BUDGET_S = 6.0  # a prefetch that takes longer is abandoned
+MAX_TERMS = 2  # searches started per message
+WARM_TTL_S = 300.0
+MAX_WARM = 32
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    # one pool per process; batch runs create an engine per question
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_TERMS, thread_name_prefix="prefetch")
+        return _executor
+
+
+def search_key(query: str) -> str:
+    # the model's "/search Päänsäryn" should find the prefetched "päänsärky"
+    terms = find_terms(query, limit=1)
+    return terms[0] if terms else " ".join(query.lower().split())
+
+
+class _Prefetch:
+    def __init__(self, term: str, budget: float):
+        self.term = term
+        self.started = time.monotonic()
+        self.deadline = self.started + budget
+        self.cancel = threading.Event()
+        self.future: Optional[Future] = None
+        self.finished: Optional[float] = None
+
+
+class SearchPrefetcher:
+    """Runs speculative searches for an engine. Thread-safe."""
+
+    def __init__(
+        self,
+        search: Callable[[str], str],
+        budget: float = PREFETCH_BUDGET_S,
+        max_terms: int = MAX_TERMS,
+        ttl: float = WARM_TTL_S,
+    ):
+        self.search = search
+        self.budget = budget
+        self.max_terms = max_terms
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _Prefetch] = {}
+        self.counts = {"started": 0, "hits": 0, "misses": 0, "cancelled": 0, "over_budget": 0}
+
+    def start(self, text: str) -> List[str]:
+        """Start background searches for the terms in text; returns the terms searched."""
+        started = []
+        with self._lock:
+            self._expire()
+            for term in find_terms(text, self.max_terms):
+                entry = self._entries.get(term)
+                if entry is not None and not entry.cancel.is_set():
+                    continue  # running or still warm
+                entry = _Prefetch(term, self.budget)
+                entry.future = _pool().submit(self._run, entry)
+                self._entries[term] = entry
+                self.counts["started"] += 1
+                started.append(term)
+        if started:
+            logging.info(f"Prefetching searches: {', '.join(started)}")
+        return started
+
+    def take(self, query: str) -> Optional[str]:
+        """Results of a prefetch for query, waiting for it within its budget; None on a miss."""
+        key = search_key(query)
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(key)
+        if entry is None or entry.future is None or entry.cancel.is_set():
+            self._count("misses")
+            return None
+        try:
+            info = entry.future.result(timeout=max(0.0, entry.deadline - time.monotonic()))
+        except (FutureTimeout, CancelledError):
+            info = None
+        except Exception as e:
+            logging.error(f"Prefetch for {key} failed: {e}")
+            info = None
+        if not info:
+            self._count("over_budget" if time.monotonic() >= entry.deadline else "misses")
+            return None
+        self._count("hits")
+        return info
+
+    def settle(self) -> None:
+        """End of a turn: cancel prefetches still running, keep finished ones warm."""
+        with self._lock:
+            for term, entry in list(self._entries.items()):
+                if entry.finished is None:
+                    entry.cancel.set()
+                    if entry.future is not None:
+                        entry.future.cancel()
+                    del self._entries[term]
+                    self.counts["cancelled"] += 1
+
+    def _run(self, entry: _Prefetch) -> Optional[str]:
+        if entry.cancel.is_set():
+            return None
+        from WebSearch import record_timings, search_limits
+
+        with record_timings(), search_limits(entry.deadline, entry.cancel):
+            info = self.search(entry.term)
+        # an aborted search returns "" like a real miss; don't keep it
+        if entry.cancel.is_set() or time.monotonic() >= entry.deadline:
+            return None
+        if not info:
+            # nothing found (or the search failed): let the foreground search and the next
+            # message try again instead of serving "" from the warm cache
+            with self._lock:
+                if self._entries.get(entry.term) is entry:
+                    del self._entries[entry.term]
+            return None
+        entry.finished = time.monotonic()
+        return info
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        warm = [(e.finished, t) for t, e in self._entries.items() if e.finished is not None]
+        for finished, term in warm:
+            if now - finished > self.ttl:
+                del self._entries[term]
+        warm = sorted((f, t) for f, t in warm if t in self._entries)
+        for _, term in warm[: max(0, len(warm) - MAX_WARM)]:
+            del self._entries[term]
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counts[name] += 1
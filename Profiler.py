@@ -0,0 +1,129 @@
+# Sampling profiler for "it got slow" reports: one flame graph per turn
+#
+# While profiling is on and a turn is open (Telemetry.begin/finish), a
+# background thread takes the stacks of every Python thread PROFILE_HZ times a
+# second with sys._current_frames(): the GUI thread, QThread workers, search
+# and prefetch threads, the Ollama pump. A thread waiting on Ollama shows up
+# as a socket read. Each finished turn is written to PROFILE_DIR in collapsed
+# stack format ("thread;outer;inner count"), which flamegraph.pl and
+# speedscope.app open directly; the file name carries the turn number and
+# kind. Turns that overlap (Server.py, Batch.py) all get every sample.
+#
+# Turn it on with HYGIEIA_PROFILE=1 or Debug > Profile Turns.
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+PROFILE_DIR = os.environ.get("HYGIEIA_PROFILE_DIR", "profiles")
+PROFILE_HZ = float(os.environ.get("HYGIEIA_PROFILE_HZ", 100))
+PROFILE_ON_START = os.environ.get("HYGIEIA_PROFILE", "").lower() in ("1", "true", "yes", "on")
+MAX_DEPTH = 64  # deeper stacks are cut at the root end
+
+
+class TurnProfiler:
+    """Samples all threads while turns are open. Thread-safe."""
+
+    def __init__(self, directory: str = PROFILE_DIR, hz: float = PROFILE_HZ, enabled: bool = PROFILE_ON_START):
+        self.directory = directory
+        self.interval = 1.0 / hz
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        # turn -> {"kind", "stacks": Counter, "samples", "overhead_s"}
+        self._turns: Dict[int, Dict] = {}
+        self._thread: Optional[threading.Thread] = None
+        # code object -> frame label; labels are built once per function
+        self._labels: Dict = {}
+        self._thread_names: Dict[int, str] = {}
+        self.set_enabled(enabled)
+
+    def set_enabled(self, enabled: bool) -> None:
+        with self._lock:
+            self.enabled = enabled
+            if not enabled:
+                # turns already open are dropped rather than written half-sampled
+                self._turns.clear()
+            elif self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="profiler")
+                self._thread.start()
+        if enabled:
+            logging.info(f"Profiling turns at {1 / self.interval:.0f} Hz into {self.directory}/")
+
+    def begin(self, turn: int, kind: str) -> None:
+        with self._lock:
+            if not self.enabled:
+                return
+            self._turns[turn] = {"kind": kind, "stacks": Counter(), "samples": 0, "overhead_s": 0.0}
+            self._wake.notify()
+
+    def end(self, turn: int) -> Optional[Dict]:
+        """Write the turn's profile; returns {"profile", "profile_samples", ...} or None."""
+        with self._lock:
+            entry = self._turns.pop(turn, None)
+        if entry is None or not entry["samples"]:
+            return None
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-turn{turn:05d}-{entry['kind']}.collapsed"
+        path = os.path.join(self.directory, name)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                for stack, count in entry["stacks"].most_common():
+                    f.write(f"{stack} {count}\n")
+        except OSError as e:
+            logging.error(f"Failed to write profile {path}: {e}")
+            return None
+        return {
+            "profile": path,
+            "profile_samples": entry["samples"],
+            "profile_overhead_ms": round(entry["overhead_s"] * 1000, 2),
+        }
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                while not self._turns:
+                    self._wake.wait()
+            start = time.perf_counter()
+            stacks = self.sample(skip=me)
+            with self._lock:
+                spent = time.perf_counter() - start
+                for entry in self._turns.values():
+                    entry["stacks"].update(stacks)
+                    entry["samples"] += 1
+                    entry["overhead_s"] += spent
+            time.sleep(max(0.0, self.interval - spent))
+
+    def sample(self, skip: Optional[int] = None) -> list:
+        """One collapsed stack per thread, root first."""
+        frames = sys._current_frames()
+        if any(ident not in self._thread_names for ident in frames):
+            names = {t.ident: t.name for t in threading.enumerate() if t.ident is not None}
+            # QThreads aren't known to threading and keep a numbered name
+            self._thread_names = {i: names.get(i, f"thread-{i}") for i in frames}
+        stacks = []
+        for ident, frame in frames.items():
+            if ident == skip:
+                continue
+            labels = []
+            while frame is not None and len(labels) < MAX_DEPTH:
+                labels.append(self._label(frame.f_code))
+                frame = frame.f_back
+            labels.append(self._thread_names[ident])
+            stacks.append(";".join(reversed(labels)))
+        return stacks
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            # functions, not lines, so one flame per function; ';' separates frames
+            name = getattr(code, "co_qualname", code.co_name)
+            label = f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            label = label.replace(";", ":")
+            self._labels[code] = label
+        return label
@@ -0,0 +1,285 @@
+# On-disk cache of finished answers, so repeated questions skip the LLM
+#
+# Keys combine the normalized question, a fingerprint of the recent context
+# and the model + system prompt version. Exact hits are a primary key lookup;
+# near-duplicate hits use an in-memory character trigram index and only match
+# questions with the same numbers, units, negations and age groups in them
+# (38 °C and 39 °C, 500 mg and 500 g, "safe" and "can't be safe", or a
+# baby and an adult aren't the same question; "two" and "2" are).
+
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+CACHE_PATH = "response_cache.sqlite3"
+MAX_ENTRIES = 2000
+TTL_SECONDS = 30 * 24 * 3600
+SIMILARITY_THRESHOLD = 0.85  # None disables near-duplicate matching
+CONTEXT_WINDOW = 4  # how many preceding context entries make up the fingerprint
+
+
+class CacheHit(NamedTuple):
+    answer: str
+    kind: str  # "exact" or "similar"
+    score: float
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = re.sub(r"[^\w\s.,/%-]", " ", text)
+    text = re.sub(r"(?<!\d)[.,]|[.,](?!\d)", " ", text)
+    return " ".join(text.split())
+
+
+# word -> what it stands for in the guard terms; "don't" normalizes to "don t", see _CONTRACTION
+NEGATIONS = {
+    **dict.fromkeys(["not", "cannot", "dont", "doesnt", "didnt", "isnt", "arent", "cant", "wont"], "not"),
+    "no": "no", "never": "never", "without": "without", "ilman": "without",
+    **dict.fromkeys(["ei", "en", "et", "emme", "ette", "eivät", "eikä", "enkä", "etkä"], "ei"),
+    **dict.fromkeys(["älä", "älkää"], "älä"),
+}
+_CONTRACTION = re.compile(r"\b\w+n t\b")
+NUMBER_WORDS = {
+    "one": "1", "two": "2", "three": "3", "four": "4", "five": "5", "six": "6", "seven": "7",
+    "eight": "8", "nine": "9", "ten": "10", "twice": "2", "half": "0.5",
+    "yksi": "1", "kaksi": "2", "kahta": "2", "kolme": "3", "kolmea": "3", "neljä": "4",
+    "neljää": "4", "viisi": "5", "viittä": "5", "kuusi": "6", "kuutta": "6", "seitsemän": "7",
+    "kahdeksan": "8", "yhdeksän": "9", "kymmenen": "10", "puoli": "0.5", "puolikas": "0.5",
+}
+UNITS = {"mg", "g", "mcg", "µg", "ug", "ml", "l", "dl", "kg", "iu", "ky", "%", "mmol"}
+# age groups: the same dose isn't the same question for a baby and an adult
+AGE_GROUPS = {
+    **dict.fromkeys(["baby", "babies", "infant", "infants", "newborn", "newborns"], "baby"),
+    **dict.fromkeys(["toddler", "toddlers"], "toddler"),
+    **dict.fromkeys(["child", "children", "kid", "kids", "son", "daughter"], "child"),
+    **dict.fromkeys(["teen", "teens", "teenager", "teenagers", "adolescent"], "teen"),
+    **dict.fromkeys(["adult", "adults"], "adult"),
+    **dict.fromkeys(["elderly", "senior", "seniors"], "elderly"),
+    **dict.fromkeys(["pregnant", "pregnancy", "raskaana"], "pregnant"),
+}
+# Finnish age words are inflected; matched by stem
+AGE_STEMS = (
+    ("vauv", "baby"), ("imeväi", "baby"), ("vastasynt", "baby"), ("taapero", "toddler"),
+    ("lapsi", "child"), ("lapse", "child"), ("lasten", "child"), ("lasta", "child"),
+    ("nuori", "teen"), ("nuore", "teen"), ("aikui", "adult"), ("vanhu", "elderly"),
+    ("iäkä", "elderly"), ("iäkkä", "elderly"), ("raskau", "pregnant"),
+)
+
+
+def _guard_terms(text: str) -> Tuple[str, ...]:
+    # terms that must match exactly for a near-duplicate hit: numbers (written as digits or
+    # words), units, negations and age groups
+    terms = [n.replace(",", ".") for n in re.findall(r"\d+(?:[.,]\d+)?", text)]
+    terms += ["not"] * len(_CONTRACTION.findall(text))
+    for word in re.findall(r"[^\W\d]+|%", text):
+        term = NEGATIONS.get(word) or NUMBER_WORDS.get(word) or AGE_GROUPS.get(word)
+        if term is None and word in UNITS:
+            term = word
+        if term is None and len(word) > 4:
+            term = next((group for stem, group in AGE_STEMS if word.startswith(stem)), None)
+        if term is not None:
+            terms.append(term)
+    return tuple(sorted(set(terms)))
+
+
+def _trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def context_fingerprint(context: List[Dict], window: int = CONTEXT_WINDOW) -> str:
+    h = hashlib.sha256()
+    for m in context[-window:] if window else []:
+        h.update(str(m.get("role", "")).encode("utf-8"))
+        h.update(normalize(str(m.get("content", ""))).encode("utf-8"))
+        for img in m.get("images") or []:
+            h.update(hashlib.sha256(str(img).encode("utf-8")).digest())
+    return h.hexdigest()[:16]
+
+
+def prompt_version(model: str, system_prompt: str) -> str:
+    return hashlib.sha256(f"{model}\0{system_prompt}".encode("utf-8")).hexdigest()[:16]
+
+
+class ResponseCache:
+    """SQLite-backed answer cache with LRU + TTL eviction. Safe to share between threads."""
+
+    def __init__(
+        self,
+        path: str = CACHE_PATH,
+        max_entries: int = MAX_ENTRIES,
+        ttl: float = TTL_SECONDS,
+        similarity: Optional[float] = SIMILARITY_THRESHOLD,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " key TEXT PRIMARY KEY, bucket TEXT, question TEXT, answer TEXT,"
+            " created REAL, last_used REAL, hits INTEGER DEFAULT 0)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS answers_lru ON answers(last_used)")
+        self._db.commit()
+        # bucket -> key -> (trigrams, guard terms); trigram -> keys per bucket
+        self._entries: Dict[str, Dict[str, Tuple[Set[str], Tuple[str, ...]]]] = defaultdict(dict)
+        self._index: Dict[str, Dict[str, Set[str]]] = defaultdict(lambda: defaultdict(set))
+        self._evict()
+        for key, bucket, question in self._db.execute(
+            "SELECT key, bucket, question FROM answers"
+        ):
+            self._index_entry(bucket, key, question)
+
+    @staticmethod
+    def make_key(bucket: str, question: str) -> str:
+        return hashlib.sha256(f"{bucket}\0{question}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def bucket(context: List[Dict], model: str, system_prompt: str) -> str:
+        return f"{prompt_version(model, system_prompt)}:{context_fingerprint(context)}"
+
+    def get(self, bucket: str, question: str) -> Optional[CacheHit]:
+        norm = normalize(question)
+        if not norm:
+            return None
+        key = self.make_key(bucket, norm)
+        with self._lock:
+            hit = self._fetch(key)
+            if hit is not None:
+                return CacheHit(hit, "exact", 1.0)
+            if self.similarity is None:
+                return None
+            match = self._nearest(bucket, norm)
+            if match is None:
+                return None
+            similar_key, score = match
+            hit = self._fetch(similar_key)
+            return CacheHit(hit, "similar", score) if hit is not None else None
+
+    def put(self, bucket: str, question: str, answer: str) -> None:
+        norm = normalize(question)
+        if not norm or not answer.strip():
+            return
+        key = self.make_key(bucket, norm)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO answers (key, bucket, question, answer, created, last_used, hits)"
+                " VALUES (?, ?, ?, ?, ?, ?, 0)",
+                (key, bucket, norm, answer, now, now),
+            )
+            self._db.commit()
+            self._index_entry(bucket, key, norm)
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM answers")
+            self._db.commit()
+            self._entries.clear()
+            self._index.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            count, hits = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM answers"
+            ).fetchone()
+        return {"entries": count, "hits": hits}
+
+    def _fetch(self, key: str) -> Optional[str]:
+        row = self._db.execute(
+            "SELECT answer, created FROM answers WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        answer, created = row
+        now = time.time()
+        if self.ttl and now - created > self.ttl:
+            self._drop([key])
+            return None
+        self._db.execute(
+            "UPDATE answers SET last_used = ?, hits = hits + 1 WHERE key = ?",
+            (now, key),
+        )
+        self._db.commit()
+        return answer
+
+    def _nearest(self, bucket: str, norm: str) -> Optional[Tuple[str, float]]:
+        grams = _trigrams(norm)
+        guards = _guard_terms(norm)
+        entries = self._entries.get(bucket)
+        if not entries:
+            return None
+        index = self._index[bucket]
+        shared: Dict[str, int] = defaultdict(int)
+        for g in grams:
+            for key in index.get(g, ()):
+                shared[key] += 1
+        best, best_score = None, 0.0
+        for key, common in shared.items():
+            other, other_guards = entries[key]
+            if other_guards != guards:
+                continue
+            score = common / (len(grams) + len(other) - common)
+            if score > best_score:
+                best, best_score = key, score
+        if best is not None and best_score >= (self.similarity or 1.0):
+            return best, round(best_score, 3)
+        return None
+
+    def _index_entry(self, bucket: str, key: str, norm: str) -> None:
+        if key in self._entries[bucket]:
+            return
+        grams = _trigrams(norm)
+        self._entries[bucket][key] = (grams, _guard_terms(norm))
+        for g in grams:
+            self._index[bucket][g].add(key)
+
+    def _drop(self, keys: List[str]) -> None:
+        if not keys:
+            return
+        self._db.executemany("DELETE FROM answers WHERE key = ?", [(k,) for k in keys])
+        self._db.commit()
+        for bucket, entries in list(self._entries.items()):
+            for key in keys:
+                entry = entries.pop(key, None)
+                if entry is None:
+                    continue
+                for g in entry[0]:
+                    self._index[bucket][g].discard(key)
+
+    def _evict(self) -> None:
+        expired = []
+        if self.ttl:
+            expired = [
+                k
+                for (k,) in self._db.execute(
+                    "SELECT key FROM answers WHERE created < ?", (time.time() - self.ttl,)
+                )
+            ]
+        self._drop(expired)
+        (count,) = self._db.execute("SELECT COUNT(*) FROM answers").fetchone()
+        if count > self.max_entries:
+            stale = [
+                k
+                for (k,) in self._db.execute(
+                    "SELECT key FROM answers ORDER BY last_used ASC LIMIT ?",
+                    (count - self.max_entries,),
+                )
+            ]
+            self._drop(stale)
+            logging.info(f"Response cache evicted {len(stale)} entries")
+
+
+if __name__ == "__main__":
+    print(json.dumps(ResponseCache().stats()))
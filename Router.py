@@ -0,0 +1,254 @@
+# Model routing: auxiliary tasks go to a small model, answers to the main one
+#
+# Each task has its own model and Ollama options in ROUTES. Calls are timed
+# and counted per route together with a simple quality signal (did the
+# summary shrink the context, did the generated query find anything, was the
+# label one of the allowed ones). If the small model fails the route falls
+# back to the answer model, and tries the small one again after
+# FALLBACK_RETRY_S (it may just have been loading, or pulled meanwhile).
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+SMALL_MODEL = os.environ.get("HYGIEIA_SMALL_MODEL", "qwen3:0.6b")
+FALLBACK_RETRY_S = float(os.environ.get("HYGIEIA_ROUTE_RETRY_S", "300"))
+
+# model None means the answer model; think False turns off qwen3's reasoning
+ROUTES: Dict[str, Dict] = {
+    "summarize": {"model": SMALL_MODEL, "think": False, "options": {"temperature": 0.2}},
+    "search_query": {
+        "model": SMALL_MODEL,
+        "think": False,
+        "options": {"temperature": 0, "num_predict": 16},
+    },
+    "classify": {
+        "model": SMALL_MODEL,
+        "think": False,
+        "options": {"temperature": 0, "num_predict": 8},
+    },
+}
+
+THINK_OPEN, THINK_CLOSE = "<think>", "</think>"
+
+
+def _partial_tag(text: str, tag: str) -> int:
+    # length of the longest tag prefix that text ends with
+    for k in range(min(len(tag) - 1, len(text)), 0, -1):
+        if text.endswith(tag[:k]):
+            return k
+    return 0
+
+
+class ThinkStripper:
+    """Removes <think>...</think> blocks from text that arrives in pieces.
+
+    A tag split over two chunks is held back until it can be told apart from
+    ordinary text, so nothing inside a block is ever emitted.
+    """
+
+    def __init__(self):
+        self._pending = ""
+        self._inside = False
+        self._after_block = False
+        self.stripped = 0  # characters of reasoning dropped
+
+    def feed(self, piece: str) -> str:
+        self._pending += piece
+        out: List[str] = []
+        while True:
+            tag = THINK_CLOSE if self._inside else THINK_OPEN
+            i = self._pending.find(tag)
+            if i < 0:
+                keep = _partial_tag(self._pending, tag)
+                text = self._pending[: len(self._pending) - keep]
+                self._pending = self._pending[len(self._pending) - keep :]
+                self._emit(text, out)
+                break
+            self._emit(self._pending[:i], out)
+            self._pending = self._pending[i + len(tag) :]
+            self._inside = not self._inside
+            if not self._inside:
+                self._after_block = True
+        return "".join(out)
+
+    def flush(self) -> str:
+        # an unterminated block is dropped, a dangling partial tag is just text
+        out: List[str] = []
+        if not self._inside:
+            self._emit(self._pending, out)
+        self._pending = ""
+        return "".join(out)
+
+    def _emit(self, text: str, out: List[str]) -> None:
+        if self._inside:
+            self.stripped += len(text)
+            return
+        if self._after_block:
+            # the answer after a block starts with blank lines
+            text = text.lstrip()
+            if not text:
+                return
+            self._after_block = False
+        out.append(text)
+
+
+def strip_think(text: str) -> str:
+    stripper = ThinkStripper()
+    return stripper.feed(text) + stripper.flush()
+
+
+def _text_only(messages: Iterable[Dict]) -> List[Dict]:
+    # small models are text-only; keep a marker where images were
+    out = []
+    for m in messages:
+        if m.get("images"):
+            m = {k: v for k, v in m.items() if k != "images"}
+            m["content"] = f"{m.get('content', '')} [image]"
+        out.append(m)
+    return out
+
+
+class ModelRouter:
+    """Sends each task to its configured model and keeps per-route stats. Thread-safe."""
+
+    def __init__(
+        self,
+        client: Callable[[], Any],
+        answer_model: str,
+        routes: Optional[Dict[str, Dict]] = None,
+        telemetry=None,
+        settings: Optional[Callable[[str], Tuple[Dict, Optional[str]]]] = None,
+        retry_after: float = FALLBACK_RETRY_S,
+    ):
+        self._client = client
+        # model -> (tuned Ollama options, keep_alive), see Tuner.py
+        self._settings = settings or (lambda model: ({}, None))
+        self.answer_model = answer_model
+        self.routes = dict(ROUTES if routes is None else routes)
+        self.telemetry = telemetry
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict] = {}
+        # route -> when its model failed; it uses the answer model until retry_after has passed
+        self.retry_after = retry_after
+        self._fallen_back: Dict[str, float] = {}
+
+    def model_for(self, task: str) -> str:
+        failed = self._fallen_back.get(task)
+        if failed is not None and time.monotonic() - failed < self.retry_after:
+            return self.answer_model
+        return self.routes.get(task, {}).get("model") or self.answer_model
+
+    def complete(
+        self,
+        task: str,
+        messages: List[Dict],
+        check: Optional[Callable[[str], bool]] = None,
+        options: Optional[Dict] = None,
+    ) -> str:
+        """Run a non-streaming auxiliary call and return its text without reasoning.
+
+        check, if given, grades the output for the route's quality stats;
+        options are added to the route's Ollama options for this call.
+        """
+        model = self.model_for(task)
+        try:
+            text, seconds, stripped = self._call(task, model, messages, options)
+        except Exception as e:
+            if model == self.answer_model:
+                self._count(task, model, error=True)
+                raise
+            logging.warning(f"Route {task} model {model} failed ({e}); using {self.answer_model}")
+            self._fallen_back[task] = time.monotonic()
+            self._count(task, model, error=True, fallback=True)
+            model = self.answer_model
+            text, seconds, stripped = self._call(task, model, messages, options)
+        else:
+            if model != self.answer_model and self._fallen_back.pop(task, None) is not None:
+                logging.info(f"Route {task} model {model} works again")
+        ok = check(text) if check is not None else None
+        self._count(task, model, seconds=seconds, empty=not text.strip(), ok=ok)
+        logging.info(f"Route {task} -> {model}: {seconds * 1000:.0f} ms, {len(text)} chars")
+        if self.telemetry is not None:
+            self.telemetry.event(
+                "route",
+                seconds,
+                task=task,
+                model=model,
+                chars=len(text),
+                think_chars=stripped,
+                ok=ok,
+            )
+        return text
+
+    def grade(self, task: str, ok: bool) -> None:
+        # quality known only later, e.g. whether a generated query found results
+        self._count(task, self.model_for(task), ok=ok)
+
+    def _call(self, task: str, model: str, messages: List[Dict], options: Optional[Dict] = None):
+        route = self.routes.get(task, {})
+        tuned, keep_alive = self._settings(model)
+        kwargs: Dict[str, Any] = {}
+        merged = {**tuned, **route.get("options", {}), **(options or {})}
+        if merged:
+            kwargs["options"] = merged
+        if keep_alive is not None:
+            kwargs["keep_alive"] = keep_alive
+        # the answer model may not know about thinking at all
+        if route.get("think") is not None and model != self.answer_model:
+            kwargs["think"] = route["think"]
+        start = time.perf_counter()
+        response = self._client().chat(model=model, messages=_text_only(messages), **kwargs)
+        seconds = time.perf_counter() - start
+        stripper = ThinkStripper()
+        raw = response.get("message", {}).get("content", "") or ""
+        text = (stripper.feed(raw) + stripper.flush()).strip()
+        return text, seconds, stripper.stripped
+
+    def _count(
+        self,
+        task: str,
+        model: str,
+        seconds: Optional[float] = None,
+        error: bool = False,
+        fallback: bool = False,
+        empty: bool = False,
+        ok: Optional[bool] = None,
+    ) -> None:
+        with self._lock:
+            s = self._stats.setdefault(
+                task,
+                {
+                    "calls": 0,
+                    "errors": 0,
+                    "fallbacks": 0,
+                    "empty": 0,
+                    "graded": 0,
+                    "good": 0,
+                    "latency_s": 0.0,
+                    "latency_max_s": 0.0,
+                },
+            )
+            s["model"] = model
+            if seconds is not None:
+                s["calls"] += 1
+                s["latency_s"] += seconds
+                s["latency_max_s"] = max(s["latency_max_s"], seconds)
+            s["errors"] += error
+            s["fallbacks"] += fallback
+            s["empty"] += empty
+            if ok is not None:
+                s["graded"] += 1
+                s["good"] += bool(ok)
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            out = {}
+            for task, s in self._stats.items():
+                row = dict(s)
+                row["latency_mean_s"] = round(s["latency_s"] / s["calls"], 4) if s["calls"] else None
+                row["quality"] = round(s["good"] / s["graded"], 3) if s["graded"] else None
+                out[task] = row
+            return out
@@ -0,0 +1,373 @@
+# Local HTTP API: one Hygieia backend shared by thin clients on the LAN
+#
+#   POST   /sessions                       -> {"session_id": ...}
+#   GET    /sessions/<id>                  -> context size and queue state
+#   DELETE /sessions/<id>
+#   POST   /sessions/<id>/messages         {"message": "..."} -> text/event-stream
+#   GET    /health
+#
+# Message streams send "status", "token" (new text since the last event),
+# "done" and "error" events. Requests to Ollama go through a bounded scheduler
+# that serves sessions round-robin, so one chatty client can't starve the
+# others, and each session only ever has one generation running.
+#
+# Usage: python Server.py --port 8765 --slots 2 --ollama-host http://127.0.0.1:11434
+
+import argparse
+import asyncio
+import json
+import logging
+import uuid
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+from LLM import MODEL_NAME, ChatEngine
+from ResponseCache import CACHE_PATH, ResponseCache
+
+logging.basicConfig(level=logging.INFO)
+
+MAX_BODY_BYTES = 64 * 1024
+
+
+class AdmissionError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class Session:
+    def __init__(self, session_id: str, engine: ChatEngine):
+        self.id = session_id
+        self.engine = engine
+        self.pending: Deque["Job"] = deque()
+        self.busy = False
+
+
+class Job:
+    def __init__(self, session: Session, message: str):
+        self.session = session
+        self.message = message
+        self.events: asyncio.Queue = asyncio.Queue()
+
+
+class Scheduler:
+    """Bounded request queue with fair per-session ordering.
+
+    At most `slots` generations run at once. Sessions take turns, jobs of one
+    session run in the order they were sent, and new jobs are refused once
+    `max_queued` are waiting overall or `max_per_session` for one session.
+    """
+
+    def __init__(self, slots: int = 1, max_queued: int = 32, max_per_session: int = 4):
+        self.slots = max(1, slots)
+        self.max_queued = max_queued
+        self.max_per_session = max_per_session
+        self.ready: Deque[Session] = deque()
+        self.queued = 0
+        self.running = 0
+        self._wakeup = asyncio.Event()
+        self._workers = []
+
+    def start(self) -> None:
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.slots)
+        ]
+
+    async def stop(self) -> None:
+        for w in self._workers:
+            w.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+    def submit(self, session: Session, message: str) -> Job:
+        if self.queued >= self.max_queued:
+            raise AdmissionError(503, "Server busy, try again later")
+        if len(session.pending) >= self.max_per_session:
+            raise AdmissionError(429, "Too many pending messages in this session")
+        job = Job(session, message)
+        session.pending.append(job)
+        self.queued += 1
+        if not session.busy and session not in self.ready:
+            self.ready.append(session)
+        self._wakeup.set()
+        return job
+
+    def _next_job(self) -> Optional[Job]:
+        while self.ready:
+            session = self.ready.popleft()
+            if session.busy or not session.pending:
+                continue
+            session.busy = True
+            self.queued -= 1
+            return session.pending.popleft()
+        return None
+
+    async def _worker(self) -> None:
+        while True:
+            job = self._next_job()
+            if job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            self.running += 1
+            try:
+                async for event in job.session.engine.astream(job.message):
+                    job.events.put_nowait(event)
+            except Exception as e:
+                job.events.put_nowait({"type": "error", "text": str(e)})
+            finally:
+                self.running -= 1
+                session = job.session
+                session.busy = False
+                # back of the line, behind the sessions that were waiting
+                if session.pending:
+                    self.ready.append(session)
+                    self._wakeup.set()
+
+
+class HygieiaServer:
+    def __init__(
+        self,
+        engine_factory: Callable[[], ChatEngine],
+        scheduler: Scheduler,
+        max_sessions: int = 64,
+    ):
+        self.engine_factory = engine_factory
+        self.scheduler = scheduler
+        self.max_sessions = max_sessions
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+
+    def create_session(self) -> Session:
+        if len(self.sessions) >= self.max_sessions:
+            # drop the least recently used idle session
+            for sid, s in self.sessions.items():
+                if not s.busy and not s.pending:
+                    del self.sessions[sid]
+                    break
+            else:
+                raise AdmissionError(503, "Too many active sessions")
+        session = Session(uuid.uuid4().hex, self.engine_factory())
+        self.sessions[session.id] = session
+        return session
+
+    def get_session(self, session_id: str) -> Session:
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise AdmissionError(404, "Unknown session")
+        self.sessions.move_to_end(session_id)
+        return session
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            method, path, body = await _read_request(reader)
+            await self.route(method, path, body, writer)
+        except AdmissionError as e:
+            await _send_json(writer, e.status, {"error": str(e)})
+        except (ValueError, json.JSONDecodeError) as e:
+            await _send_json(writer, 400, {"error": f"Bad request: {e}"})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logging.exception("Request failed")
+            await _send_json(writer, 500, {"error": str(e)})
+        finally:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def route(
+        self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter
+    ) -> None:
+        parts = [p for p in path.split("?")[0].split("/") if p]
+        if method == "GET" and parts == ["health"]:
+            await _send_json(
+                writer,
+                200,
+                {
+                    "sessions": len(self.sessions),
+                    "queued": self.scheduler.queued,
+                    "running": self.scheduler.running,
+                },
+            )
+            return
+        if parts[:1] != ["sessions"]:
+            raise AdmissionError(404, "Not found")
+        if method == "POST" and len(parts) == 1:
+            session = self.create_session()
+            await _send_json(writer, 201, {"session_id": session.id})
+            return
+        if len(parts) < 2:
+            raise AdmissionError(405, "Method not allowed")
+        session = self.get_session(parts[1])
+        if len(parts) == 2 and method == "GET":
+            await _send_json(
+                writer,
+                200,
+                {
+                    "session_id": session.id,
+                    "messages": len(session.engine.context.context),
+                    "context_tokens": session.engine.context.current_token_count,
+                    "pending": len(session.pending),
+                    "busy": session.busy,
+                },
+            )
+        elif len(parts) == 2 and method == "DELETE":
+            del self.sessions[session.id]
+            await _send_json(writer, 200, {"deleted": session.id})
+        elif parts[2:] == ["messages"] and method == "POST":
+            payload = json.loads(body or b"{}")
+            message = str(payload.get("message", "")).strip()
+            if not message:
+                raise ValueError("message is required")
+            job = self.scheduler.submit(session, message)
+            await self.stream_job(job, writer)
+        else:
+            raise AdmissionError(405, "Method not allowed")
+
+    async def stream_job(self, job: Job, writer: asyncio.StreamWriter) -> None:
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream; charset=utf-8\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        await writer.drain()
+        sent = ""
+        connected = True
+        while True:
+            event = await job.events.get()
+            kind = event["type"]
+            if kind == "update":
+                text = event["text"]
+                # the engine reports the whole answer so far; send only what's new
+                if text == sent:
+                    continue
+                if text.startswith(sent):
+                    data = {"text": text[len(sent) :]}
+                    kind = "token"
+                else:
+                    data = {"text": text}
+                    kind = "replace"
+                sent = text
+            else:
+                data = {"text": event["text"]}
+            if connected:
+                try:
+                    writer.write(_sse(kind, data))
+                    await writer.drain()
+                except ConnectionError:
+                    # keep draining so the session's context stays consistent
+                    connected = False
+            if event["type"] in ("done", "error"):
+                return
+
+
+def _sse(event: str, data: Dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode(
+        "utf-8"
+    )
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Tuple[str, str, bytes]:
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    method, path, _ = lines[0].split(" ", 2)
+    length = 0
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value.strip())
+    if length > MAX_BODY_BYTES:
+        raise AdmissionError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path, body
+
+
+async def _send_json(writer: asyncio.StreamWriter, status: int, payload: Dict) -> None:
+    reasons = {
+        200: "OK",
+        201: "Created",
+        400: "Bad Request",
+        404: "Not Found",
+        405: "Method Not Allowed",
+        413: "Payload Too Large",
+        429: "Too Many Requests",
+        500: "Internal Server Error",
+        503: "Service Unavailable",
+    }
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    writer.write(
+        f"HTTP/1.1 {status} {reasons.get(status, '')}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: close\r\n\r\n".encode("latin-1")
+        + body
+    )
+    await writer.drain()
+
+
+async def serve(
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    slots: int = 1,
+    max_queued: int = 32,
+    max_per_session: int = 4,
+    model: str = MODEL_NAME,
+    ollama_host: Optional[str] = None,
+    engine_factory: Optional[Callable[[], ChatEngine]] = None,
+    cache_path: Optional[str] = None,
+) -> None:
+    """Run the API until cancelled. Pass engine_factory to swap in a stub engine."""
+    scheduler = Scheduler(slots, max_queued, max_per_session)
+    cache = ResponseCache(cache_path) if cache_path else None
+    factory = engine_factory or (
+        lambda: ChatEngine(model=model, host=ollama_host, cache=cache)
+    )
+    app = HygieiaServer(factory, scheduler)
+    scheduler.start()
+    server = await asyncio.start_server(app.handle, host, port)
+    logging.info(f"Hygieia API listening on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await scheduler.stop()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Serve Hygieia over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="use 0.0.0.0 to serve the LAN")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--slots", type=int, default=1, help="generations run in parallel (match OLLAMA_NUM_PARALLEL)"
+    )
+    parser.add_argument("--max-queued", type=int, default=32)
+    parser.add_argument("--max-per-session", type=int, default=4)
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--ollama-host", default=None)
+    parser.add_argument(
+        "--cache", nargs="?", const=CACHE_PATH, default=None, help="share a response cache file"
+    )
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(
+            serve(
+                args.host,
+                args.port,
+                args.slots,
+                args.max_queued,
+                args.max_per_session,
+                args.model,
+                args.ollama_host,
+                cache_path=args.cache,
+            )
+        )
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+# Durable conversation sessions: one append-only SQLite (WAL) file per session
+#
+# The transcript (what the user saw) and the model context are journaled
+# separately. Context changes are stored as "add" rows plus a "reset" row
+# whenever ContextManager summarizes, so resuming only replays the rows after
+# the last reset. Images are stored as file references, not base64. Message
+# text is indexed for full-text search (SQLite FTS5) by a trigger as it is
+# saved; sessions from before the index get it built when first opened.
+
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+SESSIONS_DIR = "sessions"
+PAGE_SIZE = 50
+SEARCH_LIMIT = 50
+SNIPPET_WORDS = 12
+# around matched words in search snippets; control characters never occur in messages
+HIT_START, HIT_END = "\x02", "\x03"
+
+
+def _image_key(encoded: str) -> str:
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class SessionStore:
+    def __init__(self, path: str):
+        self.path = path
+        self.id = os.path.splitext(os.path.basename(path))[0]
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL survives an app crash; only an OS crash can lose the last rows
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS messages (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts REAL, kind TEXT, content TEXT, meta TEXT);
+            CREATE TABLE IF NOT EXISTS context_log (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts REAL, op TEXT, entries TEXT);
+            CREATE INDEX IF NOT EXISTS context_resets ON context_log(op, seq);
+            CREATE TABLE IF NOT EXISTS images (key TEXT PRIMARY KEY, path TEXT);
+            """
+        )
+        self._db.execute(
+            "INSERT OR IGNORE INTO info VALUES ('created', ?)", (str(time.time()),)
+        )
+        self._db.commit()
+        self._create_index()
+        # base64 image -> path, for images added this run
+        self._image_paths: Dict[str, str] = {}
+
+    @classmethod
+    def create(cls, directory: str = SESSIONS_DIR) -> "SessionStore":
+        os.makedirs(directory, exist_ok=True)
+        name = time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+        return cls(os.path.join(directory, f"{name}.sqlite3"))
+
+    @classmethod
+    def open(cls, session_id: str, directory: str = SESSIONS_DIR) -> "SessionStore":
+        path = os.path.join(directory, f"{session_id}.sqlite3")
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        return cls(path)
+
+    @classmethod
+    def open_latest(cls, directory: str = SESSIONS_DIR) -> Optional["SessionStore"]:
+        sessions = list_sessions(directory)
+        return cls.open(sessions[0]["id"], directory) if sessions else None
+
+    def close(self) -> None:
+        self._db.close()
+
+    # --- transcript -------------------------------------------------------
+
+    def append_message(self, kind: str, content: str, meta: Optional[Dict] = None) -> int:
+        cur = self._db.execute(
+            "INSERT INTO messages (ts, kind, content, meta) VALUES (?, ?, ?, ?)",
+            (time.time(), kind, content, json.dumps(meta, ensure_ascii=False) if meta else None),
+        )
+        if kind == "user" and self.title() is None:
+            self._db.execute("INSERT OR REPLACE INTO info VALUES ('title', ?)", (content[:80],))
+        self._db.commit()
+        return cur.lastrowid
+
+    def recent_messages(self, limit: int = PAGE_SIZE) -> List[Dict]:
+        rows = self._db.execute(
+            "SELECT seq, ts, kind, content, meta FROM messages ORDER BY seq DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return [self._message(r) for r in reversed(rows)]
+
+    def messages_before(self, seq: int, limit: int = PAGE_SIZE) -> List[Dict]:
+        rows = self._db.execute(
+            "SELECT seq, ts, kind, content, meta FROM messages WHERE seq < ? ORDER BY seq DESC LIMIT ?",
+            (seq, limit),
+        ).fetchall()
+        return [self._message(r) for r in reversed(rows)]
+
+    def message_count(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    def search(self, query: str, limit: int = SEARCH_LIMIT) -> List[Dict]:
+        """Messages containing every word of query (as a prefix), best match first.
+
+        Each result has a "snippet" with matches between HIT_START and HIT_END.
+        """
+        match = fts_query(query)
+        if not match:
+            return []
+        try:
+            rows = self._db.execute(
+                "SELECT m.seq, m.ts, m.kind, m.content, m.meta, "
+                "snippet(messages_fts, 0, ?, ?, '…', ?) "
+                "FROM messages_fts JOIN messages m ON m.seq = messages_fts.rowid "
+                "WHERE messages_fts MATCH ? ORDER BY rank LIMIT ?",
+                (HIT_START, HIT_END, SNIPPET_WORDS, match, limit),
+            ).fetchall()
+        except sqlite3.Error as e:
+            logging.error(f"Search for {query!r} failed: {e}")
+            return []
+        results = []
+        for row in rows:
+            message = self._message(row[:5])
+            message["snippet"] = row[5]
+            results.append(message)
+        return results
+
+    def _create_index(self) -> None:
+        exists = self._db.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'"
+        ).fetchone()
+        try:
+            # remove_diacritics folds ä/ö so "paansarky" still finds "päänsärky"
+            self._db.executescript(
+                """
+                CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts
+                    USING fts5(content, tokenize="unicode61 remove_diacritics 2");
+                CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages
+                    WHEN new.kind != 'image'
+                    BEGIN INSERT INTO messages_fts(rowid, content) VALUES (new.seq, new.content); END;
+                """
+            )
+            if not exists:
+                self._db.execute(
+                    "INSERT INTO messages_fts(rowid, content) "
+                    "SELECT seq, content FROM messages WHERE kind != 'image'"
+                )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logging.error(f"Full-text index for session {self.id} unavailable: {e}")
+
+    def title(self) -> Optional[str]:
+        row = self._db.execute("SELECT value FROM info WHERE key = 'title'").fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _message(row) -> Dict:
+        seq, ts, kind, content, meta = row
+        return {
+            "seq": seq,
+            "ts": ts,
+            "kind": kind,
+            "content": content,
+            "meta": json.loads(meta) if meta else {},
+        }
+
+    # --- model context ----------------------------------------------------
+
+    def remember_image(self, encoded: str, path: str) -> None:
+        # call before the image enters the context so it's journaled as a reference
+        self._image_paths[encoded] = path
+
+    def journal_context(self, op: str, entries: List[Dict]) -> None:
+        """ContextManager.on_change hook: op is "add" or "reset"."""
+        stored = [self._store_entry(e) for e in entries]
+        self._db.execute(
+            "INSERT INTO context_log (ts, op, entries) VALUES (?, ?, ?)",
+            (time.time(), op, json.dumps(stored, ensure_ascii=False)),
+        )
+        self._db.commit()
+
+    def restore_context(self, encode: Callable[[str], Optional[str]]) -> List[Dict]:
+        row = self._db.execute(
+            "SELECT MAX(seq) FROM context_log WHERE op = 'reset'"
+        ).fetchone()
+        since = row[0] or 0
+        context: List[Dict] = []
+        for (entries,) in self._db.execute(
+            "SELECT entries FROM context_log WHERE seq >= ? ORDER BY seq", (since,)
+        ):
+            context.extend(self._load_entry(e, encode) for e in json.loads(entries))
+        return context
+
+    def _store_entry(self, entry: Dict) -> Dict:
+        stored = {k: v for k, v in entry.items() if k != "images"}
+        if entry.get("images"):
+            refs = []
+            for img in entry["images"]:
+                key = _image_key(img)
+                path = self._image_paths.get(img)
+                if path:
+                    self._db.execute("INSERT OR REPLACE INTO images VALUES (?, ?)", (key, path))
+                refs.append(key)
+            stored["image_refs"] = refs
+        return stored
+
+    def _load_entry(self, stored: Dict, encode: Callable[[str], Optional[str]]) -> Dict:
+        entry = {k: v for k, v in stored.items() if k != "image_refs"}
+        images = []
+        for key in stored.get("image_refs", []):
+            row = self._db.execute("SELECT path FROM images WHERE key = ?", (key,)).fetchone()
+            encoded = encode(row[0]) if row else None
+            if encoded:
+                images.append(encoded)
+                self._image_paths[encoded] = row[0]
+            else:
+                logging.warning(f"Image {key[:8]} of session {self.id} is no longer available")
+        if images:
+            entry["images"] = images
+        elif "image_refs" in stored:
+            entry["content"] = f"{entry.get('content', '')} (image no longer available)"
+        return entry
+
+
+def fts_query(text: str) -> str:
+    # every word must match as a prefix ("kuume" finds "kuumeen"); quoting keeps FTS syntax out
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", text.lower()))
+
+
+def list_sessions(directory: str = SESSIONS_DIR) -> List[Dict]:
+    """Sessions on disk, most recently modified first."""
+    sessions = []
+    for path in glob.glob(os.path.join(directory, "*.sqlite3")):
+        # WAL writes touch the -wal file first
+        updated = max(
+            os.path.getmtime(p) for p in (path, path + "-wal") if os.path.exists(p)
+        )
+        sessions.append({"id": os.path.splitext(os.path.basename(path))[0], "updated": updated})
+    sessions.sort(key=lambda s: s["updated"], reverse=True)
+    return sessions
+
+
+def describe_session(session: Dict, directory: str = SESSIONS_DIR) -> Tuple[str, str]:
+    """(id, human readable label) for pickers."""
+    try:
+        store = SessionStore.open(session["id"], directory)
+        title, count = store.title(), store.message_count()
+        store.close()
+    except sqlite3.Error:
+        title, count = None, 0
+    when = time.strftime("%Y-%m-%d %H:%M", time.localtime(session["updated"]))
+    return session["id"], f"{when} · {title or 'Untitled'} ({count} messages)"
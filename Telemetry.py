@@ -0,0 +1,212 @@
+# Per-turn performance telemetry: JSONL log, Prometheus textfile and a short status readout
+#
+# A turn is one user action (chat, image, search or import). Generations report
+# Ollama's own counters from the final stream chunk, searches report their
+# stage latencies (WebSearch.record_timings) and the UI reports render time
+# per streamed update. With profiling on, every turn also gets a stack profile
+# (Profiler.py) whose path is in its summary.
+
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from Profiler import TurnProfiler
+
+TELEMETRY_DIR = os.environ.get("HYGIEIA_TELEMETRY_DIR", "telemetry")
+JSONL_NAME = "turns.jsonl"
+# point this into node exporter's --collector.textfile.directory
+PROM_PATH = os.environ.get("HYGIEIA_PROM_FILE", os.path.join(TELEMETRY_DIR, "hygieia.prom"))
+MAX_JSONL_BYTES = 5 * 1024 * 1024
+JSONL_BACKUPS = 5
+
+# fields Ollama puts on the final chunk; durations are nanoseconds
+OLLAMA_STATS = (
+    "total_duration",
+    "load_duration",
+    "prompt_eval_count",
+    "prompt_eval_duration",
+    "eval_count",
+    "eval_duration",
+)
+
+
+def generation_stats(chunk) -> Dict:
+    stats = {}
+    for key in OLLAMA_STATS:
+        value = chunk.get(key) if hasattr(chunk, "get") else None
+        if value is not None:
+            stats[key] = value
+    return stats
+
+
+class Telemetry:
+    """Collects turn records; safe to share between threads."""
+
+    def __init__(
+        self,
+        directory: str = TELEMETRY_DIR,
+        prom_path: Optional[str] = PROM_PATH,
+        profiler: Optional[TurnProfiler] = None,
+    ):
+        os.makedirs(directory, exist_ok=True)
+        # samples stacks per turn when switched on (HYGIEIA_PROFILE or the Debug menu)
+        self.profiler = profiler or TurnProfiler()
+        self._lock = threading.Lock()
+        self._turns = 0
+        self.prom_path = prom_path
+        self._log = logging.getLogger(f"hygieia.telemetry.{id(self)}")
+        self._log.propagate = False
+        self._log.setLevel(logging.INFO)
+        handler = logging.handlers.RotatingFileHandler(
+            os.path.join(directory, JSONL_NAME),
+            maxBytes=MAX_JSONL_BYTES,
+            backupCount=JSONL_BACKUPS,
+            encoding="utf-8",
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self._log.addHandler(handler)
+        # Prometheus aggregates: name -> labels -> value
+        self._counters: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self._gauges: Dict[str, Dict[str, float]] = defaultdict(dict)
+
+    def begin(self, kind: str) -> Dict:
+        with self._lock:
+            self._turns += 1
+            turn = self._turns
+        self.profiler.begin(turn, kind)
+        return {
+            "turn": turn,
+            "kind": kind,
+            "started": time.time(),
+            "_t0": time.perf_counter(),
+            "generations": [],
+            "search": {},
+            "render_s": [],
+            # extra fields copied into the summary, e.g. cached/stopped/error
+            "tags": {},
+        }
+
+    def add_generation(self, record: Dict, stats: Dict) -> None:
+        record["generations"].append(dict(stats))
+
+    def add_search(self, record: Dict, timings: Dict[str, float]) -> None:
+        for stage, seconds in timings.items():
+            record["search"][stage] = record["search"].get(stage, 0.0) + seconds
+
+    def add_render(self, record: Dict, seconds: float) -> None:
+        record["render_s"].append(seconds)
+
+    def finish(self, record: Dict, context_tokens: Optional[int] = None, **extra) -> Dict:
+        """Summarize, log and export a turn. Returns the summary written to disk."""
+        gens: List[Dict] = record["generations"]
+        renders: List[float] = record["render_s"]
+        summary = {
+            "turn": record["turn"],
+            "kind": record["kind"],
+            "ts": round(record["started"], 3),
+            "duration_s": round(time.perf_counter() - record["_t0"], 4),
+            "generations": len(gens),
+            "context_tokens": context_tokens,
+        }
+        ttft = next((g["ttft_s"] for g in gens if g.get("ttft_s") is not None), None)
+        summary["ttft_s"] = round(ttft, 4) if ttft is not None else None
+        eval_count = sum(g.get("eval_count", 0) for g in gens)
+        eval_ns = sum(g.get("eval_duration", 0) for g in gens)
+        summary["eval_tokens"] = eval_count
+        summary["tokens_per_s"] = round(eval_count / (eval_ns / 1e9), 2) if eval_ns else None
+        summary["prompt_eval_tokens"] = sum(g.get("prompt_eval_count", 0) for g in gens)
+        prompt_ns = sum(g.get("prompt_eval_duration", 0) for g in gens)
+        summary["prompt_eval_s"] = round(prompt_ns / 1e9, 4)
+        summary["load_s"] = round(sum(g.get("load_duration", 0) for g in gens) / 1e9, 4)
+        summary["search_s"] = {k: round(v, 4) for k, v in record["search"].items()}
+        if renders:
+            summary["render_ms_mean"] = round(sum(renders) / len(renders) * 1000, 3)
+            summary["render_ms_max"] = round(max(renders) * 1000, 3)
+            summary["render_updates"] = len(renders)
+        summary.update(record["tags"])
+        summary.update(extra)
+        summary.update(self.profiler.end(record["turn"]) or {})
+        self._write(summary)
+        return summary
+
+    def event(self, kind: str, duration_s: float, **fields) -> Dict:
+        """Record a one-off timed action such as a document import."""
+        record = self.begin(kind)
+        record["_t0"] = time.perf_counter() - duration_s
+        return self.finish(record, **fields)
+
+    def _write(self, summary: Dict) -> None:
+        kind = summary["kind"]
+        with self._lock:
+            c, g = self._counters, self._gauges
+            c["hygieia_turns_total"][kind] += 1
+            c["hygieia_turn_seconds_total"][kind] += summary["duration_s"]
+            c["hygieia_eval_tokens_total"][kind] += summary["eval_tokens"]
+            c["hygieia_prompt_eval_tokens_total"][kind] += summary["prompt_eval_tokens"]
+            c["hygieia_prompt_eval_seconds_total"][kind] += summary["prompt_eval_s"]
+            if summary["ttft_s"] is not None:
+                c["hygieia_ttft_seconds_sum"][kind] += summary["ttft_s"]
+                c["hygieia_ttft_seconds_count"][kind] += 1
+                g["hygieia_last_ttft_seconds"][kind] = summary["ttft_s"]
+            if summary["tokens_per_s"] is not None:
+                g["hygieia_last_tokens_per_second"][kind] = summary["tokens_per_s"]
+            if summary["context_tokens"] is not None:
+                g["hygieia_context_tokens"][""] = summary["context_tokens"]
+            for stage, seconds in summary["search_s"].items():
+                c["hygieia_search_stage_seconds_sum"][stage] += seconds
+                c["hygieia_search_stage_seconds_count"][stage] += 1
+            if "render_updates" in summary:
+                c["hygieia_render_seconds_sum"][""] += summary["render_ms_mean"] * summary["render_updates"] / 1000
+                c["hygieia_render_updates_total"][""] += summary["render_updates"]
+            self._log.info(json.dumps(summary, ensure_ascii=False))
+            if self.prom_path:
+                self._write_prom()
+
+    def _write_prom(self) -> None:
+        lines = []
+        for kind, metrics in (("counter", self._counters), ("gauge", self._gauges)):
+            for name in sorted(metrics):
+                if kind == "gauge":
+                    mtype = "gauge"
+                else:
+                    # *_sum/*_count pairs only ever grow but aren't named *_total
+                    mtype = "counter" if name.endswith("_total") else "untyped"
+                lines.append(f"# TYPE {name} {mtype}")
+                label = "stage" if name.startswith("hygieia_search_stage") else "kind"
+                for value_label, value in sorted(metrics[name].items()):
+                    labels = f'{{{label}="{value_label}"}}' if value_label else ""
+                    lines.append(f"{name}{labels} {value:g}")
+        # write-then-rename so the exporter never reads half a file
+        tmp = f"{self.prom_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(tmp, self.prom_path)
+        except OSError as e:
+            logging.error(f"Failed to write {self.prom_path}: {e}")
+
+
+def readout(summary: Dict) -> str:
+    # compact one-liner for the status bar
+    parts = []
+    if summary.get("ttft_s") is not None:
+        parts.append(f"TTFT {summary['ttft_s']:.2f}s")
+    if summary.get("tokens_per_s"):
+        parts.append(f"{summary['tokens_per_s']:.1f} tok/s")
+    if summary.get("prompt_eval_tokens"):
+        parts.append(f"prompt {summary['prompt_eval_tokens']} tok")
+    if summary.get("context_tokens") is not None:
+        parts.append(f"ctx ~{summary['context_tokens']}")
+    search = summary.get("search_s", {}).get("total_s")
+    if search is not None:
+        parts.append(f"search {search:.1f}s")
+    if summary.get("render_ms_mean") is not None:
+        parts.append(f"render {summary['render_ms_mean']:.1f}ms")
+    if not parts:
+        parts.append(f"{summary['kind']} {summary['duration_s']:.2f}s")
+    return " · ".join(parts)
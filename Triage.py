@@ -0,0 +1,345 @@
+# Red-flag triage: spot emergencies in a message before the model is asked
+#
+# A CPU generation takes seconds to start, which is too long to wait for "call
+# 112". Every message is scanned once with an Aho–Corasick automaton over
+# Finnish and English red-flag phrases (stems, matched at the start of a word,
+# so inflected forms match too). Phrases are taken a clause at a time: a rule
+# needing two phrases ("troponiini" + "koholla") wants both in the same clause,
+# and "ei"/"no" cancels a phrase only from right before it, with at most a few
+# filler words in between ("I do not have any chest pain"), never across
+# punctuation ("No, chest pain started" still counts). The vitals and lab
+# values in the message are read with regular expressions and held
+# against limits derived from the checklist in LLM.SYSTEM_PROMPT. Finds come
+# back as Flags for the emergency banner; the answer is generated as usual.
+# When a red-flag phrase is there but no rule fires (negated, or half a rule)
+# the small model can give a second opinion (second_opinion, off the UI thread).
+
+import re
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from Lexicon import normalize
+
+NEGATIONS = {"ei", "en", "et", "eikä", "ilman", "no", "not", "without", "denies", "never"}
+# words that may stand between a negation and what it negates ("ei ole rintakipua")
+NEGATION_FILLERS = {
+    "ole", "ollut", "oo", "enää", "mitään", "yhtään",
+    "have", "had", "any", "more", "a", "an", "the", "really", "feel", "feeling",
+}
+NEGATION_GAP = 2  # filler words allowed in between
+# clauses end at punctuation and at "but"-like words
+_CLAUSE = re.compile(r"[.,;:!?()\[\]\n]+|\b(?:but|although|though|whereas|mutta|vaan|vaikka)\b", re.IGNORECASE)
+
+
+class Flag(NamedTuple):
+    key: str
+    title: str
+    advice: str
+    found: str  # what in the message raised it
+
+
+# key -> (title, advice)
+FLAGS: Dict[str, Tuple[str, str]] = {
+    "stroke": ("Possible stroke (FAST)", "Call 112 now and note the time the symptoms started."),
+    "cardiac": ("Possible heart attack", "Call 112 now. Sit down and don't exert yourself."),
+    "breathing": ("Severe breathing difficulty", "Call 112 now."),
+    "anaphylaxis": ("Possible anaphylaxis", "Use an adrenaline auto-injector if there is one, and call 112."),
+    "unconscious": ("Unconscious or seizing", "Call 112 now and check breathing."),
+    "bleeding": ("Severe bleeding", "Press firmly on the wound and call 112."),
+    "suicide": ("Thoughts of suicide", "Call 112 if in immediate danger; MIELI crisis line 09 2525 0111."),
+    "vitals": ("Dangerous vital sign", "Seek emergency care now: call 112 or go to the emergency department."),
+    "second_opinion": ("Possible emergency", "If the symptoms are severe or came on suddenly, call 112."),
+}
+# what the small model may answer when asked about a message the rules were unsure of
+SECOND_OPINION_LABELS = ["emergency", "not urgent"]
+
+# (flag, phrase groups): the flag is raised when every group has a phrase in the message.
+# Phrases are stems: "rintakip" matches rintakipu, rintakipua, rintakipuja.
+RULES: Tuple[Tuple[str, Tuple[Tuple[str, ...], ...]], ...] = (
+    (
+        "stroke",
+        (
+            (
+                "stroke", "face drooping", "facial droop", "drooping face", "slurred speech",
+                "arm weakness", "sudden numbness", "one side of my body", "aivoinfarkt",
+                "aivoverenvuo", "aivohalvau", "halvaantu", "suupieli roikk", "suupielet roikk",
+                "kasvot roikk", "toinen puoli kasvo", "puhe puuroutu", "puheen puuroutu",
+                "puhe sammaltaa", "puhe on sekavaa", "käsi ei nouse", "toispuoleinen heikkous",
+                "toispuoleinen halvau", "toispuoleinen puutuminen",
+            ),
+        ),
+    ),
+    (
+        "cardiac",
+        (
+            (
+                "chest pain", "chest pressure", "crushing chest", "tight chest", "heart attack",
+                "rintakip", "rintakiv", "kipu rinnassa", "kipua rinnassa", "puristaa rinnassa",
+                "puristava kipu", "painon tunne rinnassa", "sydäninfarkt", "sydänkohtau",
+            ),
+        ),
+    ),
+    (
+        "cardiac",
+        (
+            ("troponin", "troponiini", "tnt", "tni"),
+            ("elevated", "raised", "high", "positive", "rising", "koholla", "korkea", "noussut",
+             "nousussa", "positiivinen", "kohonnut"),
+        ),
+    ),
+    (
+        "breathing",
+        (
+            (
+                "can't breathe", "cannot breathe", "can not breathe", "unable to breathe",
+                "choking", "turning blue", "en saa henkeä", "ei saa henkeä", "tukehtu",
+                "huulet sinert", "huulet ovat sinis", "vaikea hengenahdistus",
+            ),
+        ),
+    ),
+    (
+        "anaphylaxis",
+        (
+            (
+                "anaphyla", "anafyla", "throat swelling", "throat is swelling", "swollen tongue",
+                "tongue swelling", "kurkku turpoa", "kurkku on turvon", "kieli turpoa",
+                "kieli on turvon", "nielu turpoa",
+            ),
+        ),
+    ),
+    (
+        "unconscious",
+        (
+            (
+                "unconscious", "unresponsive", "stopped breathing", "is not breathing",
+                "isn t breathing", "s not breathing", "not breathing at all", "seizure",
+                "convulsi", "passed out", "tajuton", "tajuttom", "menetti tajun",
+                "menettänyt tajun", "ei herää", "ei hengitä", "kouristel", "kouristu",
+            ),
+        ),
+    ),
+    (
+        "bleeding",
+        (
+            (
+                "heavy bleeding", "severe bleeding", "won't stop bleeding", "vomiting blood",
+                "coughing up blood", "runsas verenvuo", "runsaasti verta", "verenvuoto ei lopu",
+                "veri ei lakkaa", "oksentaa verta", "verioksennu", "yskii verta",
+            ),
+        ),
+    ),
+    (
+        "suicide",
+        (
+            (
+                "suicid", "kill myself", "end my life", "want to die", "itsemurh",
+                "tappaa itseni", "haluan kuolla", "päättää elämäni", "vahingoittaa itseäni",
+            ),
+        ),
+    ),
+)
+
+_NUM = r"\d{1,3}(?:[.,]\d{1,2})?"
+_NUMBER = f"({_NUM})"
+
+
+def _short(name: str, unit: str) -> str:
+    # a short name only counts with a separator or the unit: "hr: 150", "hr 150/min", not "hr 150"
+    return rf"\b{name}(?!\w)(?=\s*[:=]|\s*{_NUM}\s*(?:{unit}))[\s:=]*" + _NUMBER
+
+
+# (name, pattern, low, high, unit): a value below low or above high raises "vitals".
+# Limits from the SYSTEM_PROMPT checklist where it gives an emergency level
+# (SpO2 <94 %, hypothermia <35 °C); elsewhere where its "abnormal" turns dangerous.
+# Names are whole words, so "hr" in "shrimp" or "sokeria 30 g" don't count.
+VITALS: Tuple[Tuple[str, str, float, float, str], ...] = (
+    ("SpO2", r"\b(?:spo2|sp02|(?:happi)?saturaatio|saturation|happiarvo|happi)\b\D{0,12}?" + _NUMBER, 94, 100, "%"),
+    ("SpO2", _short("sat", "%"), 94, 100, "%"),
+    ("potassium", r"\b(?:kalium|potassium|f?p-k)(?!\w)\D{0,12}?" + _NUMBER, 2.5, 6.4, "mmol/l"),
+    ("potassium", _short(r"k\+?", "mmol"), 2.5, 6.4, "mmol/l"),
+    ("sodium", r"\b(?:natrium|sodium|f?p-na)(?!\w)\D{0,12}?" + _NUMBER, 120, 160, "mmol/l"),
+    ("sodium", _short(r"na\+?", "mmol"), 120, 160, "mmol/l"),
+    ("temperature", _NUMBER + r"\s*(?:°\s*c?|astetta|asteen|celsius|degrees)", 35.0, 40.9, "°C"),
+    ("temperature", r"\b(?:lämpö|lämpöä|kuume|kuumetta|kuumeen|temperature|fever)\b\D{0,12}?" + _NUMBER, 35.0, 40.9, "°C"),
+    ("temperature", _short("temp", "°|astetta|celsius|degrees"), 35.0, 40.9, "°C"),
+    ("heart rate", r"\b(?:syke|sykkeet|sykkeen|sykettä|pulssi|pulssin|pulse|heart rate)\b\D{0,12}?" + _NUMBER, 40, 140, "/min"),
+    ("heart rate", _short("hr", r"/\s*min|bpm|lyöntiä"), 40, 140, "/min"),
+    ("heart rate", _NUMBER + r"\s*(?:bpm|lyöntiä)", 40, 140, "/min"),
+    ("respiratory rate", r"\b(?:hengitystiheys|respiratory rate|breaths per minute|hengitystä minuutissa)\b\D{0,12}?" + _NUMBER, 8, 30, "/min"),
+    ("blood glucose", r"\b(?:verensokeri|verensokerin|sokeri|glukoosi|glucose|blood sugar)\b\D{0,12}?" + _NUMBER, 3.0, 25.0, "mmol/l"),
+)
+# systolic / diastolic, with the unit or a name for it so dates like 12/05 don't count
+_BLOOD_PRESSURE = re.compile(
+    r"\b(?:verenpaine|paineet|rr|bp|blood pressure)\b\D{0,12}?(\d{2,3})\s*/\s*(\d{2,3})"
+    r"|(\d{2,3})\s*/\s*(\d{2,3})\s*mm\s*hg"
+)
+SYSTOLIC_LIMITS = (90, 179)
+DIASTOLIC_MAX = 119
+# a value this far out of any plausible range is a different number (a date, a dose)
+PLAUSIBLE = {
+    "SpO2": (50, 100),
+    "potassium": (1.0, 10.0),
+    "sodium": (100, 190),
+    "temperature": (30, 44),
+    "heart rate": (20, 250),
+    "respiratory rate": (3, 70),
+    "blood glucose": (0.5, 60),
+}
+
+_VITALS = [(name, re.compile(pattern), low, high, unit) for name, pattern, low, high, unit in VITALS]
+
+
+class PhraseMatcher:
+    """Aho–Corasick automaton over normalized phrases; one pass over the text finds them all."""
+
+    def __init__(self, phrases: Dict[str, str]):
+        # phrase -> value returned when it's found
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, str]]] = [[]]  # (phrase length, value)
+        for phrase, value in phrases.items():
+            state = 0
+            for ch in phrase:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append((len(phrase), value))
+        # breadth first, so a state's fail link is final before its children need it
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for ch, child in self._goto[state].items():
+                queue.append(child)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find(self, text: str) -> List[Tuple[int, int, str]]:
+        """(start, end, value) of every phrase in text."""
+        found = []
+        state = 0
+        goto, fail, out = self._goto, self._fail, self._out
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, value in out[state]:
+                found.append((i - length + 1, i + 1, value))
+        return found
+
+
+_matcher: Optional[PhraseMatcher] = None
+
+
+def _phrases() -> PhraseMatcher:
+    global _matcher
+    if _matcher is None:
+        # value is "rule index:group index", so a phrase can serve several rules
+        phrases: Dict[str, str] = {}
+        for r, (_, groups) in enumerate(RULES):
+            for g, group in enumerate(groups):
+                for phrase in group:
+                    key = normalize(phrase)
+                    phrases[key] = f"{phrases[key]} {r}:{g}" if key in phrases else f"{r}:{g}"
+        _matcher = PhraseMatcher(phrases)
+    return _matcher
+
+
+def _negated(clause: str, start: int) -> bool:
+    # the word before the phrase, past up to NEGATION_GAP fillers, must be the negation
+    before = clause[:start].split()[-(NEGATION_GAP + 1) :]
+    while before and before[-1] in NEGATION_FILLERS and len(before) > 1:
+        before.pop()
+    return bool(before) and before[-1] in NEGATIONS
+
+
+def _scan(text: str) -> Tuple[Dict[int, str], bool]:
+    # rule -> what raised it (first clause that has all its groups), and whether any phrase was seen
+    matched: Dict[int, str] = {}
+    seen = False
+    for clause in _CLAUSE.split(text):
+        clause = normalize(clause)
+        hits: Dict[int, Dict[int, str]] = {}  # rule -> group -> phrase found
+        for start, end, value in _phrases().find(clause):
+            # phrases start at a word; their end may be inside one (inflections)
+            if start and clause[start - 1] != " ":
+                continue
+            seen = True
+            if _negated(clause, start):
+                continue
+            # shown as written, the whole word rather than the stem
+            word_end = clause.find(" ", end)
+            found = clause[start : word_end if word_end != -1 else len(clause)]
+            for ref in value.split():
+                r, g = map(int, ref.split(":"))
+                hits.setdefault(r, {}).setdefault(g, found)
+        for r, groups in hits.items():
+            if len(groups) == len(RULES[r][1]):
+                matched.setdefault(r, " + ".join(groups[g] for g in sorted(groups)))
+    return matched, seen
+
+
+def phrase_flags(text: str) -> List[Flag]:
+    matched, _ = _scan(text)
+    flags = []
+    for r, found in sorted(matched.items()):
+        key = RULES[r][0]
+        if all(f.key != key for f in flags):
+            title, advice = FLAGS[key]
+            flags.append(Flag(key, title, advice, found))
+    return flags
+
+
+def ambiguous(text: str) -> bool:
+    """True when a red-flag phrase is in text but no rule fired: it was negated, or only part of a rule."""
+    matched, seen = _scan(text)
+    return seen and not matched
+
+
+def second_opinion(text: str, classify: Callable[[str, List[str]], Optional[str]]) -> List[Flag]:
+    """Ask classify (LLM.ChatEngine.classify) about a message the rules were unsure of."""
+    if classify(text, SECOND_OPINION_LABELS) != "emergency":
+        return []
+    title, advice = FLAGS["second_opinion"]
+    return [Flag("second_opinion", title, advice, "assistant's check")]
+
+
+def _value(number: str) -> float:
+    return float(number.replace(",", "."))
+
+
+def vital_flags(text: str) -> List[Flag]:
+    text = text.lower()
+    title, advice = FLAGS["vitals"]
+    found: List[str] = []
+    for name, pattern, low, high, unit in _VITALS:
+        for m in pattern.finditer(text):
+            value = _value(m.group(1))
+            lo, hi = PLAUSIBLE[name]
+            if not lo <= value <= hi:
+                continue
+            if value < low:
+                found.append(f"{name} {value:g} {unit}, under {low:g}")
+            elif value > high:
+                found.append(f"{name} {value:g} {unit}, over {high:g}")
+    for m in _BLOOD_PRESSURE.finditer(text):
+        systolic, diastolic = (int(n) for n in (m.group(1, 2) if m.group(1) else m.group(3, 4)))
+        if systolic < SYSTOLIC_LIMITS[0] or systolic > SYSTOLIC_LIMITS[1] or diastolic > DIASTOLIC_MAX:
+            found.append(f"blood pressure {systolic}/{diastolic} mmHg")
+    # the same value can be named twice ("kuume 41 astetta")
+    found = list(dict.fromkeys(found))
+    return [Flag("vitals", title, advice, "; ".join(found))] if found else []
+
+
+def triage(text: str) -> Tuple[List[Flag], float]:
+    """Red flags in a user message, and the seconds it took to look."""
+    start = time.perf_counter()
+    flags = phrase_flags(text) + vital_flags(text)
+    return flags, time.perf_counter() - start
@@ -0,0 +1,166 @@
+# Ollama option tuning for this machine: threads, batch size and keep-alive
+#
+# Runs a fixed prompt set against a few num_thread/num_batch combinations,
+# scores each by the time a typical answer takes (TTFT plus ANSWER_TOKENS at
+# the measured generation rate) and saves the winner per host and model.
+# ChatEngine loads the profile and sends it with every Ollama call. num_ctx
+# isn't tuned: it follows MAX_CONTEXT_TOKENS (see LLM.context_window).
+#
+# Usage: python Tuner.py [--model gemma3:4b] [--host http://127.0.0.1:11434] [--quick]
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import time
+from typing import Dict, List, Optional
+
+logging.basicConfig(level=logging.INFO)
+
+PROFILE_PATH = os.environ.get("HYGIEIA_OLLAMA_PROFILE", "ollama_profile.json")
+DEFAULT_OLLAMA_HOST = "http://127.0.0.1:11434"
+KEEP_ALIVE = "30m"  # keep the model loaded between turns instead of reloading it
+ANSWER_TOKENS = 200  # typical answer length the score is computed for
+NUM_PREDICT = 64  # tokens generated per measured prompt
+BATCH_SIZES = (256, 512)
+PROMPTS = (
+    "Mikä on normaali verenpaine aikuisella?",
+    "I have had a fever of 38.5 °C for two days. What should I do?",
+    "Onko päänsärkyyn parempi ibuprofeeni vai parasetamoli?",
+)
+
+
+def ollama_host(host: Optional[str] = None) -> str:
+    return (host or os.environ.get("OLLAMA_HOST") or DEFAULT_OLLAMA_HOST).rstrip("/")
+
+
+def host_key(host: Optional[str] = None) -> str:
+    # same Ollama URL on different machines is a different host
+    return f"{platform.node()}@{ollama_host(host)}"
+
+
+def _read_profiles(path: str) -> Dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, json.JSONDecodeError) as e:
+        logging.error(f"Ignoring unreadable Ollama profile {path}: {e}")
+        return {}
+
+
+def load_profile(model: str, host: Optional[str] = None, path: str = PROFILE_PATH) -> Dict:
+    """{"options": {...}, "keep_alive": ...} tuned for this host and model, {} if untuned."""
+    return _read_profiles(path).get(host_key(host), {}).get(model, {})
+
+
+def save_profile(model: str, profile: Dict, host: Optional[str] = None, path: str = PROFILE_PATH) -> None:
+    profiles = _read_profiles(path)
+    profiles.setdefault(host_key(host), {})[model] = profile
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(profiles, f, indent=2)
+    os.replace(tmp, path)
+
+
+def candidates(cpus: Optional[int] = None, quick: bool = False) -> List[Dict]:
+    cpus = cpus or os.cpu_count() or 1
+    # logical CPUs are often twice the physical cores, which is what llama.cpp wants
+    threads = sorted({max(1, cpus // 4), max(1, cpus // 2), cpus})
+    batches = BATCH_SIZES[-1:] if quick else BATCH_SIZES
+    return [{"num_thread": t, "num_batch": b} for t in threads for b in batches]
+
+
+def measure(client, model: str, options: Dict, keep_alive: str, system_prompt: str) -> Dict:
+    # the warm-up loads the model with these options so loading isn't measured
+    client.chat(
+        model=model,
+        messages=[{"role": "user", "content": "Hei"}],
+        options={**options, "num_predict": 1},
+        keep_alive=keep_alive,
+    )
+    ttfts, rates = [], []
+    for prompt in PROMPTS:
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt},
+        ]
+        start = time.perf_counter()
+        first = None
+        for chunk in client.chat(
+            model=model,
+            messages=messages,
+            stream=True,
+            options={**options, "num_predict": NUM_PREDICT},
+            keep_alive=keep_alive,
+        ):
+            if first is None and chunk.get("message", {}).get("content"):
+                first = time.perf_counter() - start
+            if chunk.get("done"):
+                count, ns = chunk.get("eval_count") or 0, chunk.get("eval_duration") or 0
+                if count and ns:
+                    rates.append(count / (ns / 1e9))
+        ttfts.append(first if first is not None else time.perf_counter() - start)
+    ttft = statistics.median(ttfts)
+    rate = statistics.median(rates) if rates else 0.0
+    return {
+        "ttft_s": round(ttft, 3),
+        "tokens_per_s": round(rate, 2),
+        "score_s": round(ttft + ANSWER_TOKENS / rate, 3) if rate else float("inf"),
+    }
+
+
+def tune(model: str, host: Optional[str] = None, quick: bool = False, keep_alive: str = KEEP_ALIVE) -> Dict:
+    import ollama
+    from LLM import MAX_CONTEXT_TOKENS, SYSTEM_PROMPT, context_window
+
+    client = ollama.Client(host=ollama_host(host))
+    num_ctx = context_window(MAX_CONTEXT_TOKENS)
+    results = []
+    for combo in candidates(quick=quick):
+        options = {**combo, "num_ctx": num_ctx}
+        try:
+            result = measure(client, model, options, keep_alive, SYSTEM_PROMPT)
+        except Exception as e:
+            logging.error(f"{combo} failed: {e}")
+            continue
+        logging.info(
+            f"num_thread={combo['num_thread']:<3} num_batch={combo['num_batch']:<4} "
+            f"TTFT {result['ttft_s']:.2f}s  {result['tokens_per_s']:.1f} tok/s  "
+            f"score {result['score_s']:.2f}s"
+        )
+        results.append((result["score_s"], combo, result))
+    if not results:
+        raise RuntimeError("no option combination could be measured")
+    _, best, measured = min(results, key=lambda r: r[0])
+    profile = {
+        "options": best,
+        "keep_alive": keep_alive,
+        "measured": measured,
+        "num_ctx": num_ctx,
+        "cpus": os.cpu_count(),
+        "tuned": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    return profile
+
+
+def main(argv=None) -> None:
+    from LLM import MODEL_NAME
+
+    parser = argparse.ArgumentParser(description="Tune Ollama options for this machine.")
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--host", default=None, help="Ollama URL, default $OLLAMA_HOST or localhost")
+    parser.add_argument("--quick", action="store_true", help="only vary num_thread")
+    parser.add_argument("--keep-alive", default=KEEP_ALIVE)
+    parser.add_argument("--profile", default=PROFILE_PATH)
+    args = parser.parse_args(argv)
+    profile = tune(args.model, args.host, args.quick, args.keep_alive)
+    save_profile(args.model, profile, args.host, args.profile)
+    print(json.dumps({host_key(args.host): {args.model: profile}}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# Stream watchdog: deadlines for model load, first token and the gaps between tokens
+#
+# Ollama's client blocks in a socket read while the server is silent, so a
+# check inside the chunk loop never runs when it's needed. GuardedStream reads
+# the stream on a pump thread and hands chunks over through a queue; every wait
+# on the queue has a deadline, and a missed one raises Stalled in the caller
+# while the pump is abandoned: it stops at its next chunk, or when the client's
+# read timeout (Deadlines.longest) runs out. ChatEngine.stream retries once and
+# then falls back to FALLBACK_MODEL.
+
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+LOAD_TIMEOUT_S = float(os.environ.get("HYGIEIA_LOAD_TIMEOUT", 120))  # model not resident yet
+FIRST_TOKEN_TIMEOUT_S = float(os.environ.get("HYGIEIA_FIRST_TOKEN_TIMEOUT", 60))
+TOKEN_GAP_TIMEOUT_S = float(os.environ.get("HYGIEIA_TOKEN_GAP_TIMEOUT", 30))
+# non-streamed calls (images) get the whole answer in one piece
+ANSWER_TIMEOUT_S = float(os.environ.get("HYGIEIA_ANSWER_TIMEOUT", 300))
+FALLBACK_MODEL = os.environ.get("HYGIEIA_FALLBACK_MODEL", "gemma3:1b")
+POLL_S = 0.1  # how soon a stop request is noticed while nothing arrives
+
+
+PHASES = {
+    "load": "model didn't load",
+    "first_token": "no first token",
+    "token_gap": "no new token",
+}
+
+
+class Stalled(TimeoutError):
+    def __init__(self, phase: str, waited: float):
+        super().__init__(f"{PHASES[phase]} in {waited:.1f} s")
+        self.phase = phase
+        self.waited = waited
+
+
+class Deadlines:
+    def __init__(
+        self,
+        load: float = LOAD_TIMEOUT_S,
+        first_token: float = FIRST_TOKEN_TIMEOUT_S,
+        token_gap: float = TOKEN_GAP_TIMEOUT_S,
+        answer: float = ANSWER_TIMEOUT_S,
+    ):
+        self.load = load
+        self.first_token = first_token
+        self.token_gap = token_gap
+        self.answer = answer
+
+    def longest(self) -> float:
+        # socket read timeout for the client: an abandoned pump blocked in a read
+        # can't be woken from outside, but it ends by this time at the latest
+        return self.load + self.first_token + self.answer
+
+
+def model_loaded(client, model: str) -> Optional[bool]:
+    """Whether Ollama has model in memory; None if the server can't tell."""
+    try:
+        running = client.ps().get("models") or []
+    except Exception:
+        return None
+    names = set()
+    for m in running:
+        names.update(n for n in (m.get("model"), m.get("name")) if n)
+    # "gemma3" and "gemma3:latest" are the same model
+    return model in names or f"{model}:latest" in names
+
+
+class GuardedStream:
+    """Iterates a blocking stream on a pump thread; raises Stalled when a deadline passes.
+
+    open_stream runs on the pump thread, so connecting and loading count
+    against the deadlines too. Setting cancel ends the iteration quietly.
+    whole_answer gives the first item as long as a whole answer: for
+    non-streamed calls, and for prompts with images the model encodes first.
+    """
+
+    def __init__(
+        self,
+        open_stream: Callable[[], Iterable[Any]],
+        deadlines: Optional[Deadlines] = None,
+        cancel: Optional[threading.Event] = None,
+        loaded: Callable[[], Optional[bool]] = lambda: None,
+        whole_answer: bool = False,
+    ):
+        self._open = open_stream
+        self.deadlines = deadlines or Deadlines()
+        self._cancel = cancel
+        self._loaded = loaded
+        self._whole_answer = whole_answer
+        self._queue: "queue.Queue" = queue.Queue()
+        self._abandoned = threading.Event()
+
+    def close(self) -> None:
+        self._abandoned.set()
+
+    def __iter__(self) -> Iterator[Any]:
+        d = self.deadlines
+        threading.Thread(target=self._pump, daemon=True, name="ollama-pump").start()
+        # until the pump knows whether the model is resident, assume it has to load
+        phase, limit = "load", d.load + d.first_token
+        if self._whole_answer:
+            limit += d.answer
+        since = time.monotonic()
+        try:
+            while True:
+                try:
+                    kind, item = self._queue.get(timeout=POLL_S)
+                except queue.Empty:
+                    if self._cancel is not None and self._cancel.is_set():
+                        return
+                    waited = time.monotonic() - since
+                    if waited > limit:
+                        raise Stalled(phase, waited)
+                    continue
+                if kind == "loaded":
+                    if item:
+                        phase = "first_token"
+                        limit = d.first_token + (d.answer if self._whole_answer else 0)
+                        since = time.monotonic()
+                    continue
+                if kind == "error":
+                    raise item
+                if kind == "end":
+                    return
+                yield item
+                phase, limit, since = "token_gap", d.token_gap, time.monotonic()
+        finally:
+            self.close()
+
+    def _pump(self) -> None:
+        stream = None
+        try:
+            self._queue.put(("loaded", self._loaded()))
+            stream = self._open()
+            for chunk in stream:
+                if self._abandoned.is_set():
+                    break
+                self._queue.put(("chunk", chunk))
+            else:
+                self._queue.put(("end", None))
+        except Exception as e:
+            if not self._abandoned.is_set():
+                self._queue.put(("error", e))
+        finally:
+            # closing the generator drops the HTTP response, which stops the generation
+            close = getattr(stream, "close", None)
+            if close is not None and self._abandoned.is_set():
+                try:
+                    close()
+                except Exception:
+                    pass
@@ -1,10 +1,17 @@
 import requests as hrequests  # hrequests is being a bitch but leaving it here for the future
+import threading
+import time
 import urllib.parse
+from contextlib import contextmanager
+from typing import Dict, Optional
 from bs4 import BeautifulSoup
 from bs4.element import Tag, NavigableString
 from urllib.parse import urlparse, parse_qs, unquote
 
+from Lexicon import query_variants
+
 HEADERS = {"User-Agent": "Hygieia/1.0 (+https://example.org)"}
+MAX_QUERY_VARIANTS = 2  # canonical term, then the query as typed
 
 # Patterns for URLs we usually want to skip (generic landing pages)
 IGNORE_HOST_PATHS = {
@@ -18,6 +25,64 @@ IGNORE_HOST_PATHS = {
 }
 
 
+_timings = threading.local()
+
+
+@contextmanager
+def record_timings():
+    """Collect per-stage search latencies (seconds) made on this thread into the yielded dict."""
+    timings: Dict[str, float] = {}
+    previous = getattr(_timings, "current", None)
+    _timings.current = timings
+    try:
+        yield timings
+    finally:
+        _timings.current = previous
+
+
+class SearchAborted(Exception):
+    pass
+
+
+@contextmanager
+def search_limits(deadline: Optional[float] = None, cancel: Optional[threading.Event] = None):
+    """Bound searches made on this thread: stop at a time.monotonic() deadline or once cancel is set."""
+    previous = getattr(_timings, "limits", None)
+    _timings.limits = (deadline, cancel)
+    try:
+        yield
+    finally:
+        _timings.limits = previous
+
+
+def _check_limits() -> None:
+    deadline, cancel = getattr(_timings, "limits", None) or (None, None)
+    if cancel is not None and cancel.is_set():
+        raise SearchAborted("cancelled")
+    if deadline is not None and time.monotonic() >= deadline:
+        raise SearchAborted("time budget exceeded")
+
+
+def _timeout(timeout: float) -> float:
+    # requests never outlive the search's deadline
+    deadline = (getattr(_timings, "limits", None) or (None, None))[0]
+    if deadline is None:
+        return timeout
+    return max(0.1, min(timeout, deadline - time.monotonic()))
+
+
+@contextmanager
+def _stage(name: str):
+    _check_limits()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = getattr(_timings, "current", None)
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+
 def should_ignore_url(url: str) -> bool:
     # return True for URLs matching our ignore list
     try:
@@ -40,8 +105,9 @@ def find_first_site_result(domain: str, query: str, timeout: int = 10) -> str:
     encoded_query = urllib.parse.quote(f"site:{domain} {query}")
     search_url = f"https://duckduckgo.com/html/?q={encoded_query}"
     try:
-        resp = hrequests.get(search_url, headers=HEADERS, timeout=timeout)
-        resp.raise_for_status()
+        with _stage("ddg_s"):
+            resp = hrequests.get(search_url, headers=HEADERS, timeout=_timeout(timeout))
+            resp.raise_for_status()
         soup = BeautifulSoup(resp.text, "html.parser")
         # DDG results: links or redirect wrappers (/l/?uddg=...)
         for a in soup.find_all("a", href=True):
@@ -84,7 +150,8 @@ def find_first_site_result(domain: str, query: str, timeout: int = 10) -> str:
 
     # try site-specific search too
     try:
-        fb = _site_search_fallback(domain, query, timeout=timeout)
+        with _stage("fallback_s"):
+            fb = _site_search_fallback(domain, query, timeout=timeout)
         if fb and not should_ignore_url(fb) and fb not in candidates:
             candidates.append(fb)
     except Exception:
@@ -96,9 +163,10 @@ def find_first_site_result(domain: str, query: str, timeout: int = 10) -> str:
         best_score = 0
         for c in candidates:
             try:
-                score, title_hits, snippet_hits = _score_candidate(
-                    c, query, timeout=timeout
-                )
+                with _stage("scoring_s"):
+                    score, title_hits, snippet_hits = _score_candidate(
+                        c, query, timeout=timeout
+                    )
                 if title_hits >= 1 or snippet_hits >= 2:
                     return c
                 if score > best_score:
@@ -118,7 +186,7 @@ def _score_candidate(url: str, query: str, timeout: int = 6):
     # fetch a page and count token hits in title/snippet; return (score, title_hits, snippet_hits)
     qtokens = [t for t in query.lower().split() if t]
     try:
-        resp = hrequests.get(url, headers=HEADERS, timeout=timeout)
+        resp = hrequests.get(url, headers=HEADERS, timeout=_timeout(timeout))
         resp.raise_for_status()
         soup = BeautifulSoup(resp.text, "html.parser")
         title = ""
@@ -157,7 +225,7 @@ def _site_search_fallback(domain: str, query: str, timeout: int = 10) -> str:
         site_root = f"https://{domain}"
         # try common search path used by the site
         search_url = f"{site_root}/haku?q={encoded}"
-        resp = hrequests.get(search_url, headers=HEADERS, timeout=timeout)
+        resp = hrequests.get(search_url, headers=HEADERS, timeout=_timeout(timeout))
         resp.raise_for_status()
         soup = BeautifulSoup(resp.text, "html.parser")
         # Prefer links that look like article paths, e.g. /trvXXXXX or /sisalto/... containing useful content
@@ -206,13 +274,25 @@ def _site_search_fallback(domain: str, query: str, timeout: int = 10) -> str:
 
 def scrape_medical_info(query: str, domain: str = "terveyskirjasto.fi") -> str:
     """Search the given domain and return top result"""
+    # English, inflected or misspelled terms become the site's base forms before any request
+    for variant in query_variants(query)[:MAX_QUERY_VARIANTS]:
+        info = _scrape(variant, domain)
+        if info:
+            return info
+    return ""
+
+
+def _scrape(query: str, domain: str) -> str:
     try:
-        first_url = find_first_site_result(domain, query)
+        with _stage("find_s"):
+            first_url = find_first_site_result(domain, query)
         if not first_url:
             return ""
-        resp = hrequests.get(first_url, headers=HEADERS, timeout=10)
-        resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, "html.parser")
+        with _stage("fetch_s"):
+            resp = hrequests.get(first_url, headers=HEADERS, timeout=_timeout(10))
+            resp.raise_for_status()
+        with _stage("parse_s"):
+            soup = BeautifulSoup(resp.text, "html.parser")
         # prefer article tag
         article = soup.find("article")
         if isinstance(article, Tag):
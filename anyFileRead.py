@@ -1,9 +1,8 @@
 # Module to convert any file into txt for further processing or conversion
 
 import os
-from pptx import Presentation
-from docx import Document
-import PyPDF2
+
+# the extractors are slow to import, each one loads when its file type is first read
 
 
 def anyReader(file_path=None):
@@ -13,6 +12,8 @@ def anyReader(file_path=None):
     ext = os.path.splitext(file_path)[1].lower()
     if ext == ".pdf":
         try:
+            import PyPDF2
+
             with open(file_path, "rb") as f:
                 pdf = PyPDF2.PdfReader(f)
                 out = ""
@@ -25,6 +26,8 @@ def anyReader(file_path=None):
             return f"PDF read error: {e}"
     if ext == ".pptx":
         try:
+            from pptx import Presentation
+
             prs = Presentation(file_path)
             runs = []
             for slide in prs.slides:
@@ -42,6 +45,8 @@ def anyReader(file_path=None):
 
     if ext == ".docx":
         try:
+            from docx import Document
+
             doc = Document(file_path)
             return "\n".join([p.text for p in doc.paragraphs if p.text.strip()]).strip()
         except Exception as e: